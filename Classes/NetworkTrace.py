@@ -1,5 +1,13 @@
-import math
+import struct
+from bisect import bisect_left
 from typing import List, Tuple
+import numpy as np
+
+# Trace file layout: this little-endian header, then float64 start times, bandwidths and the cumulative capacity
+# curve, one array after the other. Trace files are memory mapped, so huge traces load instantly.
+TRACE_FILE_MAGIC = b'ABRN'
+TRACE_FILE_VERSION = 1
+TRACE_FILE_HEADER = struct.Struct('<4sIq')
 
 class NetworkTrace:
     """
@@ -10,11 +18,124 @@ class NetworkTrace:
         Args:
             bandwidths : List of tuples, (Start time in seconds, bandwidth in Mbps)
         """
-        self.bwlist = bandwidths
+        bandwidths = sorted(bandwidths)
+        self._set_arrays(np.array([seg[0] for seg in bandwidths], dtype=np.float64),
+                         np.array([seg[1] for seg in bandwidths], dtype=np.float64))
+
+    def _set_arrays(self, start_times: np.ndarray, bandwidths: np.ndarray, cumulative_mb: np.ndarray = None):
+        """
+        Sets the sorted segment start times and bandwidths, plus the cumulative capacity curve: megabits deliverable
+        between the start of the trace and the start of each segment, used by cumulative_capacity
+        """
+        self.start_times = start_times
+        self.bandwidths = bandwidths
+        if cumulative_mb is None:
+            cumulative_mb = np.zeros(len(start_times), dtype=np.float64)
+            np.cumsum(np.diff(start_times) * bandwidths[:-1], out=cumulative_mb[1:])
+        self.cumulative_mb = cumulative_mb
+
+        # Scalar lookups bisect plain lists, which is several times faster than NumPy on one value at a time. Memory
+        # mapped traces bisect the arrays themselves, so nothing beyond the pages searched is read.
+        if isinstance(start_times, np.memmap):
+            self._start_list, self._bandwidth_list, self._cumulative_list = start_times, bandwidths, cumulative_mb
+        else:
+            self._start_list, self._bandwidth_list = start_times.tolist(), bandwidths.tolist()
+            self._cumulative_list = cumulative_mb.tolist()
+
+    @classmethod
+    def from_arrays(cls, start_times: np.ndarray, bandwidths: np.ndarray) -> 'NetworkTrace':
+        """
+        Creates a trace from arrays of segment start times and bandwidths, without going through a list of tuples
+        Args:
+            start_times : Start time of each segment in seconds
+            bandwidths : Bandwidth of each segment in Mbps
+        :return: NetworkTrace
+        """
+        start_times = np.asarray(start_times, dtype=np.float64)
+        bandwidths = np.asarray(bandwidths, dtype=np.float64)
+        if np.any(np.diff(start_times) < 0):
+            order = np.argsort(start_times, kind='stable')
+            start_times, bandwidths = start_times[order], bandwidths[order]
+
+        trace = cls.__new__(cls)
+        trace._set_arrays(start_times, bandwidths)
+        return trace
+
+    @classmethod
+    def from_file(cls, path: str) -> 'NetworkTrace':
+        """
+        Memory maps a trace file written by write_file. Nothing but the header is read up front, and downloads only
+        touch the pages their binary searches land on, so traces larger than RAM work.
+        Args:
+            path : Trace file
+        :return: NetworkTrace backed by the file
+        """
+        with open(path, 'rb') as f:
+            magic, version, segments = TRACE_FILE_HEADER.unpack(f.read(TRACE_FILE_HEADER.size))
+        if magic != TRACE_FILE_MAGIC or version != TRACE_FILE_VERSION:
+            raise ValueError(f'{path} is not a version {TRACE_FILE_VERSION} trace file')
+
+        arrays = np.memmap(path, dtype='<f8', mode='r', offset=TRACE_FILE_HEADER.size, shape=(3, segments))
+        trace = cls.__new__(cls)
+        trace._set_arrays(arrays[0], arrays[1], arrays[2])
+        return trace
+
+    @staticmethod
+    def write_file(path: str, start_times: np.ndarray, bandwidths: np.ndarray, block_size: int = 1 << 20):
+        """
+        Writes a trace file for from_file, including its cumulative capacity curve. The inputs are processed in blocks,
+        so they can themselves be memory mapped arrays larger than RAM.
+        Args:
+            path : Trace file to write
+            start_times : Strictly increasing start time of each segment in seconds
+            bandwidths : Bandwidth of each segment in Mbps
+            block_size : Number of segments processed at a time
+        """
+        segments = len(start_times)
+        assert segments > 0 and len(bandwidths) == segments, 'Trace needs one bandwidth per start time'
+        with open(path, 'wb') as f:
+            f.write(TRACE_FILE_HEADER.pack(TRACE_FILE_MAGIC, TRACE_FILE_VERSION, segments))
+            f.truncate(TRACE_FILE_HEADER.size + 3 * 8 * segments)
+
+        out = np.memmap(path, dtype='<f8', mode='r+', offset=TRACE_FILE_HEADER.size, shape=(3, segments))
+        prev_time = prev_bw = cumulative = None
+        for lo in range(0, segments, block_size):
+            times = np.asarray(start_times[lo:lo + block_size], dtype=np.float64)
+            bws = np.asarray(bandwidths[lo:lo + block_size], dtype=np.float64)
+            if prev_time is None:
+                steps = np.diff(times) * bws[:-1]
+                block_cumulative = np.cumsum(np.concatenate([[0.0], steps]))
+            else:
+                assert times[0] > prev_time, 'Trace start times must be strictly increasing'
+                steps = np.diff(np.concatenate([[prev_time], times])) * np.concatenate([[prev_bw], bws[:-1]])
+                block_cumulative = np.cumsum(np.concatenate([[cumulative], steps]))[1:]
+            assert np.all(np.diff(times) > 0), 'Trace start times must be strictly increasing'
+
+            out[0, lo:lo + len(times)] = times
+            out[1, lo:lo + len(times)] = bws
+            out[2, lo:lo + len(times)] = block_cumulative
+            prev_time, prev_bw, cumulative = times[-1], bws[-1], block_cumulative[-1]
+        out.flush()
+
+    @property
+    def bwlist(self) -> List[Tuple[float, float]]:
+        """ The trace as a list of tuples, (Start time in seconds, bandwidth in Mbps) """
+        return list(zip(self.start_times.tolist(), self.bandwidths.tolist()))
+
+    def get_segment_index(self, cur_time: float) -> int:
+        """ Returns the index of the time segment of cur_time, the last segment starting strictly before cur_time """
+        return max(bisect_left(self._start_list, cur_time) - 1, 0)
 
     def get_current_timesegment(self, cur_time: float) -> Tuple[float, float]:
         """ Returns the time segement of cur_time as a tuple (Start time in seconds, bandwidth in Mbps) """
-        return min(self.bwlist, key=lambda x: abs(x[0] - cur_time) if cur_time > x[0] else math.inf)
+        segment = self.get_segment_index(cur_time)
+        return float(self._start_list[segment]), float(self._bandwidth_list[segment])
+
+    def cumulative_capacity(self, time: float) -> float:
+        """ Returns the megabits this trace can deliver between its start and the given time (seconds) """
+        segment = self.get_segment_index(time)
+        elapsed = time - self._start_list[segment]
+        return float(self._cumulative_list[segment] + elapsed * self._bandwidth_list[segment])
 
     def simulate_download_from_time(self, time: float, size: float) -> float:
         """
@@ -25,25 +146,133 @@ class NetworkTrace:
             size : Size of the download in Mb
         :return: float Number of seconds to download
         """
+        # Only the segments the download spans are walked, with the same arithmetic as the original scan of the whole
+        # trace, so download times stay bit for bit the same
+        start_times, bandwidths = self._start_list, self._bandwidth_list
+        segment = self.get_segment_index(time)
+        last = len(start_times) - 1
         cum_time = 0
-        timeseg = self.get_current_timesegment(time)
         while True:
-            # Find next bandwidth change
-            try:
-                next_set = self.bwlist[self.bwlist.index(timeseg) + 1]
-            except IndexError:
-                cum_time += size / timeseg[1]
-                return cum_time
+            bandwidth = bandwidths[segment]
+            if segment == last:
+                cum_time += size / bandwidth
+                return float(cum_time)
 
             # Drain download by time and throughput
-            down_time = next_set[0] - time
+            down_time = start_times[segment + 1] - time
             cum_time += down_time
-            size -= down_time * timeseg[1]
+            size -= down_time * bandwidth
 
             # Refund unused time
             if size <= 0:
-                cum_time += size / timeseg[1]
-                return cum_time
+                cum_time += size / bandwidth
+                return float(cum_time)
+
+            segment += 1
+            time = start_times[segment]
+
+    def simulate_downloads(self, times, sizes) -> np.ndarray:
+        """
+        Batched version of simulate_download_from_time with identical results. Every download walks its segments in
+        lockstep with the others, so the loop runs once per segment crossed by the longest download.
+        Args:
+            times : Array-like of download start times (seconds)
+            sizes : Array-like of download sizes in Mb, broadcast against times
+        :return: np.ndarray Number of seconds to download for each pair
+        """
+        times, sizes = np.broadcast_arrays(np.asarray(times, dtype=np.float64), np.asarray(sizes, dtype=np.float64))
+        segments = np.maximum(np.searchsorted(self.start_times, times, side='left') - 1, 0)
+        last = np.full(segments.shape, len(self.start_times) - 1)
+        return _walk_segments(self.start_times, self.bandwidths, segments.ravel(), last.ravel(), times.ravel(),
+                             sizes.ravel()).reshape(times.shape)
+
+
+def _walk_segments(start_times: np.ndarray, bandwidths: np.ndarray, segments: np.ndarray, last: np.ndarray,
+                  times: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+    """
+    Vectorized NetworkTrace.simulate_download_from_time walk. Downloads drop out of the arrays as they finish.
+    Args:
+        start_times : 1-D array of segment start times (seconds)
+        bandwidths : 1-D array of segment bandwidths in Mbps
+        segments : Index of the segment each download starts in
+        last : Index of the last segment of the trace each download runs on
+        times : Download start times (seconds)
+        sizes : Download sizes in Mb
+    :return: np.ndarray Number of seconds to download for each download
+    """
+    result = np.empty(len(segments), dtype=np.float64)
+    pending = np.arange(len(segments))
+    segments = np.asarray(segments, dtype=np.int64)
+    times = np.asarray(times, dtype=np.float64)
+    sizes = np.array(sizes, dtype=np.float64)
+    cum_time = np.zeros(len(segments), dtype=np.float64)
+    while len(pending):
+        bandwidth = bandwidths[segments]
+        at_end = segments == last
+        with np.errstate(invalid='ignore'):
+            down_time = np.where(at_end, 0.0, start_times[np.minimum(segments + 1, last)] - times)
+        cum_time = np.where(at_end, cum_time, cum_time + down_time)
+        sizes = np.where(at_end, sizes, sizes - down_time * bandwidth)
+
+        # Refund unused time, or in the last segment take the rest of the download at its bandwidth
+        done = at_end | (sizes <= 0)
+        result[pending[done]] = cum_time[done] + sizes[done] / bandwidth[done]
+
+        keep = ~done
+        pending, segments, sizes, cum_time = pending[keep], segments[keep] + 1, sizes[keep], cum_time[keep]
+        last = last[keep]
+        times = start_times[segments]
+    return result
+
+
+class NetworkTraceBatch:
+    """
+    Class to stack several NetworkTraces into padded 2-D arrays and simulate one download on each of them at once
+    """
+    def __init__(self, traces: List[NetworkTrace]):
+        """
+        Args:
+            traces : NetworkTraces to stack, one row each
+        """
+        self.segment_counts = np.array([len(t.start_times) for t in traces], dtype=np.int64)
+        shape = (len(traces), int(self.segment_counts.max()))
+
+        # Rows are padded with +inf start times so searches never land in the padding
+        self.start_times = np.full(shape, np.inf)
+        self.bandwidths = np.full(shape, np.nan)
+        for row, trace in enumerate(traces):
+            self.start_times[row, :len(trace.start_times)] = trace.start_times
+            self.bandwidths[row, :len(trace.bandwidths)] = trace.bandwidths
+
+    @staticmethod
+    def _searchsorted_rows(sorted_rows: np.ndarray, rows: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """ np.searchsorted(sorted_rows[row], value, side='left') for every (row, value) pair """
+        lo = np.zeros(len(rows), dtype=np.int64)
+        hi = np.full(len(rows), sorted_rows.shape[1], dtype=np.int64)
+        while True:
+            searching = lo < hi
+            if not searching.any():
+                return lo
+            mid = np.minimum((lo + hi) // 2, sorted_rows.shape[1] - 1)
+            go_right = sorted_rows[rows, mid] < values
+            lo = np.where(searching & go_right, mid + 1, lo)
+            hi = np.where(searching & ~go_right, mid, hi)
+
+    def simulate_downloads(self, rows, times, sizes) -> np.ndarray:
+        """
+        Same calculation as NetworkTrace.simulate_downloads, with each download on its own trace
+        Args:
+            rows : Array of trace indices, one per download
+            times : Array of download start times (seconds)
+            sizes : Array of download sizes in Mb
+        :return: np.ndarray Number of seconds to download for each row
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        times = np.asarray(times, dtype=np.float64)
+        sizes = np.asarray(sizes, dtype=np.float64)
 
-            timeseg = next_set
-            time = timeseg[0]
\ No newline at end of file
+        # The walk indexes the rows laid end to end
+        width = self.start_times.shape[1]
+        segments = np.maximum(self._searchsorted_rows(self.start_times, rows, times) - 1, 0)
+        return _walk_segments(self.start_times.ravel(), self.bandwidths.ravel(), rows * width + segments,
+                             rows * width + self.segment_counts[rows] - 1, times, sizes)
@@ -0,0 +1,87 @@
+import time
+from typing import Dict, List
+import numpy as np
+
+class Profiler:
+    """
+    Low-overhead per-phase timer for the simulator. Phases are timed with perf_counter laps, so each measurement is one
+    clock read and a dict update. Phases listed in sampled_phases also keep every duration, keyed by student algorithm,
+    for latency percentiles.
+    """
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, sampled_phases=('student_entrypoint',)):
+        """
+        Args:
+            sampled_phases : Phases whose individual durations are kept for percentiles
+        """
+        self.sampled_phases = tuple(sampled_phases)
+        self.totals: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self.wall = 0.0
+        self.algo = None
+
+    def lap(self, phase: str, start: float) -> float:
+        """
+        Charges the time since start to phase
+        Args:
+            phase : Name of the phase
+            start : perf_counter value the phase started at
+        :return: float perf_counter value now, the start of the next phase
+        """
+        now = time.perf_counter()
+        elapsed = now - start
+        self.totals[phase] = self.totals.get(phase, 0.0) + elapsed
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        if phase in self.sampled_phases:
+            self.samples.setdefault(f'{phase} (student{self.algo})', []).append(elapsed)
+        return now
+
+    def merge(self, other: 'Profiler'):
+        """ Adds the measurements of another profiler, e.g. one returned by a worker process """
+        for phase, total in other.totals.items():
+            self.totals[phase] = self.totals.get(phase, 0.0) + total
+            self.calls[phase] = self.calls.get(phase, 0) + other.calls[phase]
+        for key, samples in other.samples.items():
+            self.samples.setdefault(key, []).extend(samples)
+        self.wall += other.wall
+
+    def report(self):
+        """ Prints the per-phase breakdown table and the latency percentiles of the sampled phases """
+        print('=' * 120)
+        print('Profile:\n')
+        print(f'\t{"Phase":<28}{"Calls":>10}{"Total (s)":>14}{"Share":>9}{"Mean (us)":>14}')
+        wall = self.wall or sum(self.totals.values())
+        for phase, total in sorted(self.totals.items(), key=lambda item: -item[1]):
+            calls = self.calls[phase]
+            print(f'\t{phase:<28}{calls:>10}{total:>14.4f}{100 * total / wall:>8.1f}%{1e6 * total / calls:>14.1f}')
+        untimed = wall - sum(self.totals.values())
+        print(f'\t{"(untimed)":<28}{"":>10}{untimed:>14.4f}{100 * untimed / wall:>8.1f}%')
+        print(f'\t{"Wall clock":<28}{"":>10}{wall:>14.4f}')
+
+        if self.samples:
+            print(f'\n\t{"Latency":<38}{"Calls":>10}{"p50 (us)":>12}{"p99 (us)":>12}{"Max (us)":>12}')
+            for key, samples in sorted(self.samples.items()):
+                p50, p99 = np.percentile(samples, [50, 99]) * 1e6
+                print(f'\t{key:<38}{len(samples):>10}{p50:>12.1f}{p99:>12.1f}{1e6 * max(samples):>12.1f}')
+        print('=' * 120)
+
+    @staticmethod
+    def run_cprofile(output_path: str, func, *args, **kwargs):
+        """
+        Runs func under cProfile, dumps the stats for pstats / snakeviz to output_path and prints the functions with
+        the most cumulative time
+        Args:
+            output_path : File to dump the stats to
+            func : Function to run with the remaining arguments
+        :return: Whatever func returns
+        """
+        import cProfile, pstats  # only needed with --profile-out
+
+        profile = cProfile.Profile()
+        result = profile.runcall(func, *args, **kwargs)
+        profile.dump_stats(output_path)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+        print(f'cProfile stats written to {output_path}.')
+        return result
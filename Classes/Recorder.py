@@ -0,0 +1,87 @@
+from typing import List, Tuple
+
+class Recorder:
+    """
+    Receives events from the simulator main loop. The base class ignores every event, subclasses override the ones
+    they need. Events are plain method calls with plain values, so recording costs next to nothing per chunk, and
+    anything expensive (plots, files) belongs in a reporting stage after the session.
+    """
+    def session_start(self, config_file: str, student_algo: str):
+        """
+        Called before the first chunk of a session
+        Args:
+            config_file : Test file of the session
+            student_algo : Student algorithm being run
+        """
+
+    def chunk(self, chunknum: int, quality: int, bitrate: float, download_time: float, rebuffer_time: float,
+              buffer_seconds: float, time: float):
+        """
+        Called after every chunk download
+        Args:
+            chunknum : Index of the chunk
+            quality : Quality chosen by the student
+            bitrate : Size of the chunk at that quality in Mb
+            download_time : Seconds the download took
+            rebuffer_time : Seconds of rebuffering the download caused
+            buffer_seconds : Seconds of video in the buffer once the chunk is added
+            time : Simulated time once the chunk is in the buffer
+        """
+
+    def session_end(self, results: Tuple[float, float, float, float]):
+        """
+        Called once the session is over
+        Args:
+            results : The total quality, total variation, rebuffer time, and user QoE of the session
+        """
+
+    def student_summary(self, summary: str):
+        """
+        Called at the end of a session with the student's own report of it
+        Args:
+            summary : What the student module's session_summary() hook returned, '' if it has none
+        """
+
+
+class SessionRecord:
+    """
+    Per-chunk decisions and outcomes of one session, as collected by DecisionRecorder
+    """
+    def __init__(self, config_file: str, student_algo: str):
+        self.config_file = config_file
+        self.student_algo = student_algo
+        self.qualities: List[int] = []
+        self.bitrates: List[float] = []
+        self.download_times: List[float] = []
+        self.rebuffer_times: List[float] = []
+        self.buffer_seconds: List[float] = []
+        self.times: List[float] = []
+        self.results = None
+        self.student_summary = ''
+
+
+class DecisionRecorder(Recorder):
+    """
+    Collects a SessionRecord for every session it is passed to
+    """
+    def __init__(self):
+        self.sessions: List[SessionRecord] = []
+
+    def session_start(self, config_file: str, student_algo: str):
+        self.sessions.append(SessionRecord(config_file, student_algo))
+
+    def chunk(self, chunknum: int, quality: int, bitrate: float, download_time: float, rebuffer_time: float,
+              buffer_seconds: float, time: float):
+        session = self.sessions[-1]
+        session.qualities.append(quality)
+        session.bitrates.append(bitrate)
+        session.download_times.append(download_time)
+        session.rebuffer_times.append(rebuffer_time)
+        session.buffer_seconds.append(buffer_seconds)
+        session.times.append(time)
+
+    def session_end(self, results: Tuple[float, float, float, float]):
+        self.sessions[-1].results = results
+
+    def student_summary(self, summary: str):
+        self.sessions[-1].student_summary = summary
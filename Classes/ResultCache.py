@@ -0,0 +1,125 @@
+import hashlib
+import importlib
+import os
+from typing import Dict, Tuple
+import numpy as np
+from Classes.Recorder import SessionRecord
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PATH = os.path.join(REPO_DIRECTORY, '.result_cache.sqlite')
+
+# Sources that decide how a session plays out besides the test and the student. Editing any of them invalidates
+# every cached session, as does bumping SCHEMA_VERSION.
+SIMULATOR_SOURCES = ('simulator.py', 'Classes/NetworkTrace.py', 'Classes/SimBuffer.py', 'Classes/Scorecard.py',
+                     'Classes/UpcomingBitrates.py', 'Classes/Recorder.py')
+SCHEMA_VERSION = 2
+
+# Per-chunk logs of a SessionRecord, stored as the rows of one float64 matrix
+LOG_FIELDS = ('qualities', 'bitrates', 'download_times', 'rebuffer_times', 'buffer_seconds', 'times')
+
+
+def file_digest(path: str) -> str:
+    """ Returns the SHA-256 of the contents of a file """
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk cache of simulated sessions in an SQLite file. A session is keyed by the content hashes of the test file,
+    the student module and the simulator sources, so editing any of them simply misses the cache. A student module
+    whose decisions depend on anything else, like an environment variable or a data file, can define cache_key()
+    returning a string that identifies that state. A cache_key() returning None marks the student's sessions as not
+    cacheable, for decisions that depend on the sessions run before them. Modules the student imports are not
+    hashed.
+    """
+    def __init__(self, path: str = DEFAULT_PATH):
+        """
+        Args:
+            path : SQLite file to keep the sessions in. Created if it does not exist.
+        """
+        import sqlite3  # deferred, only cached runs need it
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                                    'key TEXT PRIMARY KEY, config_file TEXT, student_algo TEXT, '
+                                    'total_quality INTEGER, total_variation INTEGER, rebuffer_time REAL, qoe REAL, '
+                                    'logs BLOB, student_summary TEXT)')
+            # Files from before the student summaries were stored. Their sessions are keyed on the old schema
+            # version, so they are never hit again.
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(sessions)')]
+            if 'student_summary' not in columns:
+                self.connection.execute('ALTER TABLE sessions ADD COLUMN student_summary TEXT')
+        self.simulator_digest = hashlib.sha256(''.join(
+            file_digest(os.path.join(REPO_DIRECTORY, source)) for source in SIMULATOR_SOURCES).encode()).hexdigest()
+        self.student_digests: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def student_digest(self, student_algo) -> str:
+        """
+        Returns the hash of a student module's source and cache_key(), computed once per cache. None if the student's
+        sessions are not cacheable.
+        """
+        student_algo = str(student_algo)
+        if student_algo not in self.student_digests:
+            student = importlib.import_module(f'student.student{student_algo}')
+            cache_key = getattr(student, 'cache_key', None)
+            extra = cache_key() if callable(cache_key) else ''
+            self.student_digests[student_algo] = None if extra is None else f'{file_digest(student.__file__)}:{extra}'
+        return self.student_digests[student_algo]
+
+    def key(self, config_file: str, student_algo) -> str:
+        """ Returns the cache key of running a student algorithm on a test file, None if it is not cacheable """
+        student_digest = self.student_digest(student_algo)
+        if student_digest is None:
+            return None
+        parts = (str(SCHEMA_VERSION), self.simulator_digest, file_digest(config_file), student_digest)
+        return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+    def get(self, config_file: str, student_algo) -> SessionRecord:
+        """
+        Looks up a session
+        Args:
+            config_file : Path to the test file
+            student_algo : Student algorithm
+        :return: SessionRecord with the per-chunk logs and results of the session, None if it is not cached
+        """
+        key = self.key(config_file, student_algo)
+        row = None if key is None else self.connection.execute(
+            'SELECT total_quality, total_variation, rebuffer_time, qoe, logs, student_summary FROM sessions '
+            'WHERE key = ?',
+            (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        record = SessionRecord(config_file, str(student_algo))
+        logs = np.frombuffer(row[4], dtype=np.float64).reshape(len(LOG_FIELDS), -1)
+        record.qualities = logs[0].astype(np.int64).tolist()
+        for field, log in zip(LOG_FIELDS[1:], logs[1:]):
+            setattr(record, field, log.tolist())
+        record.results = tuple(row[:4])
+        record.student_summary = row[5]
+        return record
+
+    def put(self, record: SessionRecord):
+        """ Stores a finished session recorded by a DecisionRecorder, unless it is not cacheable """
+        key = self.key(record.config_file, record.student_algo)
+        if key is None:
+            return
+        logs = np.array([getattr(record, field) for field in LOG_FIELDS], dtype=np.float64).reshape(len(LOG_FIELDS), -1)
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (key, record.config_file, str(record.student_algo), *record.results,
+                                     logs.tobytes(), record.student_summary))
+
+    def clear(self):
+        """ Removes every cached session """
+        with self.connection:
+            self.connection.execute('DELETE FROM sessions')
+
+    def close(self):
+        self.connection.close()
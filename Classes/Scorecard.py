@@ -1,24 +1,68 @@
-from typing import Tuple
+from typing import Dict, List, Tuple
+import numpy as np
 
 class Scorecard:
     """
     A class for logging video player chunk choices and calculating the resulting view metrics
     """
-    def __init__(self, quality_coeff: float, rebuffer_coeff: float, switch_coeff: float, chunk_length: float):
+    __slots__ = ('quality_coeff', 'rebuffer_coeff', 'switch_coeff', 'chunk_length',
+                 'chunk_count', 'arrival_times', 'qualities', 'bitrates',
+                 'rebuffer_count', 'rebuffer_times', 'rebuffer_lengths', 'rebuffer_chunknums',
+                 'running_quality', 'running_variation', 'running_rebuffer_time')
+
+    def __init__(self, quality_coeff: float, rebuffer_coeff: float, switch_coeff: float, chunk_length: float,
+                 expected_chunks: int = 64):
         """
         Args:
             quality_coeff : Used for calculating video QoE. See output_results for explanation.
             rebuffer_coeff : Used for calculating video QoE. See output_results for explanation.
             switch_coeff : Used for calculating video QoE. See output_results for explanation.
             chunk_length : # of seconds of video each chunk contains.
+            expected_chunks : # of chunks to preallocate log space for. The logs grow past this if needed.
         """
         self.quality_coeff = quality_coeff
         self.rebuffer_coeff = rebuffer_coeff
         self.switch_coeff = switch_coeff
         self.chunk_length = chunk_length
 
-        self.chunk_info = []
-        self.rebuffers = []
+        # Event logs are preallocated arrays, only the first chunk_count / rebuffer_count entries are valid
+        capacity = max(expected_chunks, 1)
+        self.chunk_count = 0
+        self.arrival_times = np.empty(capacity, dtype=np.float64)
+        self.qualities = np.empty(capacity, dtype=np.int64)
+        self.bitrates = np.empty(capacity, dtype=np.float64)
+
+        self.rebuffer_count = 0
+        self.rebuffer_times = np.empty(capacity, dtype=np.float64)
+        self.rebuffer_lengths = np.empty(capacity, dtype=np.float64)
+        self.rebuffer_chunknums = np.empty(capacity, dtype=np.int64)
+
+        # Running totals updated as events are logged, so the QoE so far can be read mid-session
+        self.running_quality = 0
+        self.running_variation = 0
+        self.running_rebuffer_time = 0.0
+
+    @staticmethod
+    def _grow(log: np.ndarray) -> np.ndarray:
+        """ Returns a copy of log with double the capacity """
+        grown = np.empty(2 * len(log), dtype=log.dtype)
+        grown[:len(log)] = log
+        return grown
+
+    @property
+    def chunk_info(self) -> List[Dict]:
+        """ The logged bitrate choices as a list of dicts with keys 'arrival time', 'quality' and 'bitrate' """
+        return [{'arrival time': t, 'quality': q, 'bitrate': b} for t, q, b in
+                zip(self.arrival_times[:self.chunk_count].tolist(), self.qualities[:self.chunk_count].tolist(),
+                    self.bitrates[:self.chunk_count].tolist())]
+
+    @property
+    def rebuffers(self) -> List[Dict]:
+        """ The logged rebuffers as a list of dicts with keys 'time', 'rebuffer_length' and 'chunknum' """
+        return [{'time': t, 'rebuffer_length': length, 'chunknum': c} for t, length, c in
+                zip(self.rebuffer_times[:self.rebuffer_count].tolist(),
+                    self.rebuffer_lengths[:self.rebuffer_count].tolist(),
+                    self.rebuffer_chunknums[:self.rebuffer_count].tolist())]
 
     def log_bitrate_choice(self, time: float, quality: int, bitrate: float):
         """
@@ -28,9 +72,19 @@ class Scorecard:
             quality : Quality level of the chunk.
             bitrate : # of megabytes the chunk takes up.
         """
-        self.chunk_info.append(
-            {'arrival time': time, 'quality': quality, 'bitrate': bitrate}
-        )
+        if self.chunk_count == len(self.qualities):
+            self.arrival_times = self._grow(self.arrival_times)
+            self.qualities = self._grow(self.qualities)
+            self.bitrates = self._grow(self.bitrates)
+
+        self.running_quality += quality
+        if self.chunk_count:
+            self.running_variation += abs(quality - int(self.qualities[self.chunk_count - 1]))
+
+        self.arrival_times[self.chunk_count] = time
+        self.qualities[self.chunk_count] = quality
+        self.bitrates[self.chunk_count] = bitrate
+        self.chunk_count += 1
 
     def log_rebuffer(self, time: float, rebuffer_length: float, chunknum: int):
         """
@@ -41,9 +95,65 @@ class Scorecard:
             chunknum : Which chunk is being waited on.
         """
         if rebuffer_length > .01:
-            self.rebuffers.append(
-                {'time': time, 'rebuffer_length': rebuffer_length, 'chunknum': chunknum}
-            )
+            if self.rebuffer_count == len(self.rebuffer_lengths):
+                self.rebuffer_times = self._grow(self.rebuffer_times)
+                self.rebuffer_lengths = self._grow(self.rebuffer_lengths)
+                self.rebuffer_chunknums = self._grow(self.rebuffer_chunknums)
+
+            self.rebuffer_times[self.rebuffer_count] = time
+            self.rebuffer_lengths[self.rebuffer_count] = rebuffer_length
+            self.rebuffer_chunknums[self.rebuffer_count] = chunknum
+            self.rebuffer_count += 1
+            self.running_rebuffer_time += rebuffer_length
+
+    def log_bitrate_choices(self, times: np.ndarray, qualities: np.ndarray, bitrates: np.ndarray):
+        """
+        Logs a sequence of bitrate choices at once. Same as calling log_bitrate_choice for each entry in order.
+        Args:
+            times : Times at which the chunks finish downloading.
+            qualities : Quality levels of the chunks.
+            bitrates : # of megabytes each chunk takes up.
+        """
+        qualities = np.asarray(qualities, dtype=np.int64)
+        end = self.chunk_count + len(qualities)
+        while end > len(self.qualities):
+            self.arrival_times = self._grow(self.arrival_times)
+            self.qualities = self._grow(self.qualities)
+            self.bitrates = self._grow(self.bitrates)
+
+        if len(qualities):
+            previous = self.qualities[self.chunk_count - 1:self.chunk_count]
+            self.running_quality += int(qualities.sum())
+            self.running_variation += int(np.abs(np.diff(np.concatenate([previous, qualities]))).sum())
+
+        self.arrival_times[self.chunk_count:end] = times
+        self.qualities[self.chunk_count:end] = qualities
+        self.bitrates[self.chunk_count:end] = bitrates
+        self.chunk_count = end
+
+    def log_rebuffers(self, times: np.ndarray, rebuffer_lengths: np.ndarray, chunknums: np.ndarray):
+        """
+        Logs a sequence of rebuffers at once. Same as calling log_rebuffer for each entry in order.
+        Args:
+            times : Times at which the rebuffers occur.
+            rebuffer_lengths : # of seconds each rebuffer lasts. Entries <= .01 are not logged.
+            chunknums : Which chunk is being waited on for each rebuffer.
+        """
+        rebuffer_lengths = np.asarray(rebuffer_lengths, dtype=np.float64)
+        logged = rebuffer_lengths > .01
+        count = int(logged.sum())
+        end = self.rebuffer_count + count
+        while end > len(self.rebuffer_lengths):
+            self.rebuffer_times = self._grow(self.rebuffer_times)
+            self.rebuffer_lengths = self._grow(self.rebuffer_lengths)
+            self.rebuffer_chunknums = self._grow(self.rebuffer_chunknums)
+
+        self.rebuffer_times[self.rebuffer_count:end] = np.asarray(times)[logged]
+        self.rebuffer_lengths[self.rebuffer_count:end] = rebuffer_lengths[logged]
+        self.rebuffer_chunknums[self.rebuffer_count:end] = np.asarray(chunknums)[logged]
+        self.rebuffer_count = end
+        for length in rebuffer_lengths[logged].tolist():
+            self.running_rebuffer_time += length
 
     def count_switches(self, print_output: bool = False) -> int:
         """
@@ -52,21 +162,17 @@ class Scorecard:
             print_output : Whether to print switch info.
         :return: int Total variation
         """
-        variation = 0
-        text = ''
-        for i in range(1, len(self.chunk_info)):
-            if self.chunk_info[i]['quality'] == self.chunk_info[i - 1]['quality']:
-                continue
-
-            # Found a switch!
-            variation += abs(self.chunk_info[i]['quality'] - self.chunk_info[i - 1]['quality'])
-            if print_output:
-                text += f'\tQuality switch detected!.' \
-                        f' Chunk {i - 1} quality {self.chunk_info[i - 1]["quality"]} ->' \
-                        f' Chunk {i} quality {self.chunk_info[i]["quality"]}.' \
-                        f' Changed by {abs(self.chunk_info[i - 1]["quality"] - self.chunk_info[i]["quality"])}.\n'
+        qualities = self.qualities[:self.chunk_count]
+        changes = np.abs(np.diff(qualities))
+        variation = int(changes.sum())
 
         if print_output:
+            text = ''
+            for i in np.flatnonzero(changes).tolist():
+                text += f'\tQuality switch detected!.' \
+                        f' Chunk {i} quality {qualities[i]} ->' \
+                        f' Chunk {i + 1} quality {qualities[i + 1]}.' \
+                        f' Changed by {changes[i]}.\n'
             print(f'{variation} total variation detected.\n')
             print(text)
         return variation
@@ -78,16 +184,16 @@ class Scorecard:
             print_output : Whether to print rebuffering info.
         :return: float total rebuffer time
         """
-        rebuff_time = sum(r['rebuffer_length'] for r in self.rebuffers)
-        text = ''
-        for rebuffer in self.rebuffers:
-            if print_output:
+        # Added up in log order like the list of rebuffer dicts was, np.sum adds pairwise and rounds differently
+        rebuff_time = sum(self.rebuffer_lengths[:self.rebuffer_count].tolist())
+
+        if print_output:
+            text = ''
+            for rebuffer in self.rebuffers:
                 text += f'\tRebuffer at time {rebuffer["time"]:.2f} detected! ' \
                         f'Lasted {rebuffer["rebuffer_length"]:.2f}' \
                         f' seconds. Buffering between chunks {rebuffer["chunknum"] - 1} and {rebuffer["chunknum"]}\n'
-
-        if print_output:
-            print(f'{len(self.rebuffers)} rebuffers detected. Total rebuffer time: {rebuff_time:.2f}')
+            print(f'{self.rebuffer_count} rebuffers detected. Total rebuffer time: {rebuff_time:.2f}')
             print(text)
 
         return rebuff_time
@@ -99,11 +205,23 @@ class Scorecard:
             print_output : Whether to print quality info.
         :return: float total video quality
         """
-        total = sum(c['quality'] for c in self.chunk_info)
+        total = int(self.qualities[:self.chunk_count].sum())
         if print_output:
-            print(f'Total chunk quality is {total}, average chunk quality {round(total / len(self.chunk_info), 3)}\n')
+            print(f'Total chunk quality is {total}, average chunk quality {round(total / self.chunk_count, 3)}\n')
         return total
 
+    def current_qoe(self) -> float:
+        """
+        Returns the user QoE of the chunks logged so far in O(1) from the running totals. Once the session is over
+        this matches the QoE from get_qual_rebuff_var_qoe.
+        :return: float user QoE so far, 0 if no chunks have been logged
+        """
+        if not self.chunk_count:
+            return 0.0
+        qoe = self.running_quality * self.quality_coeff - self.running_rebuffer_time * self.rebuffer_coeff \
+            - self.running_variation * self.switch_coeff
+        return qoe / self.chunk_count
+
     def output_results(self, verbose: bool = False) -> float:
         """
         Prints out the results for this playback. Includes switch, rebuffer, and quality info.
@@ -134,7 +252,7 @@ class Scorecard:
               f' - {self.switch_coeff:.2f}(Variation)] / (Chunk Count)')
 
         qoe = total_quality * self.quality_coeff - rebuff_time * self.rebuffer_coeff - variation * self.switch_coeff
-        qoe /= len(self.chunk_info)
+        qoe /= self.chunk_count
         print(f'User quality of experience: {qoe:.3f}\n')
         print('=' * 120)
 
@@ -149,6 +267,6 @@ class Scorecard:
         rebuff_time = self.get_rebuffer_time()
         variation = self.count_switches()
         qoe = total_quality * self.quality_coeff - rebuff_time * self.rebuffer_coeff - variation * self.switch_coeff
-        qoe /= len(self.chunk_info)
+        qoe /= self.chunk_count
 
         return total_quality, variation, rebuff_time, qoe
@@ -3,6 +3,9 @@ class SimBuffer:
     """
     A class to hold and simulate a buffer
     """
+    __slots__ = ('chunk_duration', 'client_buffer_size', 'seconds_left', 'seconds_played',
+                 'ring', 'ring_start', 'ring_count', 'chunks_dropped', 'occupancy')
+
     def __init__(self, chunk_duration: float, client_buffer_size: float):
         """
         Args:
@@ -13,15 +16,37 @@ class SimBuffer:
         self.client_buffer_size = client_buffer_size
 
         self.seconds_left = 0
-        self.chunks = []
         self.seconds_played = 0
 
+        # Sizes of the chunks not yet dropped, oldest first from ring_start, and their running sum. The ring holds
+        # two full buffers, so played chunks are dropped in batches once it fills up rather than on every download.
+        self.ring = [0.0] * (2 * (int(client_buffer_size / chunk_duration) + 2))
+        self.ring_start = 0
+        self.ring_count = 0
+        self.chunks_dropped = 0
+        self.occupancy = 0.0
+
+    def _drop_played_chunks(self):
+        """ Drops the chunks that seconds_played has moved past from the ring """
+        current_chunk = int(self.seconds_played // self.chunk_duration + .001)  # .001 in case of rounding errors
+        while self.ring_count and self.chunks_dropped < current_chunk:
+            self.occupancy -= self.ring[self.ring_start]
+            self.ring_start = (self.ring_start + 1) % len(self.ring)
+            self.ring_count -= 1
+            self.chunks_dropped += 1
+        if not self.ring_count:
+            self.occupancy = 0.0
+
+    def _grow_ring(self):
+        """ Doubles the ring, keeping the chunks in order """
+        ring = self.ring[self.ring_start:] + self.ring[:self.ring_start]
+        self.ring = ring + [0.0] * len(ring)
+        self.ring_start = 0
+
     def get_occupancy(self) -> float:
         """ Returns #Mb in the buffer. """
-        current_chunk = int(self.seconds_played // self.chunk_duration + .001)  # .001 in case of rounding errors
-        if current_chunk < len(self.chunks):
-            return sum(self.chunks[current_chunk:])
-        return 0
+        self._drop_played_chunks()
+        return self.occupancy if self.ring_count else 0
 
     def sim_chunk_download(self, chunk_size: float, playback_time) -> float:
         """
@@ -34,7 +59,17 @@ class SimBuffer:
         :return: float Number of seconds rebuffered
         """
         rebuffer_time = self.burn_time(playback_time)
-        self.chunks.append(chunk_size)
+        ring, count = self.ring, self.ring_count
+        if count == len(ring):
+            self._drop_played_chunks()
+            if self.ring_count == len(ring):
+                # Only reachable through rounding in seconds_played, the ring holds every chunk a full buffer can
+                self._grow_ring()
+            ring, count = self.ring, self.ring_count
+        end = self.ring_start + count
+        ring[end - len(ring) if end >= len(ring) else end] = chunk_size
+        self.ring_count = count + 1
+        self.occupancy += chunk_size
         self.seconds_left += self.chunk_duration
         return rebuffer_time
 
@@ -48,8 +83,8 @@ class SimBuffer:
         :return: float Number of seconds rebuffered
         """
         rebuffer_time = max(playback_time - self.seconds_left, 0)
-        self.seconds_left = max(self.seconds_left - playback_time, 0)
         self.seconds_played += min(playback_time, self.seconds_left)
+        self.seconds_left = max(self.seconds_left - playback_time, 0)
         return rebuffer_time
 
     def wait_until_buffer_is_not_full(self, verbose: bool) -> float:
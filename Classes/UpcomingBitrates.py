@@ -0,0 +1,60 @@
+from collections.abc import Sequence
+from typing import List
+import numpy as np
+
+class UpcomingBitrates(Sequence):
+    """
+    Read-only view of the quality bitrates of a run of chunks, backed by a 2-D array (chunks x quality levels).
+    Behaves like the list of lists it replaces: len, indexing, iteration and slicing all work, and each chunk is
+    returned as a list of floats. Slicing returns another view without copying, so handing the rest of the video to
+    the student every chunk costs O(1) instead of O(chunks).
+    """
+    __slots__ = ('_rows',)
+
+    def __init__(self, rows: np.ndarray):
+        """
+        Args:
+            rows : Bitrates of each chunk at each quality level, shape (chunks, quality levels)
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        rows = rows.reshape(len(rows), -1 if rows.size else 0)
+        rows.flags.writeable = False
+        self._rows = rows
+
+    @property
+    def array(self) -> np.ndarray:
+        """ The bitrates as a read-only array of shape (chunks, quality levels), for vectorized algorithms """
+        return self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return UpcomingBitrates(self._rows[index])
+        return self._rows[index].tolist()
+
+    def __iter__(self):
+        for i in range(len(self._rows)):
+            yield self._rows[i].tolist()
+
+    def __array__(self, dtype=None, copy=None):
+        return self._rows if dtype is None else self._rows.astype(dtype)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, UpcomingBitrates):
+            other = other._rows
+        elif not isinstance(other, (Sequence, np.ndarray)) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(row == list(o) for row, o in zip(self, other))
+
+    __hash__ = None
+
+    def tolist(self) -> List[List[float]]:
+        """ Copies the bitrates out as a list of lists """
+        return self._rows.tolist()
+
+    def __repr__(self) -> str:
+        # Kept O(1): students format whole messages for debug output every chunk, and listing the rest of the video
+        # there would make sessions quadratic again
+        return f'UpcomingBitrates({self._rows.shape[0]} chunks x {self._rows.shape[1]} quality levels)'
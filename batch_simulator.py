@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+import importlib.util
+import os
+import sys
+from typing import Callable, List, Tuple
+import numpy as np
+import simulator
+import tester
+from Classes import Scorecard
+from Classes.UpcomingBitrates import UpcomingBitrates
+from Classes.NetworkTrace import NetworkTraceBatch
+
+
+class BatchClientMessage:
+    """
+    Vectorized counterpart of ClientMessage. Holds one entry per active session, i.e. per session that still has a
+    chunk to download this step. Per-session fields are arrays in the order of sessions.
+    """
+    sessions: np.ndarray                    # Index of each active session in the batch
+    chunknum: int                           # Index of the chunk being requested, the same for every session
+    total_seconds_elapsed: np.ndarray
+    previous_throughput: np.ndarray
+    buffer_seconds_per_chunk: np.ndarray
+    buffer_seconds_until_empty: np.ndarray
+    buffer_max_size: np.ndarray
+    quality_levels: np.ndarray
+    quality_bitrates: np.ndarray            # (active sessions, max quality levels), NaN past each session's levels
+    quality_coefficient: np.ndarray
+    variation_coefficient: np.ndarray
+    rebuffering_coefficient: np.ndarray
+
+    # The whole video of every session in the batch, not only the active ones:
+    #   chunk_bitrates[session, chunk, quality], NaN padded past chunk_counts[session] and each session's levels.
+    #   The upcoming chunks of active session i are chunk_bitrates[sessions[i], chunknum + 1:chunk_counts[sessions[i]]]
+    chunk_bitrates: np.ndarray
+    chunk_counts: np.ndarray
+
+
+# A batch policy takes a BatchClientMessage and returns an integer array with one quality per active session
+BatchPolicy = Callable[[BatchClientMessage], np.ndarray]
+
+
+def load_student_copies(student_algo: str, copies: int) -> List:
+    """
+    Loads separate copies of a student module, so that sessions running side by side do not share module-level state
+    Args:
+        student_algo : Student algorithm to load
+        copies : Number of copies
+    :return: List of student modules
+    """
+    path = f'./student/student{student_algo}.py'
+    assert os.path.exists(path), f'Could not find student algorithm {path}!'
+    modules = []
+    for session in range(copies):
+        spec = importlib.util.spec_from_file_location(f'student.student{student_algo}_session{session}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        modules.append(module)
+    return modules
+
+
+class StudentPolicy:
+    """
+    Adapts a studentX.py algorithm to the batch policy interface. Every session gets its own copy of the student
+    module, so module-level state is not shared between sessions.
+    """
+    def __init__(self, student_algo: str, sessions: int):
+        """
+        Args:
+            student_algo : Student algorithm to run
+            sessions : Number of sessions in the batch
+        """
+        self.modules = load_student_copies(student_algo, sessions)
+
+    def __call__(self, batch: BatchClientMessage) -> np.ndarray:
+        qualities = []
+        for i, session in enumerate(batch.sessions.tolist()):
+            levels = int(batch.quality_levels[i])
+            student = self.modules[session]
+            message = student.ClientMessage()
+            message.total_seconds_elapsed = float(batch.total_seconds_elapsed[i])
+            message.previous_throughput = float(batch.previous_throughput[i])
+            message.buffer_seconds_per_chunk = float(batch.buffer_seconds_per_chunk[i])
+            message.buffer_seconds_until_empty = float(batch.buffer_seconds_until_empty[i])
+            message.buffer_max_size = float(batch.buffer_max_size[i])
+            message.quality_levels = levels
+            message.quality_bitrates = batch.quality_bitrates[i, :levels].tolist()
+            message.upcoming_quality_bitrates = \
+                UpcomingBitrates(batch.chunk_bitrates[session, batch.chunknum + 1:batch.chunk_counts[session], :levels])
+            message.quality_coefficient = float(batch.quality_coefficient[i])
+            message.rebuffering_coefficient = float(batch.rebuffering_coefficient[i])
+            message.variation_coefficient = float(batch.variation_coefficient[i])
+            message.in_flight_downloads = []
+
+            quality = student.student_entrypoint(message)
+            qualities.append(quality if isinstance(quality, int) else -1)
+        return np.array(qualities, dtype=np.int64)
+
+
+class BufferBasedPolicy:
+    """
+    Vectorized buffer-based policy (BBA-0): lowest quality below the reservoir, highest quality above
+    reservoir + cushion, and a linear map from buffer level to bitrate in between.
+    """
+    def __init__(self, reservoir: float = 5, cushion: float = 20):
+        """
+        Args:
+            reservoir : Seconds of buffer below which the lowest quality is chosen
+            cushion : Seconds of buffer over which the bitrate ramps from lowest to highest quality
+        """
+        self.reservoir = reservoir
+        self.cushion = cushion
+
+    def __call__(self, batch: BatchClientMessage) -> np.ndarray:
+        lowest = batch.quality_bitrates[:, 0]
+        highest = batch.quality_bitrates[np.arange(len(batch.sessions)), batch.quality_levels - 1]
+        fill = np.clip((batch.buffer_seconds_until_empty - self.reservoir) / self.cushion, 0, 1)
+        target = lowest + fill * (highest - lowest)
+        # Highest quality whose bitrate does not exceed the target (NaN padding compares False)
+        return np.maximum((batch.quality_bitrates <= target[:, None]).sum(axis=1) - 1, 0).astype(np.int64)
+
+
+class BatchSimulator:
+    """
+    Simulates many viewing sessions in lockstep, one chunk of every session per step. Each session has its own test
+    file, trace and buffer. All session state is kept in NumPy arrays.
+    """
+    def __init__(self, config_files: List[str]):
+        """
+        Args:
+            config_files : Test file (.ini) of each session
+        """
+        self.config_files = list(config_files)
+        tests = [simulator.read_test(config_file, False) for config_file in self.config_files]
+        self.traces = NetworkTraceBatch([trace for trace, *_ in tests])
+
+        loggers = [logger for _, logger, *_ in tests]
+        self.quality_coefficient = np.array([logger.quality_coeff for logger in loggers], dtype=np.float64)
+        self.rebuffering_coefficient = np.array([logger.rebuffer_coeff for logger in loggers], dtype=np.float64)
+        self.variation_coefficient = np.array([logger.switch_coeff for logger in loggers], dtype=np.float64)
+
+        self.buffer_max_size = np.array([buffer.client_buffer_size for _, _, buffer, *_ in tests], dtype=np.float64)
+        self.chunk_length = np.array([chunk_length for *_, chunk_length in tests], dtype=np.float64)
+
+        chunk_qualities = [qualities for _, _, _, qualities, _ in tests]
+        self.chunk_counts = np.array([len(qualities) for qualities in chunk_qualities], dtype=np.int64)
+        self.quality_levels = np.array([len(qualities[0]) for qualities in chunk_qualities], dtype=np.int64)
+        self.chunk_bitrates = np.full((len(tests), self.chunk_counts.max(), self.quality_levels.max()), np.nan)
+        for session, qualities in enumerate(chunk_qualities):
+            self.chunk_bitrates[session, :len(qualities), :len(qualities[0])] = qualities
+
+    def run(self, policy: BatchPolicy, print_output: bool = False) -> List[Scorecard.Scorecard]:
+        """
+        Runs every session to completion with the given policy
+        Args:
+            policy : Batch policy choosing the quality of each active session every step
+            print_output : Whether to print output
+        :return: One Scorecard per session, as simulator.main would have logged it
+        """
+        sessions, chunks = len(self.config_files), int(self.chunk_counts.max())
+        current_time = np.zeros(sessions)
+        prev_throughput = np.zeros(sessions)
+        seconds_left = np.zeros(sessions)
+        active = np.ones(sessions, dtype=bool)
+
+        logged = np.zeros(sessions, dtype=np.int64)
+        arrival_times = np.zeros((sessions, chunks))
+        qualities = np.zeros((sessions, chunks), dtype=np.int64)
+        bitrates = np.zeros((sessions, chunks))
+        rebuffer_times = np.zeros((sessions, chunks))
+        rebuffer_lengths = np.zeros((sessions, chunks))
+
+        for chunknum in range(chunks):
+            active &= chunknum < self.chunk_counts
+            idx = np.flatnonzero(active)
+            if not len(idx):
+                break
+
+            # Set up message for the policy
+            message = BatchClientMessage()
+            message.sessions = idx
+            message.chunknum = chunknum
+            message.total_seconds_elapsed = current_time[idx]
+            message.previous_throughput = prev_throughput[idx]
+            message.buffer_seconds_per_chunk = self.chunk_length[idx]
+            message.buffer_seconds_until_empty = seconds_left[idx]
+            message.buffer_max_size = self.buffer_max_size[idx]
+            message.quality_levels = self.quality_levels[idx]
+            message.quality_bitrates = self.chunk_bitrates[idx, chunknum]
+            message.quality_coefficient = self.quality_coefficient[idx]
+            message.variation_coefficient = self.variation_coefficient[idx]
+            message.rebuffering_coefficient = self.rebuffering_coefficient[idx]
+            message.chunk_bitrates = self.chunk_bitrates
+            message.chunk_counts = self.chunk_counts
+
+            # Call policy, sessions with an invalid quality stop like simulator.main does
+            quality = np.asarray(policy(message))
+            valid = (quality >= 0) & (quality < self.quality_levels[idx]) if quality.dtype.kind in 'iu' \
+                else np.zeros(len(idx), dtype=bool)
+            if not valid.all():
+                if print_output:
+                    print(f'Policy returned invalid quality for sessions {idx[~valid].tolist()}, stopping them')
+                active[idx[~valid]] = False
+                idx, quality = idx[valid], quality[valid]
+            chosen_bitrate = self.chunk_bitrates[idx, chunknum, quality]
+
+            # Simulate download, then SimBuffer.sim_chunk_download and wait_until_buffer_is_not_full
+            time_elapsed = self.traces.simulate_downloads(idx, current_time[idx], chosen_bitrate)
+            buffer = seconds_left[idx]
+            rebuff_time = np.maximum(time_elapsed - buffer, 0)
+            buffer = np.maximum(buffer - time_elapsed, 0) + self.chunk_length[idx]
+            wait_time = np.maximum(buffer - self.buffer_max_size[idx], 0)
+            seconds_left[idx] = np.maximum(buffer - wait_time, 0)
+
+            # Update state variables and log
+            prev_throughput[idx] = chosen_bitrate / time_elapsed
+            current_time[idx] += time_elapsed
+            current_time[idx] += wait_time
+            arrival_times[idx, chunknum] = current_time[idx]
+            qualities[idx, chunknum] = quality
+            bitrates[idx, chunknum] = chosen_bitrate
+            rebuffer_times[idx, chunknum] = current_time[idx] - rebuff_time
+            rebuffer_lengths[idx, chunknum] = rebuff_time
+            logged[idx] += 1
+
+        loggers = []
+        for session in range(sessions):
+            n = int(logged[session])
+            logger = Scorecard.Scorecard(float(self.quality_coefficient[session]),
+                                         float(self.rebuffering_coefficient[session]),
+                                         float(self.variation_coefficient[session]),
+                                         float(self.chunk_length[session]), n)
+            logger.log_bitrate_choices(arrival_times[session, :n], qualities[session, :n], bitrates[session, :n])
+            logger.log_rebuffers(rebuffer_times[session, :n], rebuffer_lengths[session, :n], np.arange(n))
+            loggers.append(logger)
+        return loggers
+
+
+def main(config_files: List[str], student_algo: str) -> List[Tuple[float, float, float, float]]:
+    """
+    Runs one session per config file with the given student algorithm, all in lockstep
+    Args:
+        config_files : Path to the config file of each session
+        student_algo : Student algorithm to run
+    :return: One tuple with the total quality, total variation, rebuffer time, and user QoE per session
+    """
+    engine = BatchSimulator(config_files)
+    loggers = engine.run(StudentPolicy(student_algo, len(config_files)))
+    return [logger.get_qual_rebuff_var_qoe() for logger in loggers]
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 2, f'Proper usage: python3 {sys.argv[0]} [student_algo] [config_file ...]'
+    files = sys.argv[2:] or [os.path.join(tester.TEST_DIRECTORY, test) for test in tester.list_tests()]
+    tester.print_report(sys.argv[1], list(zip([os.path.basename(f) for f in files], main(files, sys.argv[1]))))
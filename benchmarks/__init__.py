@@ -0,0 +1,4 @@
+# Benchmark suite for the simulator and the student ABR algorithms. Run from the repository root with
+#   python -m benchmarks run [--out results.json] [--quick] [--filter substring]
+#   python -m benchmarks compare baseline.json results.json [--threshold 0.1]
+#   python -m benchmarks importtime module [--top N]
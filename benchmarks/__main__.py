@@ -0,0 +1,61 @@
+import sys
+from benchmarks import harness, suites
+
+USAGE = f'Proper usage:\n' \
+        f'\tpython3 -m benchmarks run [--out results.json] [--quick] [--filter substring]\n' \
+        f'\tpython3 -m benchmarks compare [baseline.json] [results.json] [--threshold 0.1]\n' \
+        f'\tpython3 -m benchmarks importtime [module] [--top N]'
+
+
+def run(out: str, quick: bool, name_filter: str):
+    """
+    Runs the benchmark suite and saves the results
+    Args:
+        out : JSON file to write the results to
+        quick : Whether to run a smaller sweep
+        name_filter : Only run benchmarks whose name contains this
+    """
+    results = {}
+    for name, params, func, measure_kwargs in suites.all_benchmarks(quick, name_filter=name_filter):
+        result = harness.measure(func, **measure_kwargs)
+        result['params'] = params
+        if 'calls' in params:
+            result['median_per_call'] = result['median'] / params['calls']
+        results[name] = result
+
+        per_call = f' ({harness.format_seconds(result["median_per_call"])} per call)' if 'calls' in params else ''
+        print(f'{name:<70}{harness.format_seconds(result["median"]):>14}{per_call}')
+
+    harness.save_results(out, results)
+    print(f'\nResults for {len(results)} benchmarks written to {out}.')
+
+
+def importtime(module: str, top: int):
+    """
+    Prints where the import time of a module goes, like python -X importtime sorted by cost
+    Args:
+        module : Module to import in a fresh interpreter
+        top : Number of imports to list
+    """
+    times = harness.import_times(module, suites.REPO_DIRECTORY)
+    total = next((cumulative for name, _, cumulative in times if name == module), sum(own for _, own, _ in times))
+    print(f'Importing {module} takes {harness.format_seconds(total)}.\n')
+    print(f'{"Module":<50}{"Self":>14}{"Cumulative":>14}')
+    for name, own, cumulative in sorted(times, key=lambda t: -t[2])[:top]:
+        print(f'{name:<50}{harness.format_seconds(own):>14}{harness.format_seconds(cumulative):>14}')
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 2 and sys.argv[1] in ('run', 'compare', 'importtime'), USAGE
+    if sys.argv[1] == 'importtime':
+        assert len(sys.argv) >= 3, USAGE
+        importtime(sys.argv[2], int(sys.argv[sys.argv.index('--top') + 1]) if '--top' in sys.argv else 25)
+    elif sys.argv[1] == 'run':
+        run(sys.argv[sys.argv.index('--out') + 1] if '--out' in sys.argv else 'benchmark_results.json',
+            '--quick' in sys.argv,
+            sys.argv[sys.argv.index('--filter') + 1] if '--filter' in sys.argv else None)
+    else:
+        assert len(sys.argv) >= 4, USAGE
+        threshold = float(sys.argv[sys.argv.index('--threshold') + 1]) if '--threshold' in sys.argv else 0.1
+        regressions = harness.compare(harness.load_results(sys.argv[2]), harness.load_results(sys.argv[3]), threshold)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,130 @@
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+
+def measure(func: Callable[[], object], min_time: float = 0.2, repeat: int = 5, number: int = None,
+            setup: Callable[[], object] = None) -> Dict:
+    """
+    Times func like timeit: calls it `number` times per repeat and keeps the per-call time of every repeat
+    Args:
+        func : Function to time, called without arguments
+        min_time : When number is not given, it is grown until one repeat takes at least this many seconds
+        repeat : Number of repeats
+        number : Calls per repeat, calibrated from min_time if None
+        setup : Optional function called untimed before every repeat, to give each repeat the same starting state
+    :return: Dict with the median, min and max seconds per call, and the calls per repeat
+    """
+    if number is None:
+        number = 1
+        while True:
+            if setup: setup()
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= min_time or number >= 1 << 20:
+                break
+            number *= 2
+
+    per_call = []
+    for _ in range(repeat):
+        if setup: setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        per_call.append((time.perf_counter() - start) / number)
+    return {'median': statistics.median(per_call), 'min': min(per_call), 'max': max(per_call), 'number': number}
+
+
+def environment() -> Dict:
+    """ Describes the machine and code version the results were taken on """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def save_results(path: str, results: Dict[str, Dict]):
+    """ Writes benchmark results and the environment they were taken in as JSON """
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, Dict]:
+    """ Reads the results written by save_results """
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare(baseline: Dict[str, Dict], current: Dict[str, Dict], threshold: float = 0.1) -> List[str]:
+    """
+    Prints the median time of every benchmark in both result sets and the change from the baseline
+    Args:
+        baseline : Results to compare against
+        current : New results
+        threshold : Relative slowdown above which a benchmark counts as a regression, e.g. .1 for 10%
+    :return: Names of the benchmarks that regressed
+    """
+    regressions = []
+    width = max((len(name) for name in current), default=10) + 2
+    print(f'{"Benchmark":<{width}}{"Baseline":>14}{"Current":>14}{"Change":>10}')
+    for name in sorted(current):
+        new = current[name]['median']
+        if name not in baseline:
+            print(f'{name:<{width}}{"-":>14}{format_seconds(new):>14}       new')
+            continue
+        old = baseline[name]['median']
+        change = new / old - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -threshold:
+            flag = '  faster'
+        print(f'{name:<{width}}{format_seconds(old):>14}{format_seconds(new):>14}{100 * change:>+9.1f}%{flag}')
+
+    skipped = len(set(baseline) - set(current))
+    if skipped:
+        print(f'\n{skipped} baseline benchmark(s) were not in the current results.')
+    print(f'\n{len(regressions)} regression(s) over {100 * threshold:.0f}%.')
+    return regressions
+
+
+def import_times(module: str, cwd: str = None) -> List[Tuple[str, float, float]]:
+    """
+    Imports module in a fresh interpreter with -X importtime
+    Args:
+        module : Module to import
+        cwd : Directory to run the interpreter in
+    :return: List of (imported module, self seconds, cumulative seconds) in import order
+    """
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=cwd,
+                            capture_output=True, text=True, check=True).stderr
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        times.append((name.strip(), int(own) * 1e-6, int(cumulative) * 1e-6))
+    return times
+
+
+def format_seconds(seconds: float) -> str:
+    """ Formats a duration with a unit that keeps it readable """
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3f} {unit}'
+    return f'{seconds / 1e-9:.1f} ns'
@@ -0,0 +1,219 @@
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Callable, Dict, Iterator, Tuple
+import numpy as np
+import simulator
+import synthetic
+import tester
+from batch_simulator import load_student_copies
+from Classes import NetworkTrace, Scorecard, SimBuffer
+from Classes.UpcomingBitrates import UpcomingBitrates
+
+# A benchmark is (name, parameters, function to time, keyword arguments for harness.measure)
+Benchmark = Tuple[str, Dict, Callable[[], object], Dict]
+
+SEED = 1234
+
+# Entry points whose import time every CLI run and worker process pays
+STARTUP_MODULES = ('simulator', 'tester', 'batch_simulator', 'plotting', 'student.student1', 'student.student2')
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def benchmark_name(group: str, params: Dict) -> str:
+    """ Name of a benchmark in the results, e.g. network_trace.simulate_download[segments=1000] """
+    return f'{group}[{",".join(f"{k}={v}" for k, v in params.items())}]'
+
+
+def selected(name: str, name_filter: str) -> bool:
+    """ Whether a benchmark passes the name filter. Checked before anything is built for the benchmark. """
+    return not name_filter or name_filter in name
+
+
+def synthetic_test(chunks: int, quality_levels: int, segments: int, seed: int = SEED) -> Dict:
+    """ Test parameters in the format of simulator.parse_test, with random throughputs and chunk size ratios """
+    rng = np.random.default_rng(seed)
+    ratios = rng.uniform(.8, 1.2, chunks)
+    return {
+        'chunk_length': 1.0, 'base_chunk_cost': 1.0, 'client_buffer_size': 30.0, 'quality_levels': quality_levels,
+        'quality_coefficient': 2.0, 'rebuffering_coefficient': 8.0, 'variation_coefficient': 1.0,
+        'throughput_times': np.cumsum(rng.uniform(.5, 1.5, segments)) - .5,
+        'throughput_values': rng.lognormal(np.log(2 ** (quality_levels / 2)), .6, segments),
+        'chunk_qualities': ratios[:, None] * 2.0 ** np.arange(quality_levels)[None, :],
+    }
+
+
+def network_trace(quick: bool, name_filter: str = None) -> Iterator[Benchmark]:
+    """ NetworkTrace.simulate_download_from_time across trace lengths """
+    for segments in (100, 10_000) if quick else (100, 10_000, 1_000_000):
+        name = benchmark_name('network_trace.simulate_download_from_time', {'segments': segments})
+        if not selected(name, name_filter):
+            continue
+        test = synthetic_test(1, 1, segments)
+        trace = NetworkTrace.NetworkTrace.from_arrays(test['throughput_times'], test['throughput_values'])
+        rng = np.random.default_rng(SEED)
+        times = rng.uniform(0, trace.start_times[-1], 1024).tolist()
+        sizes = rng.uniform(.5, 8, 1024).tolist()
+        calls = list(zip(times, sizes))
+
+        def run(trace=trace, calls=calls):
+            for time, size in calls:
+                trace.simulate_download_from_time(time, size)
+        yield name, {'segments': segments, 'calls': len(calls)}, run, {}
+
+
+def sim_buffer(quick: bool, name_filter: str = None) -> Iterator[Benchmark]:
+    """ SimBuffer.sim_chunk_download and wait_until_buffer_is_not_full over a whole session """
+    for chunks in (100, 1000) if quick else (100, 1000, 10_000):
+        name = benchmark_name('sim_buffer.session', {'chunks': chunks})
+        if not selected(name, name_filter):
+            continue
+        rng = np.random.default_rng(SEED)
+        downloads = list(zip(rng.uniform(.5, 8, chunks).tolist(), rng.exponential(1, chunks).tolist()))
+
+        def run(downloads=downloads):
+            buffer = SimBuffer.SimBuffer(1.0, 30.0)
+            for size, time in downloads:
+                buffer.sim_chunk_download(size, time)
+                buffer.wait_until_buffer_is_not_full(False)
+        yield name, {'chunks': chunks}, run, {}
+
+
+def scorecard(quick: bool, name_filter: str = None) -> Iterator[Benchmark]:
+    """ Scorecard logging and metric computation over a whole session """
+    for chunks in (100, 1000) if quick else (100, 1000, 10_000):
+        logging_name = benchmark_name('scorecard.logging', {'chunks': chunks})
+        metrics_name = benchmark_name('scorecard.metrics', {'chunks': chunks})
+        if not selected(logging_name, name_filter) and not selected(metrics_name, name_filter):
+            continue
+        rng = np.random.default_rng(SEED)
+        log = list(zip(np.cumsum(rng.uniform(.5, 2, chunks)).tolist(), rng.integers(0, 5, chunks).tolist(),
+                       rng.uniform(.5, 8, chunks).tolist(), np.maximum(rng.normal(-.5, 1, chunks), 0).tolist()))
+
+        logger = Scorecard.Scorecard(2, 8, 1, 1, chunks)
+        for chunknum, (time, quality, bitrate, rebuffer) in enumerate(log):
+            logger.log_bitrate_choice(time, quality, bitrate)
+            logger.log_rebuffer(time, rebuffer, chunknum)
+
+        def run_logging(log=log, chunks=chunks):
+            logger = Scorecard.Scorecard(2, 8, 1, 1, chunks)
+            for chunknum, (time, quality, bitrate, rebuffer) in enumerate(log):
+                logger.log_bitrate_choice(time, quality, bitrate)
+                logger.log_rebuffer(time, rebuffer, chunknum)
+        if selected(logging_name, name_filter):
+            yield logging_name, {'chunks': chunks}, run_logging, {}
+        if selected(metrics_name, name_filter):
+            yield metrics_name, {'chunks': chunks}, logger.get_qual_rebuff_var_qoe, {}
+
+
+def sessions(quick: bool, directory: str, name_filter: str = None) -> Iterator[Benchmark]:
+    """ Full simulator.main sessions for every student algorithm on synthetic.py tests across chunk counts and levels """
+    sweep = [(100, 3), (1000, 3), (100, 5)] if quick else \
+        [(100, 3), (1000, 3), (10_000, 3), (100_000, 3), (100, 5), (1000, 5)]
+    for chunks, quality_levels in sweep:
+        runs = [{'algo': algo, 'chunks': chunks, 'quality_levels': quality_levels}
+                for algo in tester.list_student_algos()]
+        runs = [params for params in runs if selected(benchmark_name('session', params), name_filter)]
+        if not runs:
+            continue
+        path = os.path.join(directory, f'session_{chunks}_{quality_levels}{simulator.COMPILED_TEST_EXTENSION}')
+        synthetic.write_test(synthetic.generate_test(chunks, 'mi', 'mi', SEED, quality_levels), path)
+        for params in runs:
+            yield benchmark_name('session', params), params, \
+                lambda path=path, algo=params['algo']: simulator.main(path, algo, False, False), \
+                {'number': 1, 'repeat': 3}
+
+
+def find_lookahead_solvers(student) -> list:
+    """ Module-level objects of a student module that have a lookahead_window to sweep, e.g. student2.robust_MPC """
+    return [value for value in vars(student).values() if hasattr(value, 'lookahead_window')]
+
+
+def entrypoints(quick: bool, name_filter: str = None) -> Iterator[Benchmark]:
+    """
+    Decision latency of each student_entrypoint across quality levels and, for algorithms that have one, MPC
+    lookahead windows. Calls cycle through messages with different buffer levels and throughputs mid-session.
+    """
+    for algo in tester.list_student_algos():
+        student = simulator.load_student(algo)
+        for quality_levels in (3, 5):
+            lookaheads = (None,)
+            if find_lookahead_solvers(student):
+                lookaheads = (3, 5) if quick else (3, 5, 7)
+            for lookahead in lookaheads:
+                params = {'algo': algo, 'quality_levels': quality_levels}
+                if lookahead:
+                    params['lookahead'] = lookahead
+                name = benchmark_name('student_entrypoint', params)
+                if not selected(name, name_filter):
+                    continue
+                test = synthetic_test(64, quality_levels, 1)
+                video = UpcomingBitrates(test['chunk_qualities'])
+                rng = np.random.default_rng(SEED)
+                messages = []
+                for chunknum in range(len(video) - 1):
+                    message = student.ClientMessage()
+                    message.total_seconds_elapsed = float(chunknum)
+                    # Like a real session, the first chunk has no throughput measurement yet
+                    message.previous_throughput = float(rng.lognormal(np.log(2 ** (quality_levels / 2)), .6)) \
+                        if chunknum else 0
+                    message.buffer_seconds_per_chunk = test['chunk_length']
+                    message.buffer_seconds_until_empty = float(rng.uniform(0, test['client_buffer_size']))
+                    message.buffer_max_size = test['client_buffer_size']
+                    message.quality_levels = quality_levels
+                    message.quality_bitrates = video[chunknum]
+                    message.upcoming_quality_bitrates = video[chunknum + 1:]
+                    message.quality_coefficient = test['quality_coefficient']
+                    message.rebuffering_coefficient = test['rebuffering_coefficient']
+                    message.variation_coefficient = test['variation_coefficient']
+                    messages.append(message)
+
+                # Every repeat gets a freshly executed copy of the module, so per-session state and module-level
+                # caches such as MPC path matrices or decision caches start cold each time, then the decisions are
+                # timed alone
+                copy = {}
+
+                def setup(algo=algo, lookahead=lookahead, copy=copy):
+                    copy['student'] = load_student_copies(algo, 1)[0]
+                    for solver in find_lookahead_solvers(copy['student']) if lookahead else ():
+                        solver.lookahead_window = lookahead
+
+                def run(copy=copy, messages=messages):
+                    entrypoint = copy['student'].student_entrypoint
+                    for message in messages:
+                        entrypoint(message)
+
+                yield name, dict(params, calls=len(messages)), run, {'number': 1, 'repeat': 5, 'setup': setup}
+
+
+def startup(quick: bool, name_filter: str = None) -> Iterator[Benchmark]:
+    """ Wall-clock time of a fresh interpreter importing each entry point, next to a bare interpreter start """
+    for module in ('interpreter',) + STARTUP_MODULES:
+        name = benchmark_name('startup.import', {'module': module})
+        if not selected(name, name_filter):
+            continue
+        command = [sys.executable, '-c', 'pass' if module == 'interpreter' else f'import {module}']
+        yield name, {'module': module}, \
+            lambda command=command: subprocess.run(command, check=True, cwd=REPO_DIRECTORY), \
+            {'number': 1, 'repeat': 5 if quick else 15}
+
+
+def all_benchmarks(quick: bool, directory: str = None, name_filter: str = None) -> Iterator[Benchmark]:
+    """
+    Every benchmark in the suite
+    Args:
+        quick : Whether to run a smaller sweep
+        directory : Where to write the synthetic test files for full sessions, a temporary directory if None
+        name_filter : Only build benchmarks whose name contains this
+    """
+    yield from startup(quick, name_filter)
+    yield from network_trace(quick, name_filter)
+    yield from sim_buffer(quick, name_filter)
+    yield from scorecard(quick, name_filter)
+    yield from entrypoints(quick, name_filter)
+    if directory is None:
+        with tempfile.TemporaryDirectory() as directory:
+            yield from sessions(quick, directory, name_filter)
+    else:
+        yield from sessions(quick, directory, name_filter)
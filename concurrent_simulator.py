@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+import sys
+from typing import Dict, List, NamedTuple, Tuple
+import simulator
+from Classes import NetworkTrace, Recorder, UpcomingBitrates
+
+# Concurrent download simulation. simulator.py downloads one chunk at a time. Here a player keeps up to
+# max_in_flight chunk requests outstanding, the way real players pipeline requests over persistent or parallel
+# connections. Every request waits request_latency seconds (one round trip) before its data starts to flow, which is
+# the idle time pipelining hides. With parallel connections, every download past its latency receives data and they
+# split the trace bandwidth equally. With pipelining, the requests share one connection that sends the responses one
+# after the other, so only the oldest download receives data.
+#
+# Time moves from event to event: a download finishing, a request's latency running out, or the buffer making room
+# for another request. Between events the downloads sharing the trace do not change, so the trace's cumulative
+# capacity curve gives what each of them receives. Chunks enter the buffer in order, a chunk that finishes before
+# the one ahead of it waits for it. A new request is only sent if the buffer has room for it on top of the chunks
+# already on their way. With one request in flight and no latency a session plays out exactly as in simulator.py.
+
+
+class InFlightDownload(NamedTuple):
+    """ A download still in progress, as reported to the student in ClientMessage.in_flight_downloads """
+    chunknum: int               # Index of the chunk being downloaded
+    quality: int                # Quality requested
+    size: float                 # Mb of the chunk
+    remaining: float            # Mb left to download
+    seconds_elapsed: float      # Seconds since the request was sent
+
+
+class Download:
+    """
+    A requested chunk, from the request until it enters the buffer
+    """
+    __slots__ = ('chunknum', 'quality', 'size', 'remaining', 'latency_left', 'elapsed')
+
+    def __init__(self, chunknum: int, quality: int, size: float, latency: float):
+        self.chunknum = chunknum
+        self.quality = quality
+        self.size = size
+        self.remaining = size
+        self.latency_left = latency
+        self.elapsed = 0.0
+
+
+class Player:
+    """
+    One viewing session. Sends requests chosen by its student algorithm, and moves finished downloads into its
+    buffer in chunk order.
+    """
+    def __init__(self, student, config_file: str, trace_file: str = None, max_in_flight: int = 1,
+                 request_latency: float = 0.0, pipelined: bool = False, recorder: Recorder.Recorder = None,
+                 student_algo=None):
+        """
+        Args:
+            student : Student module choosing the qualities, with fresh per-session state
+            config_file : Path to the config file of this session's test
+            trace_file : Optional NetworkTrace file to use in place of the test's [throughput] section
+            max_in_flight : Number of chunk requests the player keeps outstanding
+            request_latency : Seconds from sending a request until its data starts to flow
+            pipelined : Whether the requests share one connection, instead of one connection each
+            recorder : Optional Recorder to send the session and per-chunk events to
+            student_algo : Name of the student algorithm, for the recorder
+        """
+        assert max_in_flight >= 1, 'A player needs at least one request in flight'
+        self.student = student
+        self.trace, self.logger, self.buffer, self.chunk_qualities, self.chunk_length = \
+            simulator.read_test(config_file, False, trace_file)
+        self.video = UpcomingBitrates.UpcomingBitrates(self.chunk_qualities)
+        self.max_in_flight = max_in_flight
+        self.request_latency = request_latency
+        self.pipelined = pipelined
+        self.recorder = recorder
+        if recorder: recorder.session_start(config_file, student_algo)
+
+        self.time = 0.0
+        self.prev_throughput = 0
+        self.next_request = 0           # next chunk to request
+        self.next_play = 0              # next chunk to enter the buffer
+        self.in_flight: List[Download] = []
+        self.finished: Dict[int, Download] = {}     # downloaded chunks waiting for an earlier chunk
+        self.done = not len(self.chunk_qualities)
+
+        # Playback not yet burned from the buffer, and rebuffering charged to the chunk the player waits on
+        self.unburned = 0.0
+        self.pending_rebuffer = 0.0
+        self.wake_in = None             # seconds until the buffer has room for another request
+        self.room_waited = False
+
+        self.startup_delay = None
+        self.downloaded_mb = 0.0
+        self.busy_time = 0.0            # seconds with at least one request outstanding
+        self.in_flight_time = 0.0       # integral of the number of outstanding requests over time
+
+    @property
+    def receiving(self) -> List[Download]:
+        """ Downloads receiving data, which share the trace """
+        if self.pipelined:
+            return self.in_flight[:1] if self.in_flight and self.in_flight[0].latency_left <= 0 else []
+        return [download for download in self.in_flight if download.latency_left <= 0]
+
+    def _burn(self):
+        """ Plays the buffer up to the current time """
+        if self.unburned:
+            self.pending_rebuffer += self.buffer.burn_time(self.unburned)
+            self.unburned = 0.0
+
+    def deliver(self):
+        """ Moves finished downloads into the buffer, in chunk order """
+        while self.next_play in self.finished:
+            download = self.finished.pop(self.next_play)
+            rebuff_time = self.pending_rebuffer + self.buffer.sim_chunk_download(download.size, self.unburned)
+            self.unburned = self.pending_rebuffer = 0.0
+            if self.startup_delay is None:
+                self.startup_delay = self.time
+
+            self.logger.log_bitrate_choice(self.time, download.quality, download.size)
+            self.logger.log_rebuffer(self.time - rebuff_time, rebuff_time, download.chunknum)
+            if self.recorder:
+                self.recorder.chunk(download.chunknum, download.quality, download.size, download.elapsed, rebuff_time,
+                                    self.buffer.seconds_left, self.time)
+            self.next_play += 1
+        if self.next_play == len(self.chunk_qualities):
+            self.done = True
+
+    def request(self):
+        """ Sends requests chosen by the student while requests and buffer room are available """
+        self.wake_in = None
+        while not self.done and self.next_request < len(self.chunk_qualities) \
+                and len(self.in_flight) < self.max_in_flight:
+            self._burn()
+            outstanding = len(self.in_flight) + len(self.finished)
+            room = self.buffer.seconds_left + outstanding * self.chunk_length - self.buffer.client_buffer_size
+            if room > 0 and not self.room_waited:
+                self.wake_in = room
+                return
+            self.room_waited = False
+
+            chunknum = self.next_request
+            message = self.student.ClientMessage()
+            message.total_seconds_elapsed = self.time
+            message.previous_throughput = self.prev_throughput
+            message.buffer_seconds_per_chunk = self.chunk_length
+            message.buffer_seconds_until_empty = self.buffer.seconds_left
+            message.buffer_max_size = self.buffer.client_buffer_size
+            bitrates = self.video[chunknum]
+            message.quality_levels = len(bitrates)
+            message.quality_bitrates = bitrates
+            message.upcoming_quality_bitrates = self.video[chunknum+1:]
+            message.quality_coefficient = self.logger.quality_coeff
+            message.rebuffering_coefficient = self.logger.rebuffer_coeff
+            message.variation_coefficient = self.logger.switch_coeff
+            message.in_flight_downloads = [
+                InFlightDownload(d.chunknum, d.quality, d.size, d.remaining, d.elapsed) for d in self.in_flight]
+
+            quality = self.student.student_entrypoint(message)
+            if quality < 0 or quality >= len(bitrates) or not isinstance(quality, int):
+                print("Student returned invalid quality, exiting")
+                self.in_flight.clear()
+                self.done = True
+                return
+            self.in_flight.append(Download(chunknum, quality, bitrates[quality], self.request_latency))
+            self.next_request += 1
+
+    def advance(self, dt: float, delivered: float):
+        """
+        Moves the player dt seconds ahead
+        Args:
+            dt : Seconds to move ahead
+            delivered : Mb each receiving download got in that time
+        """
+        if self.in_flight:
+            self.busy_time += dt
+            self.in_flight_time += dt * len(self.in_flight)
+
+        for i, download in enumerate(self.in_flight):
+            download.elapsed += dt
+            if download.latency_left > 0:
+                download.latency_left -= dt
+            elif not self.pipelined or i == 0:
+                download.remaining -= delivered
+        self.collect_finished()
+
+        if self.wake_in is not None:
+            if self.wake_in <= dt:
+                self.room_waited = True
+            else:
+                self.wake_in -= dt
+        self.unburned += dt
+        self.time += dt
+
+    def collect_finished(self):
+        """ Moves the downloads with no data left from in_flight to finished """
+        still_in_flight = []
+        for download in self.in_flight:
+            if download.remaining <= 0:
+                self.downloaded_mb += download.size
+                self.prev_throughput = download.size / download.elapsed
+                self.finished[download.chunknum] = download
+            else:
+                still_in_flight.append(download)
+        self.in_flight = still_in_flight
+
+    def results(self) -> Tuple[float, float, float, float]:
+        """ Finishes the session and returns the total quality, total variation, rebuffer time, and user QoE """
+        results = self.logger.get_qual_rebuff_var_qoe()
+        if self.recorder: self.recorder.session_end(results)
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        """ Returns the startup delay, session length, and throughput and pipelining depth while downloading """
+        return {
+            'startup_delay': self.startup_delay or 0.0,
+            'session_time': self.time,
+            'throughput': self.downloaded_mb / self.busy_time if self.busy_time else 0.0,
+            'mean_in_flight': self.in_flight_time / self.busy_time if self.busy_time else 0.0,
+        }
+
+
+def simulate(players: List[Player], trace: NetworkTrace.NetworkTrace) -> float:
+    """
+    Runs players that share one trace until every session is over. All downloads receiving data get an equal share
+    of the trace bandwidth.
+    Args:
+        players : Players to run
+        trace : Trace whose bandwidth the players' downloads share
+    :return: float Megabits the trace could have delivered while any request was outstanding
+    """
+    time, capacity = 0.0, 0.0
+    while True:
+        for player in players:
+            player.deliver()
+            player.request()
+        active = [player for player in players if not player.done]
+        if not active:
+            return capacity
+
+        # Next event: the download with the least data left finishing, which gives every receiving download that
+        # much data, a request latency running out or a buffer making room for a request
+        receiving = [download for player in active for download in player.receiving]
+        dt = delivered = float('inf')
+        if receiving:
+            delivered = min(download.remaining for download in receiving)
+            dt = trace.simulate_download_from_time(time, delivered * len(receiving))
+        waits = [download.latency_left for player in active for download in player.in_flight
+                 if download.latency_left > 0]
+        waits += [player.wake_in for player in active if player.wake_in is not None]
+        assert receiving or waits, 'No download in flight and no request to send'
+        if waits and min(waits) < dt:
+            dt = min(waits)
+            window = trace.cumulative_capacity(time + dt) - trace.cumulative_capacity(time)
+            delivered = window / len(receiving) if receiving else 0.0
+        else:
+            window = delivered * len(receiving)
+        if any(player.in_flight for player in active):
+            capacity += window
+
+        for player in active:
+            player.advance(dt, delivered)
+        time += dt
+
+
+def main(config_file: str, student_algo, verbose: bool, print_output=True, trace_file: str = None,
+         max_in_flight: int = 1, request_latency: float = 0.0, pipelined: bool = False,
+         recorder: Recorder.Recorder = None) -> Tuple[Tuple[float, float, float, float], Dict[str, float]]:
+    """
+    Runs one session with up to max_in_flight chunk requests outstanding
+    Args:
+        config_file : Path to the config file of this test
+        student_algo: Student algorithm to run
+        verbose : Whether to print verbose output
+        print_output : Whether to print any output at all
+        trace_file : Optional NetworkTrace file to use in place of the test's [throughput] section
+        max_in_flight : Number of chunk requests the player keeps outstanding
+        request_latency : Seconds from sending a request until its data starts to flow
+        pipelined : Whether the requests share one connection, instead of one connection each
+        recorder : Optional Recorder to send the session and per-chunk events to
+    :return: Tuple with the total quality, total variation, rebuffer time, and user QoE for this test, and a dict of
+        Player.stats plus the link utilization while downloading
+    """
+    player = Player(simulator.load_student(student_algo), config_file, trace_file, max_in_flight, request_latency,
+                    pipelined, recorder, student_algo)
+    capacity = simulate([player], player.trace)
+    if print_output:
+        player.logger.output_results(verbose=verbose)
+    summary = simulator.student_summary(player.student)
+    if print_output and summary:
+        print(summary)
+    if recorder:
+        recorder.student_summary(summary)
+
+    stats = player.stats()
+    stats['utilization'] = player.downloaded_mb / capacity if capacity else 0.0
+    return player.results(), stats
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 3, \
+        f'Proper usage: python3 {sys.argv[0]} [config_file] [student_algo] [--in-flight K1,K2,...]' \
+        f' [--latency seconds] [--pipelined] [--trace trace_file] [-v --verbose]'
+    depths = [int(k) for k in sys.argv[sys.argv.index('--in-flight') + 1].split(',')] \
+        if '--in-flight' in sys.argv else [1, 2, 4]
+    latency = float(sys.argv[sys.argv.index('--latency') + 1]) if '--latency' in sys.argv else 0.0
+    trace_file = sys.argv[sys.argv.index('--trace') + 1] if '--trace' in sys.argv else None
+    verbose = '-v' in sys.argv or '--verbose' in sys.argv
+    pipelined = '--pipelined' in sys.argv
+
+    runs = [main(sys.argv[1], sys.argv[2], verbose, len(depths) == 1, trace_file, k, latency, pipelined)
+            for k in depths]
+    base_stats = runs[0][1]
+    print(f'\nStudent algorithm {sys.argv[2]}, {latency:.3f} s request latency,'
+          f' {"one pipelined connection" if pipelined else "parallel connections"},'
+          f' gains against {depths[0]} in flight:')
+    print(f'\t{"In flight":>9}{"QoE":>9}{"Rebuffer":>10}{"Startup (s)":>14}{"Throughput (Mbps)":>24}'
+          f'{"Utilization":>13}{"Mean in flight":>16}')
+    for k, ((quality, variation, rebuff, qoe), stats) in zip(depths, runs):
+        gain = stats['throughput'] / base_stats['throughput'] - 1 if base_stats['throughput'] else 0.0
+        print(f'\t{k:>9}{qoe:>9.3f}{rebuff:>10.2f}{stats["startup_delay"]:>14.3f}'
+              f'{stats["throughput"]:>15.3f} ({gain:+6.1%}){stats["utilization"]:>13.1%}{stats["mean_in_flight"]:>16.2f}')
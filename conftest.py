@@ -0,0 +1,19 @@
+import glob
+import os
+import sys
+import pytest
+
+# Shared setup of the test_*.py files in the repository root. Run them with python -m pytest from there.
+
+REPO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+TEST_FILES = sorted(glob.glob(os.path.join(REPO_DIRECTORY, 'tests', '*.ini')))
+STUDENT_ALGOS = ('1', '2')
+
+if REPO_DIRECTORY not in sys.path:
+    sys.path.insert(0, REPO_DIRECTORY)
+
+
+@pytest.fixture(autouse=True)
+def repo_directory(monkeypatch):
+    """ Student modules and test files are found relative to the working directory """
+    monkeypatch.chdir(REPO_DIRECTORY)
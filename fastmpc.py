@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+from typing import Tuple
+import numpy as np
+import simulator
+from student import student2
+
+ACCURACY_SAMPLES = 2000
+
+
+def build_table(config_file: str, lookahead_window: int, buffer_step: float) -> student2.DecisionTable:
+    """
+    Builds the FastMPC decision table for the video and QoE coefficients of one test file
+    Args:
+        config_file : Path to the test file (.ini)
+        lookahead_window : Number of chunks the MPC looks ahead
+        buffer_step : Seconds of buffer per table row
+    :return: DecisionTable for this test
+    """
+    trace, logger, buffer, chunk_qualities, chunk_length = simulator.read_test(config_file, False)
+    coefficients = (logger.quality_coeff, logger.rebuffer_coeff, logger.switch_coeff)
+    return student2.DecisionTable.build(chunk_qualities, coefficients, buffer.client_buffer_size,
+                                        lookahead_window=lookahead_window, buffer_step=buffer_step)
+
+
+def sampled_accuracy(table: student2.DecisionTable, samples: int, seed: int = 0) -> Tuple[float, float, float]:
+    """
+    Compares table lookups against online MPC decisions on randomly drawn, off-grid states
+    Args:
+        table : DecisionTable to check
+        samples : Number of states to draw
+        seed : Random seed
+    :return: Tuple with the fraction of states where the table picks the same quality as online MPC, and the mean
+        seconds per online decision and per table lookup
+    """
+    rng = np.random.default_rng(seed)
+    buffer_max = (table.decisions.shape[3] - 1) * table.buffer_step
+    agree = online_time = lookup_time = 0
+    for _ in range(samples):
+        chunknum = int(rng.integers(len(table.chunk_bitrates)))
+        msg = student2.ClientMessage()
+        msg.quality_bitrates = list(table.chunk_bitrates[chunknum])
+        msg.upcoming_quality_bitrates = [list(r) for r in table.chunk_bitrates[chunknum + 1:]]
+        msg.quality_coefficient, msg.rebuffering_coefficient, msg.variation_coefficient = table.coefficients
+
+        mpc = student2.Robust_MPC(lookahead_window=table.lookahead_window)
+        mpc.qual_prev = int(rng.integers(table.chunk_bitrates.shape[1]))
+        mpc.buffer_capacity = rng.uniform(0, buffer_max)
+        mpc.throughput = float(np.exp(rng.uniform(*np.log(table.throughput_grid[[0, -1]]))))
+        mpc.throughput_error = rng.uniform(0, table.error_grid[-1])
+
+        start = time.perf_counter()
+        online = mpc.calc_MPC(msg)
+        online_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        lookup = table.lookup(chunknum, mpc.qual_prev, mpc.throughput_error, mpc.buffer_capacity, mpc.throughput)
+        lookup_time += time.perf_counter() - start
+        agree += online == lookup
+    return agree / samples, online_time / samples, lookup_time / samples
+
+
+def session_qoe(config_file: str, table_path: str = None) -> float:
+    """
+    Runs one simulator session with student2, in table mode when table_path is given
+    Args:
+        config_file : Path to the test file (.ini)
+        table_path : Decision table to use, or None for online MPC
+    :return: float user QoE of the session
+    """
+    os.environ.pop('FASTMPC_TABLE', None)
+    if table_path:
+        os.environ['FASTMPC_TABLE'] = table_path
+    try:
+        return simulator.main(config_file, '2', False, False)[3]
+    finally:
+        os.environ.pop('FASTMPC_TABLE', None)
+
+
+def main(config_file: str, output: str, lookahead_window: int = 5, buffer_step: float = 0.5):
+    """
+    Builds, saves and reports on the FastMPC decision table for one test file
+    Args:
+        config_file : Path to the test file (.ini)
+        output : Path of the .npz table to write
+        lookahead_window : Number of chunks the MPC looks ahead
+        buffer_step : Seconds of buffer per table row
+    """
+    start = time.perf_counter()
+    table = build_table(config_file, lookahead_window, buffer_step)
+    build_time = time.perf_counter() - start
+    table.save(output)
+
+    print(f'Built decision table for {config_file} in {build_time:.2f} seconds.')
+    print(f'\tShape {table.decisions.shape} (chunk, previous quality, throughput error, buffer, throughput),'
+          f' {table.decisions.size} entries.')
+    print(f'\tSize {table.decisions.nbytes / 2**20:.2f} MiB in memory,'
+          f' {os.path.getsize(output) / 2**20:.2f} MiB on disk at {output}.')
+
+    accuracy, online_time, lookup_time = sampled_accuracy(table, ACCURACY_SAMPLES)
+    print(f'\tSame quality as online MPC on {100 * accuracy:.1f}% of {ACCURACY_SAMPLES} sampled states.')
+    print(f'\tDecision latency: online MPC {online_time * 1e6:.1f} us, table lookup {lookup_time * 1e6:.1f} us.')
+    print(f'\tSession QoE: online MPC {session_qoe(config_file):.3f},'
+          f' decision table {session_qoe(config_file, output):.3f}.')
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 3, \
+        f'Proper usage: python3 {sys.argv[0]} [config_file] [output.npz] [lookahead_window] [buffer_step]'
+    main(sys.argv[1], sys.argv[2], *([int(sys.argv[3])] if len(sys.argv) > 3 else []),
+         *([float(sys.argv[4])] if len(sys.argv) > 4 else []))
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+import heapq
+import os
+import sys
+from typing import Dict, List, Tuple
+import numpy as np
+import simulator
+from batch_simulator import load_student_copies
+from concurrent_simulator import Download, Player
+from Classes import NetworkTrace, Recorder
+
+# Multi-client simulation. Many players share the bandwidth of one trace, like the players behind one cell or access
+# link. Every client has its own test (video, buffer and QoE coefficients), student algorithm, optional access
+# bandwidth cap and start time, and may keep several requests in flight as in concurrent_simulator.py.
+#
+# Allocations of the link bandwidth between the downloads receiving data:
+#   fair    Every download gets an equal share, like competing TCP flows. A client's downloads never get more than
+#           its cap between them, and share that a capped client cannot use is left unused.
+#   maxmin  Max-min fair between clients: clients that are capped below an equal share get their cap, and the
+#           others split the rest equally. A client's downloads split its allocation equally.
+#
+# The link state is held in NumPy arrays with one slot per possible in-flight download, so every event costs a few
+# vectorized operations however many clients there are. Events are a download finishing, the trace bandwidth
+# changing, and the timed events of clients: starting, a request latency running out, or a buffer making room. Only
+# the clients involved in an event are brought up to date and asked for new requests.
+
+# Mb below which a download counts as finished, and seconds below which a request latency counts as over, both to
+# absorb floating point error in the event times
+COMPLETION_TOLERANCE = 1e-9
+LATENCY_TOLERANCE = 1e-9
+
+
+def fair_share_rates(bandwidth: float, flow_clients: np.ndarray, caps: np.ndarray) -> np.ndarray:
+    """
+    Equal share of the link for every download, limited by the cap of its client
+    Args:
+        bandwidth : Link bandwidth in Mbps
+        flow_clients : Client of each download receiving data
+        caps : Access bandwidth cap of every client in Mbps, inf for none
+    :return: np.ndarray Rate of each download in Mbps
+    """
+    counts = np.bincount(flow_clients, minlength=len(caps))
+    return np.minimum(bandwidth / len(flow_clients), caps[flow_clients] / counts[flow_clients])
+
+
+def max_min_rates(bandwidth: float, flow_clients: np.ndarray, caps: np.ndarray) -> np.ndarray:
+    """
+    Max-min fair allocation between clients by water filling, each client's allocation split between its downloads
+    Args:
+        bandwidth : Link bandwidth in Mbps
+        flow_clients : Client of each download receiving data
+        caps : Access bandwidth cap of every client in Mbps, inf for none
+    :return: np.ndarray Rate of each download in Mbps
+    """
+    clients, flow_client_index, counts = np.unique(flow_clients, return_inverse=True, return_counts=True)
+    demands = caps[clients]
+    ordered = np.sort(demands)
+    # Equal share of what is left once every client with a smaller cap has its cap
+    shares = (bandwidth - np.concatenate([[0.0], np.cumsum(ordered)[:-1]])) / np.arange(len(ordered), 0, -1)
+    above = np.flatnonzero(ordered > shares)
+    level = shares[above[0]] if len(above) else np.inf
+    return (np.minimum(demands, level) / counts)[flow_client_index]
+
+
+ALLOCATIONS = {'fair': fair_share_rates, 'maxmin': max_min_rates}
+
+
+def jain_index(values) -> float:
+    """ Returns Jain's fairness index of the values, 1 when all are equal and 1/n when one value takes everything """
+    values = np.asarray(values, dtype=np.float64)
+    squares = float((values ** 2).sum())
+    return float(values.sum()) ** 2 / (len(values) * squares) if squares else 1.0
+
+
+class Client(Player):
+    """
+    Player sharing the link with other clients. Between its own events a client is left alone, and it is brought up
+    to the current time only when one of its events happens.
+    """
+    def __init__(self, student, config_file: str, student_algo, start: float = 0.0, bandwidth_cap: float = np.inf,
+                 max_in_flight: int = 1, request_latency: float = 0.0, pipelined: bool = False,
+                 recorder: Recorder.Recorder = None):
+        """
+        Args:
+            student : Student module choosing the qualities, a copy of its own
+            config_file : Path to the config file of this client's test. Its throughput section is not used.
+            student_algo : Name of the student algorithm
+            start : Time the client starts streaming, in seconds
+            bandwidth_cap : Access bandwidth of the client in Mbps, inf for none
+            max_in_flight : Number of chunk requests the client keeps outstanding
+            request_latency : Seconds from sending a request until its data starts to flow
+            pipelined : Whether the requests share one connection, instead of one connection each
+            recorder : Optional Recorder for this client's session
+        """
+        super().__init__(student, config_file, None, max_in_flight, request_latency, pipelined, recorder,
+                         student_algo)
+        self.config_file = config_file
+        self.student_algo = student_algo
+        self.start = self.time = start
+        self.bandwidth_cap = bandwidth_cap
+        self.slots: Dict[Download, int] = {}   # link slot of every download in flight
+        self.wake_at = None
+
+    def catch_up(self, now: float, woke: bool = False):
+        """
+        Brings the client's clocks up to now. The data its downloads received is set by the link beforehand.
+        Args:
+            now : Current time
+            woke : Whether the buffer room the client was waiting for is there now
+        """
+        dt = now - self.time
+        if dt > 0:
+            if self.in_flight:
+                self.busy_time += dt
+                self.in_flight_time += dt * len(self.in_flight)
+            for download in self.in_flight:
+                download.elapsed += dt
+                if download.latency_left > 0:
+                    download.latency_left = download.latency_left - dt \
+                        if download.latency_left - dt > LATENCY_TOLERANCE else 0.0
+            self.unburned += dt
+            self.time = now
+        self.collect_finished()
+        if woke:
+            self.room_waited = True
+
+    def stats(self) -> Dict[str, float]:
+        """ Player.stats, with times from the client's start and the mean bitrate it chose in Mbps """
+        stats = super().stats()
+        stats['startup_delay'] = self.startup_delay - self.start if self.startup_delay is not None else 0.0
+        stats['session_time'] = self.time - self.start
+        chunks = self.logger.chunk_count
+        stats['bitrate'] = float(self.logger.bitrates[:chunks].sum()) / (chunks * self.chunk_length) if chunks else 0.0
+        return stats
+
+
+class SharedLink:
+    """
+    Runs clients that share the bandwidth of one trace
+    """
+    def __init__(self, trace: NetworkTrace.NetworkTrace, clients: List[Client], allocation: str = 'fair'):
+        """
+        Args:
+            trace : Trace of the shared link
+            clients : Clients sharing the link
+            allocation : How the bandwidth is split between downloads, a key of ALLOCATIONS
+        """
+        assert allocation in ALLOCATIONS, f'Allocation must be one of {", ".join(ALLOCATIONS)}'
+        self.trace = trace
+        self.clients = clients
+        self.allocate = ALLOCATIONS[allocation]
+        self.caps = np.array([client.bandwidth_cap for client in clients], dtype=np.float64)
+
+        # One slot per download a client can have in flight
+        self.slot_base = np.concatenate([[0], np.cumsum([client.max_in_flight for client in clients])]).astype(np.int64)
+        slots = int(self.slot_base[-1])
+        self.slot_client = np.repeat(np.arange(len(clients)), [client.max_in_flight for client in clients])
+        self.remaining = np.zeros(slots)
+        self.receiving = np.zeros(slots, dtype=bool)
+        self.occupied = np.zeros(slots, dtype=bool)
+        self.free_slots = [list(range(self.slot_base[c + 1] - 1, self.slot_base[c] - 1, -1)) for c in range(len(clients))]
+
+        self.events: List[Tuple[float, int, int, bool]] = []     # (time, sequence, client, is a buffer wakeup)
+        self.sequence = 0
+        self.time = 0.0
+        self.delivered_mb = 0.0
+        self.busy_time = 0.0
+        self.busy_capacity = 0.0
+
+    def _push(self, time: float, client: int, wake: bool):
+        heapq.heappush(self.events, (time, self.sequence, client, wake))
+        self.sequence += 1
+
+    def _touch(self, index: int, woke: bool):
+        """ Brings a client up to the current time, lets it deliver and request chunks, and updates its slots """
+        client = self.clients[index]
+        for download, slot in client.slots.items():
+            download.remaining = float(self.remaining[slot])
+        client.catch_up(self.time, woke)
+        client.deliver()
+        client.request()
+
+        in_flight = set(client.in_flight)
+        for download in [download for download in client.slots if download not in in_flight]:
+            slot = client.slots.pop(download)
+            self.occupied[slot] = self.receiving[slot] = False
+            self.free_slots[index].append(slot)
+        receiving = set(client.receiving)
+        for download in client.in_flight:
+            slot = client.slots.get(download)
+            if slot is None:
+                slot = client.slots[download] = self.free_slots[index].pop()
+                self.remaining[slot] = download.remaining
+                self.occupied[slot] = True
+                if download.latency_left > 0:
+                    self._push(self.time + download.latency_left, index, False)
+            self.receiving[slot] = download in receiving
+
+        client.wake_at = None if client.wake_in is None else self.time + client.wake_in
+        if client.wake_at is not None:
+            self._push(client.wake_at, index, True)
+
+    def run(self) -> Dict[str, float]:
+        """
+        Runs every client to the end of its session
+        :return: Dict with the link utilization while any request was outstanding, the Mb delivered, and the time
+            the last session ended
+        """
+        start_times, bandwidths = self.trace.start_times, self.trace.bandwidths
+        segment = 0
+        for index, client in enumerate(self.clients):
+            self._push(client.start, index, False)
+        touched: Dict[int, bool] = {}
+        waiting = len(self.clients)
+
+        while True:
+            # Clients with an event now, in client order
+            while self.events and self.events[0][0] <= self.time:
+                _, _, index, wake = heapq.heappop(self.events)
+                if not wake or self.clients[index].wake_at == self.time:
+                    touched[index] = touched.get(index, False) or wake
+            for index in sorted(touched):
+                if not self.clients[index].done:
+                    self._touch(index, touched[index])
+                    if self.clients[index].done:
+                        waiting -= 1
+            touched.clear()
+            if not waiting:
+                break
+
+            # Next event: a download finishing, the bandwidth changing or a timed client event
+            while segment + 1 < len(start_times) and start_times[segment + 1] <= self.time:
+                segment += 1
+            bandwidth = float(bandwidths[segment])
+            flows = np.flatnonzero(self.receiving)
+            dt, finishing = np.inf, -1
+            if len(flows):
+                rates = self.allocate(bandwidth, self.slot_client[flows], self.caps)
+                with np.errstate(divide='ignore'):
+                    finish = np.where(rates > 0, self.remaining[flows] / rates, np.inf)
+                finishing = int(np.argmin(finish))
+                dt = float(finish[finishing])
+            next_time = self.time + dt
+            if segment + 1 < len(start_times) and start_times[segment + 1] < next_time:
+                next_time, finishing = float(start_times[segment + 1]), -1
+            if self.events and self.events[0][0] < next_time:
+                next_time, finishing = self.events[0][0], -1
+            assert next_time < np.inf, 'Downloads in flight can never finish, the trace ends with no bandwidth'
+            dt = next_time - self.time
+
+            if self.occupied.any():
+                self.busy_time += dt
+                self.busy_capacity += bandwidth * dt
+            if len(flows):
+                received = rates * dt
+                self.remaining[flows] -= received
+                if finishing >= 0:
+                    self.remaining[flows[finishing]] = 0.0
+                self.delivered_mb += float(received.sum())
+                for slot in flows[self.remaining[flows] <= COMPLETION_TOLERANCE].tolist():
+                    self.remaining[slot] = 0.0
+                    touched[int(self.slot_client[slot])] = False
+            self.time = next_time
+
+        return {
+            'utilization': self.delivered_mb / self.busy_capacity if self.busy_capacity else 0.0,
+            'delivered_mb': self.delivered_mb,
+            'duration': self.time,
+        }
+
+
+def main(config_files: List[str], student_algos: List[str], allocation: str = 'fair', caps: List[float] = None,
+         starts: List[float] = None, trace_file: str = None, link_scale: float = 1.0, max_in_flight: int = 1,
+         request_latency: float = 0.0, pipelined: bool = False
+         ) -> Tuple[List[Tuple[Tuple[float, float, float, float], Dict[str, float]]], Dict[str, float]]:
+    """
+    Runs one client per config file on a shared link
+    Args:
+        config_files : Path to the config file of each client
+        student_algos : Student algorithm of each client
+        allocation : How the link bandwidth is split between downloads, a key of ALLOCATIONS
+        caps : Access bandwidth cap of each client in Mbps, None for no caps
+        starts : Start time of each client in seconds, None for all at 0
+        trace_file : Optional NetworkTrace file for the link, otherwise the throughput of the first config file
+        link_scale : Factor applied to the link bandwidth
+        max_in_flight : Number of chunk requests every client keeps outstanding
+        request_latency : Seconds from sending a request until its data starts to flow
+        pipelined : Whether each client's requests share one connection, instead of one connection each
+    :return: Tuple of a list with the results tuple and Client.stats of every client, and the link statistics of
+        SharedLink.run plus Jain's fairness index of the clients' mean bitrates and throughputs
+    """
+    assert len(config_files) == len(student_algos), 'Every client needs a config file and a student algorithm'
+    trace = NetworkTrace.NetworkTrace.from_file(trace_file) if trace_file else \
+        simulator.read_test(config_files[0], False)[0]
+    if link_scale != 1:
+        trace = NetworkTrace.NetworkTrace.from_arrays(trace.start_times, np.asarray(trace.bandwidths) * link_scale)
+
+    students = {algo: iter(load_student_copies(algo, student_algos.count(algo))) for algo in set(student_algos)}
+    clients = [Client(next(students[algo]), config_file, algo, starts[i] if starts else 0.0,
+                      caps[i] if caps else np.inf, max_in_flight, request_latency, pipelined)
+               for i, (config_file, algo) in enumerate(zip(config_files, student_algos))]
+    link = SharedLink(trace, clients, allocation)
+    link_stats = link.run()
+
+    sessions = [(client.results(), client.stats()) for client in clients]
+    link_stats['bitrate_fairness'] = jain_index([stats['bitrate'] for _, stats in sessions])
+    link_stats['throughput_fairness'] = jain_index([stats['throughput'] for _, stats in sessions])
+    return sessions, link_stats
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 3, \
+        f'Proper usage: python3 {sys.argv[0]} [config_file] [clients] [--algos 1,2,...] [--allocation fair|maxmin]' \
+        f' [--caps Mbps,...] [--stagger seconds] [--link-scale factor] [--in-flight K] [--latency seconds]' \
+        f' [--pipelined] [--trace trace_file] [--per-client]'
+    def option(flag, default):
+        return sys.argv[sys.argv.index(flag) + 1] if flag in sys.argv else default
+
+    n = int(sys.argv[2])
+    algos = option('--algos', '1').split(',')
+    algos = [algos[i % len(algos)] for i in range(n)]
+    caps = [float(c) for c in option('--caps', 'inf').split(',')]
+    caps = [caps[i % len(caps)] for i in range(n)]
+    stagger = float(option('--stagger', 0))
+    allocation = option('--allocation', 'fair')
+    link_scale = float(option('--link-scale', n))   # by default every client's fair share is the test's bandwidth
+
+    sessions, link_stats = main([sys.argv[1]] * n, algos, allocation, caps, [i * stagger for i in range(n)],
+                                option('--trace', None), link_scale, int(option('--in-flight', 1)),
+                                float(option('--latency', 0)), '--pipelined' in sys.argv)
+
+    print(f'\n{n} clients on {os.path.basename(sys.argv[1])} x {link_scale:g}, {allocation} allocation')
+    if '--per-client' in sys.argv:
+        print(f'\t{"Client":>6}{"Algo":>6}{"Cap":>8}{"QoE":>9}{"Rebuffer":>10}{"Startup":>9}{"Bitrate":>9}{"Throughput":>12}')
+        for i, ((quality, variation, rebuff, qoe), stats) in enumerate(sessions):
+            print(f'\t{i:>6}{algos[i]:>6}{caps[i]:>8.2f}{qoe:>9.3f}{rebuff:>10.2f}{stats["startup_delay"]:>9.2f}'
+                  f'{stats["bitrate"]:>9.3f}{stats["throughput"]:>12.3f}')
+    print(f'\t{"Algo":>6}{"Clients":>9}{"Mean QoE":>10}{"Min QoE":>9}{"Rebuffer":>10}{"Bitrate":>9}{"Throughput":>12}')
+    for algo in sorted(set(algos)):
+        rows = [(results, stats) for (results, stats), a in zip(sessions, algos) if a == algo]
+        qoes = [results[3] for results, _ in rows]
+        print(f'\t{algo:>6}{len(rows):>9}{np.mean(qoes):>10.3f}{min(qoes):>9.3f}'
+              f'{np.mean([results[2] for results, _ in rows]):>10.2f}'
+              f'{np.mean([stats["bitrate"] for _, stats in rows]):>9.3f}'
+              f'{np.mean([stats["throughput"] for _, stats in rows]):>12.3f}')
+    print(f'\n\tLink utilization {link_stats["utilization"]:.1%}, {link_stats["delivered_mb"]:.1f} Mb delivered'
+          f' in {link_stats["duration"]:.1f} s')
+    print(f'\tJain fairness index: bitrate {link_stats["bitrate_fairness"]:.3f},'
+          f' throughput {link_stats["throughput_fairness"]:.3f}')
@@ -1,19 +1,20 @@
 #!/usr/bin/env python3
 import os
-import simulator
-from importlib import reload
 import sys
+import tester
+from typing import List
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import cm
+from Classes.Recorder import DecisionRecorder, SessionRecord
+from Classes.ResultCache import ResultCache
 
 
-TEST_DIRECTORY = './tests'
+ALGO_NAMES = {'1':'BBA-2', '2':'Robust_MPC'}
 
 
 def plot_data(algo_num, data_dict):
+    from matplotlib import pyplot as plt  # deferred, matplotlib takes longer to import than the whole simulator
+
     fig = plt.figure(figsize=(8,8))
-    algo = {'1':'BBA-2', '2':'Robust_MPC'}
     for i, (metric_name, data) in enumerate(data_dict.items()):
         tick_labels = ['low', 'med', 'high']
         x_ticks = np.arange(data.shape[1])
@@ -35,15 +36,75 @@ def plot_data(algo_num, data_dict):
         ax.set_yticks(y_ticks)
         ax.set_yticklabels(tick_labels)
 
-    plt.suptitle(algo[algo_num])
+    plt.suptitle(ALGO_NAMES[algo_num])
+    plt.tight_layout()
+    plt.savefig(ALGO_NAMES[algo_num])
+    plt.close(fig)
+
+
+def session_plot_path(record: SessionRecord, directory: str) -> str:
+    """ Returns the file the quality plot of a recorded session is rendered to """
+    test = os.path.splitext(os.path.basename(record.config_file))[0]
+    return os.path.join(directory, f'student{record.student_algo}_{test}_qualities.png')
+
+
+def plot_session(record: SessionRecord, path: str) -> str:
+    """
+    Renders the quality over time and the quality distribution of one recorded session
+    Args:
+        record : Session recorded by a DecisionRecorder
+        path : Image file to write
+    :return: str path
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # render to files only, also in worker processes
+    from matplotlib import pyplot as plt
+
+    fig = plt.figure()
+    plt.subplot(1,2,1)
+    plt.plot(record.qualities)
+    plt.title('quality over time')
+    plt.xlabel('chunk number')
+    plt.ylabel('bitrate')
+
+    plt.subplot(1,2, 2)
+    plt.hist(record.qualities)
+    plt.title('quality distribution')
+    plt.xlabel('chunk bitrate')
+    plt.ylabel('frequency')
+
     plt.tight_layout()
-    plt.savefig(algo[algo_num])
+    plt.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def render_sessions(records: List[SessionRecord], directory: str, jobs: int = 1) -> List[str]:
+    """
+    Renders the quality plot of every recorded session into directory, one file per (algorithm, test)
+    Args:
+        records : Sessions recorded by a DecisionRecorder
+        directory : Directory to write the images to
+        jobs : Number of worker processes to render with
+    :return: List of the image files written
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = [session_plot_path(record, directory) for record in records]
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(plot_session, records, paths))
+    return [plot_session(record, path) for record, path in zip(records, paths)]
+
 
-def main(student_algo: str):
+def main(student_algo: str, session_directory: str = None, jobs: int = 1, cache: ResultCache = None):
     """
-    Runs simulator and student algorithm on all tests in TEST_DIRECTORY
+    Runs simulator and student algorithm on all tests in tester.TEST_DIRECTORY
     Args:
         student_algo : Student algorithm to run
+        session_directory : Directory to also render the quality plot of every session to, None to skip them
+        jobs : Number of worker processes to render the session plots with
+        cache : Optional ResultCache to plot unchanged sessions from without simulating them
     """
     # Run main loop, print output
     shape = (3,3)
@@ -53,10 +114,11 @@ def main(student_algo: str):
     qoes       = np.zeros(shape)
 
     sum_qoe = 0
+    recorder = DecisionRecorder() if session_directory else None
+    tests = tester.list_tests()
     print(f'\nTesting student algorithm {student_algo}')
-    for test in os.listdir(TEST_DIRECTORY):
-        reload(simulator)
-        quality, variation, rebuff, qoe = simulator.main(os.path.join(TEST_DIRECTORY, test), student_algo, False, False)
+    for test in tests:
+        quality, variation, rebuff, qoe = tester.run_test(test, student_algo, recorder=recorder, cache=cache)
         print(f'\tTest {test: <12}:'
               f' Total Quality {quality:8.2f},'
               f' Total Variation {variation:8.2f},'
@@ -77,15 +139,17 @@ def main(student_algo: str):
         rebuffs[avg][var]    = rebuff
         qoes[avg][var]       = qoe
 
-    print(f'\n\tAverage QoE over all tests: {sum_qoe / len(os.listdir(TEST_DIRECTORY)):.2f}')
+    print(f'\n\tAverage QoE over all tests: {sum_qoe / len(tests):.2f}')
 
     data = {'QOE':qoes, 'Rebuffer Time (s)':rebuffs, 'Variation (# of changes)':variations, 'Quality Points':qualities}
     plot_data(student_algo, data)
+    if recorder:
+        render_sessions(recorder.sessions, session_directory, jobs)
 
 
 if __name__ == "__main__":
-    for algo in os.listdir('./student'):
-        if algo[:len('student')] != 'student':
-            continue
-        name = algo[len('student'):].split('.')[0]
-        main(name)
+    session_directory = sys.argv[sys.argv.index('--sessions') + 1] if '--sessions' in sys.argv else None
+    jobs = int(sys.argv[sys.argv.index('--jobs') + 1]) if '--jobs' in sys.argv else 1
+    cache = ResultCache() if '--cache' in sys.argv else None
+    for name in tester.list_student_algos():
+        main(name, session_directory, jobs, cache)
@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
-import configparser
+import hashlib
 import importlib
-from typing import Tuple, List, Type
-from Classes import SimBuffer, NetworkTrace, Scorecard
+import numpy as np
+import struct
+from typing import Dict, Tuple, List, Type
+from Classes import SimBuffer, NetworkTrace, Scorecard, UpcomingBitrates, Profiler, Recorder
 import sys
 from importlib import reload
 import os
@@ -27,48 +29,198 @@ CHUNK_SIZE_RATIOS_HEADING  = 'chunk_size_ratios'
 CHUNK_SIZE_RATIOS		 = 'chunk_size_ratios'
 
 
-def read_test(config_path: str, print_output: bool):
+# Compiled test cases are cached here, keyed by the absolute path of the .ini they were compiled from
+COMPILED_TEST_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.test_cache')
+COMPILED_TEST_EXTENSION = '.abrtest'
+
+# Compiled test layout: this little-endian header, then float64 throughput times, throughput values, and the
+# chunk_qualities matrix (chunks x quality levels) in row order
+COMPILED_TEST_MAGIC = b'ABRT'
+COMPILED_TEST_VERSION = 1
+COMPILED_TEST_HEADER = struct.Struct('<4sI qq 32s ddd q ddd qq')
+COMPILED_TEST_FIELDS = ('chunk_length', 'base_chunk_cost', 'client_buffer_size', 'quality_levels',
+						'quality_coefficient', 'rebuffering_coefficient', 'variation_coefficient')
+
+
+def parse_test(config_path: str) -> Dict:
 	"""
-	Reads and loads parameters from config_path
+	Parses a .ini test file into the parameters stored in a compiled test
 	Args:
 		config_path : .ini file to read
+	:return: Dict of test parameters, with the throughputs and chunk qualities as float64 arrays
+	"""
+	import configparser  # deferred, compiled tests load without it
+
+	cfg = configparser.RawConfigParser(allow_no_value=True, inline_comment_prefixes='#')
+	cfg.read(config_path)
+
+	quality_levels = int(cfg.get(QUALITY_HEADING, QUALITY_LEVELS))
+	base_chunk_cost = float(cfg.get(VIDEO_HEADING, BASE_CHUNK_SIZE))
+
+	throughputs = dict(cfg.items(THROUGHPUT_HEADING))
+	throughputs = [(float(time), float(throughput)) for time, throughput in throughputs.items()]
+
+	chunks = cfg.get(CHUNK_SIZE_RATIOS_HEADING, CHUNK_SIZE_RATIOS)
+	chunks = list(float(x) for x in chunks.split(',') if x.strip())
+	chunk_qualities = [[c * (2**i) * base_chunk_cost for i in range(quality_levels)] for c in chunks]
+
+	return {
+		'chunk_length': float(cfg.get(VIDEO_HEADING, CHUNK_LENGTH)),
+		'base_chunk_cost': base_chunk_cost,
+		'client_buffer_size': float(cfg.get(VIDEO_HEADING, CLIENT_BUFF_SIZE)),
+		'quality_levels': quality_levels,
+		'quality_coefficient': float(cfg.get(QUALITY_HEADING, QUAL_COEF)),
+		'rebuffering_coefficient': float(cfg.get(QUALITY_HEADING, BUF_COEF)),
+		'variation_coefficient': float(cfg.get(QUALITY_HEADING, SWITCH_COEF)),
+		'throughput_times': np.array([t for t, _ in throughputs], dtype=np.float64),
+		'throughput_values': np.array([bw for _, bw in throughputs], dtype=np.float64),
+		'chunk_qualities': np.array(chunk_qualities, dtype=np.float64).reshape(len(chunks), quality_levels),
+	}
+
+
+def write_compiled_test(test: Dict, output_path: str, source_mtime_ns: int = 0, source_size: int = 0,
+						source_sha256: bytes = bytes(32)):
+	"""
+	Writes test parameters in the compiled test format, atomically
+	Args:
+		test : Dict of test parameters as returned by parse_test
+		output_path : File to write
+		source_mtime_ns : Modification time of the .ini the test was compiled from, 0 if none
+		source_size : Size in bytes of that .ini, 0 if none
+		source_sha256 : SHA-256 digest of that .ini, zeros if none
+	"""
+	header = COMPILED_TEST_HEADER.pack(COMPILED_TEST_MAGIC, COMPILED_TEST_VERSION, source_mtime_ns, source_size,
+									   source_sha256, *(test[field] for field in COMPILED_TEST_FIELDS),
+									   len(test['throughput_times']), len(test['chunk_qualities']))
+	os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+	tmp_path = f'{output_path}.{os.getpid()}.tmp'
+	with open(tmp_path, 'wb') as f:
+		f.write(header)
+		for field in ('throughput_times', 'throughput_values', 'chunk_qualities'):
+			f.write(np.ascontiguousarray(test[field], dtype='<f8').tobytes())
+	os.replace(tmp_path, output_path)
+
+
+def read_compiled_test(path: str) -> Tuple[Dict, int, int, bytes]:
+	"""
+	Reads a compiled test file
+	Args:
+		path : Compiled test file
+	:return: Tuple with the dict of test parameters, and the source mtime, size and SHA-256 it was compiled from
+	"""
+	with open(path, 'rb') as f:
+		data = f.read()
+	magic, version, mtime_ns, size, sha256, *values = COMPILED_TEST_HEADER.unpack_from(data)
+	if magic != COMPILED_TEST_MAGIC or version != COMPILED_TEST_VERSION:
+		raise ValueError(f'{path} is not a version {COMPILED_TEST_VERSION} compiled test')
+
+	test = dict(zip(COMPILED_TEST_FIELDS, values))
+	n_throughputs, n_chunks = values[-2:]
+	arrays = np.frombuffer(data, dtype='<f8', offset=COMPILED_TEST_HEADER.size)
+	test['throughput_times'] = arrays[:n_throughputs]
+	test['throughput_values'] = arrays[n_throughputs:2 * n_throughputs]
+	test['chunk_qualities'] = arrays[2 * n_throughputs:].reshape(n_chunks, test['quality_levels'])
+	return test, mtime_ns, size, sha256
+
+
+def compiled_test_path(config_path: str) -> str:
+	""" Returns the path of the compiled cache entry for a .ini test file """
+	digest = hashlib.sha1(os.path.abspath(config_path).encode()).hexdigest()[:16]
+	name = os.path.splitext(os.path.basename(config_path))[0]
+	return os.path.join(COMPILED_TEST_DIRECTORY, f'{name}-{digest}{COMPILED_TEST_EXTENSION}')
+
+
+def compile_test(config_path: str, output_path: str) -> Dict:
+	"""
+	Parses a .ini test file and writes it as a compiled test that read_test can load directly
+	Args:
+		config_path : .ini file to read
+		output_path : Compiled test file to write
+	:return: Dict of test parameters that was written
+	"""
+	with open(config_path, 'rb') as f:
+		sha256 = hashlib.sha256(f.read()).digest()
+	stat = os.stat(config_path)
+	test = parse_test(config_path)
+	write_compiled_test(test, output_path, stat.st_mtime_ns, stat.st_size, sha256)
+	return test
+
+
+def load_test(config_path: str) -> Dict:
+	"""
+	Loads the parameters of a test file. Compiled tests are loaded directly. For .ini files the compiled cache entry
+	is used when the .ini has not changed since it was compiled (same mtime and size, or same content hash),
+	otherwise the .ini is parsed and the cache entry rewritten.
+	Args:
+		config_path : .ini or compiled test file
+	:return: Dict of test parameters
+	"""
+	if config_path.endswith(COMPILED_TEST_EXTENSION):
+		return read_compiled_test(config_path)[0]
+
+	cache_path = compiled_test_path(config_path)
+	try:
+		test, mtime_ns, size, sha256 = read_compiled_test(cache_path)
+		stat = os.stat(config_path)
+		if mtime_ns == stat.st_mtime_ns and size == stat.st_size:
+			return test
+		with open(config_path, 'rb') as f:
+			if sha256 == hashlib.sha256(f.read()).digest():
+				return test
+	except (OSError, ValueError, struct.error):
+		pass
+
+	try:
+		return compile_test(config_path, cache_path)
+	except OSError:
+		# Cache directory is not writable, fall back to parsing every time
+		return parse_test(config_path)
+
+
+def read_test(config_path: str, print_output: bool, trace_file: str = None):
+	"""
+	Reads and loads parameters from config_path
+	Args:
+		config_path : .ini file to read, or a compiled test
 		print_output : Whether to print output
+		trace_file : Optional NetworkTrace file to memory map in place of the test's [throughput] section
 	:return:
-		Tuple containing the NetworkTrace, Scorecard, SimBuffer, a list of chunk quality bitrates,
-		and the chunk duration. The chunk quality options are formatted as a list of lists. e.g.
+		Tuple containing the NetworkTrace, Scorecard, SimBuffer, the chunk quality bitrates, and the chunk duration.
+		The chunk quality options are a 2-D array (chunks x quality levels). e.g.
 		chunk_qualities[3][1] = number of bytes for chunk index 3, quality index 1.
 	"""
 	try:
 		if print_output: print(f'\nLoading test file {config_path}.')
-		cfg = configparser.RawConfigParser(allow_no_value=True, inline_comment_prefixes='#')
-		cfg.read(config_path)
+		test = load_test(config_path)
 
-		chunk_length = float(cfg.get(VIDEO_HEADING, CHUNK_LENGTH))
-		base_chunk_cost = float(cfg.get(VIDEO_HEADING, BASE_CHUNK_SIZE))
-		client_buffer_size = float(cfg.get(VIDEO_HEADING, CLIENT_BUFF_SIZE))
+		chunk_length = float(test['chunk_length'])
+		base_chunk_cost = float(test['base_chunk_cost'])
+		client_buffer_size = float(test['client_buffer_size'])
 		if print_output: print(f'\tLoaded chunk length {chunk_length} seconds, base cost {base_chunk_cost} megabytes.')
 
-		quality_levels = int(cfg.get(QUALITY_HEADING, QUALITY_LEVELS))
+		quality_levels = int(test['quality_levels'])
 		if print_output: print(f'\tLoaded {quality_levels} quality levels available.')
 
-		quality_coefficient = float(cfg.get(QUALITY_HEADING, QUAL_COEF))
-		rebuffering_coefficient = float(cfg.get(QUALITY_HEADING, BUF_COEF))
-		variation_coefficient = float(cfg.get(QUALITY_HEADING, SWITCH_COEF))
+		quality_coefficient = float(test['quality_coefficient'])
+		rebuffering_coefficient = float(test['rebuffering_coefficient'])
+		variation_coefficient = float(test['variation_coefficient'])
 		if print_output: print(f'\tLoaded {quality_coefficient} quality coefficient,'
 							   f' {rebuffering_coefficient} rebuffering coefficient,'
 							   f' {variation_coefficient} variation coefficient.')
 
-		throughputs = dict(cfg.items(THROUGHPUT_HEADING))
-		throughputs = [(float(time), float(throughput)) for time, throughput in throughputs.items()]
-		if print_output: print(f'\tLoaded {len(throughputs)} different throughputs.')
+		if trace_file:
+			trace = NetworkTrace.NetworkTrace.from_file(trace_file)
+			if print_output: print(f'\tMapped {len(trace.start_times)} different throughputs from {trace_file}.')
+		else:
+			trace = NetworkTrace.NetworkTrace.from_arrays(test['throughput_times'], test['throughput_values'])
+			if print_output: print(f'\tLoaded {len(trace.start_times)} different throughputs.')
 
-		chunks = cfg.get(CHUNK_SIZE_RATIOS_HEADING, CHUNK_SIZE_RATIOS)
-		chunks = list(float(x) for x in chunks.split(',') if x.strip())
-		chunk_qualities = [[c * (2**i) * base_chunk_cost for i in range(quality_levels)] for c in chunks]
-		if print_output: print(f'\tLoaded {len(chunks)} chunks. Total video length is {len(chunks) * chunk_length} seconds.')
+		chunk_qualities = test['chunk_qualities']
+		if print_output: print(f'\tLoaded {len(chunk_qualities)} chunks.'
+							   f' Total video length is {len(chunk_qualities) * chunk_length} seconds.')
 
-		trace = NetworkTrace.NetworkTrace(throughputs)
-		logger = Scorecard.Scorecard(quality_coefficient, rebuffering_coefficient, variation_coefficient, chunk_length)
+		logger = Scorecard.Scorecard(quality_coefficient, rebuffering_coefficient, variation_coefficient, chunk_length,
+									 len(chunk_qualities))
 		buffer = SimBuffer.SimBuffer(chunk_length, client_buffer_size)
 
 		if print_output: print(f'\tDone reading config!\n')
@@ -82,10 +234,68 @@ def read_test(config_path: str, print_output: bool):
 		exit()
 
 
+# Command line options of simulator.py and tester.py that configure student modules. Each sets an environment
+# variable that the student reads its settings from, see student2.py
+STUDENT_OPTIONS = {'--mpc-solver': 'MPC_SOLVER', '--mpc-lookahead': 'MPC_LOOKAHEAD',
+				   '--decision-cache': 'MPC_DECISION_CACHE', '--cache-steps': 'MPC_CACHE_STEPS'}
+STUDENT_FLAGS = {'--track-dp-gap': 'MPC_TRACK_DP_GAP'}
+STUDENT_USAGE = ' [--mpc-solver exhaustive|dp|table] [--mpc-lookahead N] [--track-dp-gap] [--decision-cache N]' \
+				' [--cache-steps buffer,time,error]'
+
+
+def apply_student_options(argv: List[str]):
+	"""
+	Sets the environment variables of the student options in argv. Students imported or reset afterwards, in this
+	process or in worker processes started afterwards, pick them up.
+	Args:
+		argv : Command line arguments
+	"""
+	for option, variable in STUDENT_OPTIONS.items():
+		if option in argv:
+			os.environ[variable] = argv[argv.index(option) + 1]
+	for flag, variable in STUDENT_FLAGS.items():
+		if flag in argv:
+			os.environ[variable] = '1'
+
+
+def load_student(student_algo):
+	"""
+	Imports a student module with fresh per-session state. A module imported for the first time is fresh already. A
+	module used by an earlier session is reset by calling its reset() hook if it has one, which skips re-executing
+	the module and its imports, and reloaded otherwise.
+	Args:
+		student_algo : Student algorithm to load
+	:return: The student module
+	"""
+	assert os.path.exists(f'./student/student{student_algo}.py'),\
+		f'Could not find student algorithm ./student/student{student_algo}.py!'
+	name = f'student.student{student_algo}'
+	if name not in sys.modules:
+		return importlib.import_module(name)
+
+	student = sys.modules[name]
+	if callable(getattr(student, 'reset', None)):
+		student.reset()
+	else:
+		reload(student)  # In case the student has global variables
+	return student
+
+
+def student_summary(student) -> str:
+	"""
+	Returns a student module's report of the session that just ended, from its session_summary() hook if it has one
+	"""
+	hook = getattr(student, 'session_summary', None)
+	return hook() if callable(hook) else ''
+
+
 # ======================================================================================================================
 # MAIN
 # ======================================================================================================================
-def main(config_file: str, student_algo, verbose: bool, print_output=True) -> Tuple[float, float, float, float]:
+def main(config_file: str, student_algo, verbose: bool, print_output=True,
+		 trace_file: str = None, profiler: Profiler.Profiler = None,
+		 recorder: Recorder.Recorder = None,
+		 coefficients: Tuple[float, float, float] = None) -> Tuple[float, float, float, float]:
 	"""
 	Main loop. Runs the simulator with the given config file.
 	Args:
@@ -93,20 +303,32 @@ def main(config_file: str, student_algo, verbose: bool, print_output=True) -> Tu
 		student_algo: Student algorithm to run
 		verbose : Whether to print verbose output
 		print_output : Whether to print any output at all
+		trace_file : Optional NetworkTrace file to use in place of the test's [throughput] section
+		profiler : Optional Profiler to charge the time of each phase to
+		recorder : Optional Recorder to send the session and per-chunk events to
+		coefficients : Optional quality, rebuffering and variation coefficients to use in place of the test's
 	:return: Tuple with the total quality, rebuffer time, total variation, and user QoE for this test
 	"""
-	trace, logger, buffer, chunk_qualities, chunk_length = read_test(config_file, print_output)
+	if profiler:
+		profiler.algo = student_algo
+		session_start = lap = profiler.clock()
+	trace, logger, buffer, chunk_qualities, chunk_length = read_test(config_file, print_output, trace_file)
+	if coefficients:
+		logger.quality_coeff, logger.rebuffer_coeff, logger.switch_coeff = (float(c) for c in coefficients)
+	if profiler: lap = profiler.lap('read_test', lap)
 
-	assert os.path.exists(f'./student/student{student_algo}.py'),\
-		f'Could not find student algorithm ./student/student{student_algo}.py!'
-	student = importlib.import_module(f'student.student{student_algo}')
-	reload(student)  # In case the student has global variables
+	student = load_student(student_algo)
+	if profiler: lap = profiler.lap('student load', lap)
+	if recorder: recorder.session_start(config_file, student_algo)
 
 	current_time = 0
 	prev_throughput = 0
+	# Read-only view of the whole video, sliced without copying to give the student the upcoming chunks
+	video = UpcomingBitrates.UpcomingBitrates(chunk_qualities)
 
 	# Communication loop with student (for all chunks):
 	for chunknum in range(len(chunk_qualities)):
+		if profiler: lap = profiler.clock()
 		# Set up message for student
 		message = student.ClientMessage()
 		message.total_seconds_elapsed = current_time
@@ -117,38 +339,81 @@ def main(config_file: str, student_algo, verbose: bool, print_output=True) -> Tu
 		message.buffer_max_size = buffer.client_buffer_size
 
 		# Video
-		message.quality_levels = len(chunk_qualities[chunknum])
-		message.quality_bitrates = chunk_qualities[chunknum]
-		message.upcoming_quality_bitrates = chunk_qualities[chunknum+1:] if chunknum < len(chunk_qualities) - 1 else []
+		bitrates = video[chunknum]
+		message.quality_levels = len(bitrates)
+		message.quality_bitrates = bitrates
+		message.upcoming_quality_bitrates = video[chunknum+1:]
 		# Quality
 		message.quality_coefficient = logger.quality_coeff
 		message.rebuffering_coefficient = logger.rebuffer_coeff
 		message.variation_coefficient = logger.switch_coeff
+		# Requests sent earlier whose chunks have not arrived yet, oldest first. This simulator downloads one chunk at
+		# a time, so there are none. concurrent_simulator.py keeps several requests in flight and lists each as an
+		# InFlightDownload with the chunknum, quality, size (Mb), remaining (Mb left to download) and seconds_elapsed
+		# (since the request was sent).
+		message.in_flight_downloads = []
+		if profiler: lap = profiler.lap('message setup', lap)
 
 		# Call student algorithm
 		quality = student.student_entrypoint(message)
-		if quality < 0 or quality >= len(chunk_qualities[chunknum]) or not isinstance(quality, int):
+		if profiler: lap = profiler.lap('student_entrypoint', lap)
+		if quality < 0 or quality >= len(bitrates) or not isinstance(quality, int):
 			print("Student returned invalid quality, exiting")
 			break
-		chosen_bitrate = chunk_qualities[chunknum][quality]
+		chosen_bitrate = bitrates[quality]
 
 		# Simulate download
 		time_elapsed = trace.simulate_download_from_time(current_time, chosen_bitrate)
+		if profiler: lap = profiler.lap('simulate_download', lap)
 		rebuff_time = buffer.sim_chunk_download(chosen_bitrate, time_elapsed)
 
 		# Update state variables and log
 		prev_throughput = chosen_bitrate / time_elapsed
 		current_time += time_elapsed
 		current_time += buffer.wait_until_buffer_is_not_full(verbose and print_output)
+		if profiler: lap = profiler.lap('SimBuffer', lap)
 		logger.log_bitrate_choice(current_time, quality, chosen_bitrate)
 		logger.log_rebuffer(current_time - rebuff_time, rebuff_time, chunknum)
+		if profiler: lap = profiler.lap('Scorecard logging', lap)
+		if recorder:
+			recorder.chunk(chunknum, quality, chosen_bitrate, time_elapsed, rebuff_time, buffer.seconds_left, current_time)
+			if profiler: lap = profiler.lap('Recorder', lap)
 
+	if profiler: lap = profiler.clock()
 	if print_output:
 		logger.output_results(verbose=verbose)
 
-	return logger.get_qual_rebuff_var_qoe()
+	summary = student_summary(student)
+	if print_output and summary:
+		print(summary)
+
+	results = logger.get_qual_rebuff_var_qoe()
+	if recorder:
+		recorder.student_summary(summary)
+		recorder.session_end(results)
+	if profiler:
+		profiler.lap('Scorecard results', lap)
+		profiler.wall += profiler.clock() - session_start
+	return results
 
 
 if __name__ == '__main__':
-	assert len(sys.argv) >= 3, f'Proper usage: python3 {sys.argv[0]} [config_file] [student_algo] [-v --verbose]'
-	main(sys.argv[1], sys.argv[2], '-v' in sys.argv or '--verbose' in sys.argv)
+	assert len(sys.argv) >= 3, \
+		f'Proper usage: python3 {sys.argv[0]} [config_file] [student_algo] [-v --verbose] [--trace trace_file]' \
+		f' [--profile] [--profile-out stats_file] [--plot directory]' + STUDENT_USAGE
+	apply_student_options(sys.argv)
+	trace_file = sys.argv[sys.argv.index('--trace') + 1] if '--trace' in sys.argv else None
+	profile_out = sys.argv[sys.argv.index('--profile-out') + 1] if '--profile-out' in sys.argv else None
+	profiler = Profiler.Profiler() if '--profile' in sys.argv or profile_out else None
+	plot_directory = sys.argv[sys.argv.index('--plot') + 1] if '--plot' in sys.argv else None
+	recorder = Recorder.DecisionRecorder() if plot_directory else None
+	args = (sys.argv[1], sys.argv[2], '-v' in sys.argv or '--verbose' in sys.argv, True, trace_file, profiler, recorder)
+	if profile_out:
+		Profiler.Profiler.run_cprofile(profile_out, main, *args)
+	else:
+		main(*args)
+	if profiler:
+		profiler.report()
+	if recorder:
+		import plotting  # rendered after the session, off the decision path
+		print(f'Quality plot written to {plotting.render_sessions(recorder.sessions, plot_directory)[0]}.')
@@ -1,5 +1,4 @@
 from typing import List
-import numpy as np
 
 # Adapted from code by Zach Peats
 
@@ -57,6 +56,8 @@ class ClientMessage:
   quality_coefficient: float
   variation_coefficient: float
   rebuffering_coefficient: float
+
+  in_flight_downloads: List[tuple]  # Requests sent earlier that are still downloading, see simulator.py
 # ======================================================================================================================
 
 
@@ -77,7 +78,6 @@ class BBA_2():
         self.do_quickstart = True
 
         self.plot_num = 1
-        self.quals = []
         self.counts = [0,0,0]
 
     def __str__(self):
@@ -155,7 +155,7 @@ class BBA_2():
         self.R_prev    = clt_msg.quality_bitrates[qual_choice]
         self.buffer_capacity_prev = self.buffer_capacity
   
-        print_dbg('\n  '.join([f'{k} == {v}' for (k,v) in clt_msg.__dict__.items()]))
+        if DBG: print_dbg('\n  '.join([f'{k} == {v}' for (k,v) in clt_msg.__dict__.items()]))
         print_dbg(f'video left {clt_msg.buffer_seconds_until_empty} s')
         print_dbg(f'bitrates: {clt_msg.quality_bitrates} kB')
         print_dbg(f'chose quality {qual_choice}')
@@ -164,27 +164,6 @@ class BBA_2():
         # print_dbg(f'mid :  {self.counts[2]/sum(self.counts)}')
         print_dbg('')
 
-        # plotting
-        self.quals.append(qual_choice)
-        if len(clt_msg.upcoming_quality_bitrates) == 0:
-            from matplotlib import pyplot as plt 
-            
-            plt.subplot(1,2,1)
-            plt.plot(self.quals)
-            plt.title('quality over time')
-            plt.xlabel('chunk number')
-            plt.ylabel('bitrate')
-
-            plt.subplot(1,2, 2)
-            plt.hist(self.quals)
-            plt.title('quality distribution')
-            plt.xlabel('chunk bitrate')
-            plt.ylabel('frequency')
-
-            plt.tight_layout()
-            plt.savefig('BBA_2_qualitites.png')
-            plt.clf()
-
         return qual_choice
 
 
@@ -192,6 +171,15 @@ class BBA_2():
 bba_2 = BBA_2()
 print_dbg(bba_2)
 
+def reset():
+    """
+    Called by the simulator before every session after the first, in place of reloading this module. Restores the
+    per-session state that importing the module sets up.
+    """
+    global bba_2
+    bba_2 = BBA_2()
+    print_dbg(bba_2)
+
 def student_entrypoint(client_message: ClientMessage):
     """
     Your mission, if you choose to accept it, is to build an algorithm for chunk bitrate selection that provides
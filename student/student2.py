@@ -1,5 +1,7 @@
 from typing import List
-from itertools import product
+import numpy as np
+import os
+from collections import OrderedDict
 
 # Adapted from code by Zach Peats
 
@@ -57,6 +59,8 @@ class ClientMessage:
     quality_coefficient: float
     variation_coefficient: float
     rebuffering_coefficient: float
+
+    in_flight_downloads: List[tuple]  # Requests sent earlier that are still downloading, see simulator.py
 # ======================================================================================================================
 
 
@@ -71,19 +75,196 @@ def print_dbg(*args):
     global DBG
     if DBG: print(*args)
 
+# matrix of every quality path for the given number of levels at each lookahead step, one path per row in the
+# same order as itertools.product. Cached since the shape rarely changes within a session
+path_matrices = {}
+def get_path_matrix(levels: tuple):
+    if levels not in path_matrices:
+        path_matrices[levels] = np.indices(levels).reshape(len(levels), -1).T
+    return path_matrices[levels]
+
+# QOE of every quality path (last axis) under the robust MPC objective. The download times, buffer capacity,
+# previous quality and throughput error may carry leading state axes to score many MPC problems in one call
+def score_mpc_paths(times, paths, buffer_capacity, qual_prev, throughput_error,
+                    quality_coefficient, rebuffering_coefficient, variation_coefficient):
+    # calculate metrics that factor into QOE for every path at once
+    quality       = paths.sum(axis=1)
+    download_time = 0
+    for i, t in enumerate(times):
+        download_time = download_time + t[..., paths[:, i]]
+    rebuff_time = np.maximum(0, download_time - buffer_capacity)
+    rebuff_time = rebuff_time / (1 + throughput_error)
+    variation   = np.abs(paths[:, 0] - qual_prev) + np.abs(np.diff(paths, axis=1)).sum(axis=1)
+
+    # calculate the QOE of each path based on config metrics
+    return quality_coefficient     * quality     \
+         - rebuffering_coefficient * rebuff_time \
+         - variation_coefficient   * variation
+
+# bounded LRU cache of MPC decisions keyed on a quantized version of the MPC state
+class DecisionCache():
+    def __init__(self, maxsize: int = 0):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits    = 0
+        self.misses  = 0
+
+    def get(self, key):
+        qual = self.entries.get(key)
+        if qual is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return qual
+
+    def put(self, key, qual: int):
+        self.entries[key] = qual
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def resize(self, maxsize: int):
+        self.maxsize = maxsize
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        rate    = 100 * self.hits / lookups if lookups else 0
+        return f'decision cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), ' \
+               f'{len(self.entries)}/{self.maxsize} entries'
+
+# robust MPC settings, read from the environment so that simulator.py and tester.py can set them with --mpc-solver,
+# --mpc-lookahead, --track-dp-gap, --decision-cache and --cache-steps. Python callers may also assign them
+# directly, reset() applies them to the next session
+MPC_SOLVER    = None   # 'exhaustive', 'dp' or 'table'. None picks 'table' when FASTMPC_TABLE is set, else 'exhaustive'
+MPC_LOOKAHEAD = 5      # chunks in the lookahead window
+TRACK_DP_GAP  = False  # print how far each session's 'dp' decisions are from the exhaustive optimum
+
+DECISION_CACHE_SIZE = 0     # max number of cached decisions, 0 disables the cache
+CACHE_BUFFER_STEP   = 0.5   # seconds of buffer per quantization band
+CACHE_TIME_STEP     = 0.1   # relative width of the download time bands, 0.1 is 10% per band
+CACHE_ERROR_STEP    = 0.05  # throughput prediction error per quantization band
+
+SETTINGS_VARIABLES = ('MPC_SOLVER', 'MPC_LOOKAHEAD', 'MPC_TRACK_DP_GAP', 'MPC_DECISION_CACHE', 'MPC_CACHE_STEPS')
+settings_environment = None
+def read_settings():
+    global MPC_SOLVER, MPC_LOOKAHEAD, TRACK_DP_GAP, DECISION_CACHE_SIZE, settings_environment
+    global CACHE_BUFFER_STEP, CACHE_TIME_STEP, CACHE_ERROR_STEP
+    settings_environment = {name: os.environ.get(name) for name in SETTINGS_VARIABLES}
+    MPC_SOLVER          = os.environ.get('MPC_SOLVER') or None
+    MPC_LOOKAHEAD       = int(os.environ.get('MPC_LOOKAHEAD') or 5)
+    TRACK_DP_GAP        = os.environ.get('MPC_TRACK_DP_GAP', '') not in ('', '0')
+    DECISION_CACHE_SIZE = int(os.environ.get('MPC_DECISION_CACHE') or 0)
+    # buffer, download time and error steps, comma separated
+    steps = [float(step) for step in (os.environ.get('MPC_CACHE_STEPS') or '0.5,0.1,0.05').split(',')]
+    assert len(steps) == 3, 'MPC_CACHE_STEPS takes the buffer, download time and error steps'
+    CACHE_BUFFER_STEP, CACHE_TIME_STEP, CACHE_ERROR_STEP = steps
+read_settings()
+
+# rereads the settings if the environment changed since they were last read, keeping values assigned from Python
+def refresh_settings():
+    if {name: os.environ.get(name) for name in SETTINGS_VARIABLES} != settings_environment:
+        read_settings()
+
+# the cache outlives importlib.reload so that it is shared by every session and test case in a sweep
+try:              decision_cache
+except NameError: decision_cache = DecisionCache()
+decision_cache.resize(DECISION_CACHE_SIZE)
+
+# precomputed MPC decisions for one video (FastMPC), indexed by
+# [chunk, previous quality, throughput error band, buffer level, throughput band]. Built offline by fastmpc.py
+class DecisionTable():
+    def __init__(self, decisions, chunk_bitrates, coefficients, lookahead_window, buffer_step, throughput_grid,
+                 error_grid):
+        self.decisions        = decisions
+        self.chunk_bitrates   = chunk_bitrates
+        self.coefficients     = tuple(float(c) for c in coefficients)
+        self.lookahead_window = int(lookahead_window)
+        self.buffer_step      = float(buffer_step)
+        self.throughput_grid  = throughput_grid
+        self.error_grid       = error_grid
+        self.log_tp_step      = np.log(throughput_grid[1] / throughput_grid[0])
+
+    @classmethod
+    def build(cls, chunk_qualities, coefficients, buffer_max_size, lookahead_window=5, buffer_step=0.5,
+              throughput_grid=None, error_grid=None):
+        if throughput_grid is None: throughput_grid = np.geomspace(0.05, 20, 64)
+        if error_grid is None:      error_grid      = np.array([0, 0.1, 0.25, 0.5])
+        bitrates = np.asarray(chunk_qualities, dtype=float)
+        buffers  = np.arange(int(round(buffer_max_size / buffer_step)) + 1) * buffer_step
+        levels   = bitrates.shape[1]
+
+        decisions = np.zeros((len(bitrates), levels, len(error_grid), len(buffers), len(throughput_grid)), np.uint8)
+        for chunknum in range(len(bitrates)):
+            # same download times as Robust_MPC.get_time_from_bitrates, for every throughput band at once
+            steps = bitrates[chunknum:chunknum + lookahead_window]
+            times = [steps[0]] + [r[None, :] / throughput_grid[:, None] for r in steps[1:]]
+            paths = get_path_matrix((levels,) * len(steps))
+            for e, error in enumerate(error_grid):
+                qoe  = score_mpc_paths(times, paths, buffers[:, None, None], np.arange(levels)[:, None, None, None],
+                                       error, *coefficients)
+                best = np.where(qoe.max(axis=-1) <= -1000, 0, paths[qoe.argmax(axis=-1), 0])
+                decisions[chunknum, :, e] = best
+
+        return cls(decisions, bitrates, coefficients, lookahead_window, buffer_step, throughput_grid, error_grid)
+
+    def save(self, path: str):
+        np.savez_compressed(path, decisions=self.decisions, chunk_bitrates=self.chunk_bitrates,
+                            coefficients=self.coefficients, lookahead_window=self.lookahead_window,
+                            buffer_step=self.buffer_step, throughput_grid=self.throughput_grid,
+                            error_grid=self.error_grid)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as data:
+            return cls(**{k: data[k] for k in data.files})
+
+    # whether this table was built for the chunk and QOE coefficients in the message
+    def matches(self, chunknum: int, clt_msg:ClientMessage):
+        return 0 <= chunknum < len(self.chunk_bitrates) \
+            and len(clt_msg.quality_bitrates) == self.chunk_bitrates.shape[1] \
+            and np.allclose(self.chunk_bitrates[chunknum], clt_msg.quality_bitrates) \
+            and self.coefficients == (clt_msg.quality_coefficient, clt_msg.rebuffering_coefficient,
+                                      clt_msg.variation_coefficient)
+
+    def lookup(self, chunknum: int, qual_prev: int, throughput_error: float, buffer: float, throughput: float):
+        e = int(np.abs(self.error_grid - throughput_error).argmin())
+        b = min(int(round(buffer / self.buffer_step)), self.decisions.shape[3] - 1)
+        t = int(round(np.log(throughput / self.throughput_grid[0]) / self.log_tp_step))
+        t = min(max(t, 0), self.decisions.shape[4] - 1)
+        return int(self.decisions[chunknum, qual_prev, e, b, t])
+
+FASTMPC_TABLE = os.environ.get('FASTMPC_TABLE') # decision table used by the 'table' solver, see fastmpc.py
+decision_table = DecisionTable.load(FASTMPC_TABLE) if FASTMPC_TABLE else None
+
 class Robust_MPC():
-    def __init__(self):
+    def __init__(self, solver: str = 'exhaustive', lookahead_window: int = 5, cache: DecisionCache = None,
+                 table: DecisionTable = None):
         self.qual_prev = 0
         self.throughput = None
         self.througput_prev = 0
         self.throughput_error = 0
 
         self.lookback_window  = 5
-        self.lookahead_window = 5
+        self.lookahead_window = lookahead_window
         self.throughput_hist  = []
 
+        # 'exhaustive' scores every quality path in the lookahead window. 'dp' runs a dynamic program over
+        # (step, previous quality, discretized buffer level) so long lookahead windows stay cheap. 'table' looks
+        # decisions up in a precomputed DecisionTable and falls back to 'exhaustive' for chunks it does not cover
+        self.solver         = solver
+        self.dp_buffer_step = 0.1     # seconds of video per discretized buffer level
+        self.track_dp_gap   = False   # compare every dp decision against the exhaustive optimum
+        self.max_gap_paths  = 100000  # skip the comparison when the lookahead has more paths than this
+        self.dp_gaps        = []
+        self.dp_agreements  = []
+
+        self.cache = cache
+        self.table = table
+
         self.plot_num = 1
-        self.quals = []
         self.counts = [0,0,0]
 
     def __str__(self):
@@ -110,37 +291,112 @@ class Robust_MPC():
             except: break
         return times
 
+    # every quality path within the lookahead and its QOE under the robust MPC objective
+    def score_MPC(self, clt_msg:ClientMessage):
+        times = self.get_time_from_bitrates(clt_msg.quality_bitrates, clt_msg.upcoming_quality_bitrates)
+        paths = get_path_matrix(tuple(len(t) for t in times)) # all possible paths within given lookahead
+        qoe   = score_mpc_paths([np.asarray(t) for t in times], paths, self.buffer_capacity, self.qual_prev,
+                                self.throughput_error, clt_msg.quality_coefficient,
+                                clt_msg.rebuffering_coefficient, clt_msg.variation_coefficient)
+        return paths, qoe
+
     def calc_MPC(self, clt_msg:ClientMessage):
-        # caclulates differences in an array of qualitites
-        # used for varience metric
-        def calc_diffs(quals):
-            for i in range(len(quals)):
-                if i == 0: yield abs(self.qual_prev - quals[i])
-                else:      yield abs(quals[i] - quals[i-1])
-
-
-        qual_max   = 0
-        qoe_max    = -1000 # arbitrary large negitive (REALLY bad if QOE is this low)
-        times      = self.get_time_from_bitrates(clt_msg.quality_bitrates, clt_msg.upcoming_quality_bitrates)
-        qual_paths = list(product( *[list(range(len(t))) for t in times] )) # all possible paths within given lookahead
-        for path in qual_paths:
-            # calculate metrics that factor into QOE
-            quality     = sum(path)
-            rebuff_time = max(0, sum([times[i][j] for (i, j) in enumerate(path)]) - self.buffer_capacity)
-            rebuff_time = rebuff_time / (1 + self.throughput_error)
-            variation   = sum(calc_diffs(path))
-
-            # calculate the QOE of the given path based on config metrics
-            qoe_temp    = clt_msg.quality_coefficient     * quality
-            qoe_temp   -= clt_msg.rebuffering_coefficient * rebuff_time
-            qoe_temp   -= clt_msg.variation_coefficient   * variation
-            
-            # select bitrate that yields the hightst QOE
-            if qoe_temp > qoe_max:
-                qoe_max  = qoe_temp
-                qual_max = path[0]
-        
-        return qual_max
+        paths, qoe = self.score_MPC(clt_msg)
+
+        # select bitrate that yields the hightst QOE (first path on ties)
+        best = int(np.argmax(qoe))
+        if qoe[best] <= -1000: # arbitrary large negitive (REALLY bad if QOE is this low)
+            return 0
+        return int(paths[best, 0])
+
+    # download times of every quality for the current chunk and the upcoming chunks in the lookahead
+    def get_download_times(self, clt_msg:ClientMessage):
+        bitrates = [clt_msg.quality_bitrates] + list(clt_msg.upcoming_quality_bitrates[:self.lookahead_window - 1])
+        return [np.asarray(r, dtype=float) / self.throughput for r in bitrates]
+
+    def calc_MPC_dp(self, clt_msg:ClientMessage):
+        times      = self.get_download_times(clt_msg)
+        quals      = np.arange(len(times[0]))
+        chunk_len  = clt_msg.buffer_seconds_per_chunk
+        max_buffer = clt_msg.buffer_max_size
+        step       = self.dp_buffer_step
+        grid       = np.arange(int(round(max_buffer / step)) + 1) * step
+        switch     = clt_msg.variation_coefficient * np.abs(quals[:, None] - quals[None, :]) # [prev quality, quality]
+
+        # reward of downloading each quality from each buffer level and the buffer level it leaves behind
+        def stage(buffer, download_time):
+            rebuff_time = np.maximum(download_time - buffer, 0) / (1 + self.throughput_error)
+            next_buffer = np.minimum(np.maximum(buffer - download_time, 0) + chunk_len, max_buffer)
+            next_level  = np.minimum(np.rint(next_buffer / step).astype(int), len(grid) - 1)
+            reward      = clt_msg.quality_coefficient * quals - clt_msg.rebuffering_coefficient * rebuff_time
+            return reward, next_buffer, next_level
+
+        # backward pass: value[prev quality, buffer level] is the best QOE obtainable from step i onwards
+        value = np.zeros((len(quals), len(grid)))
+        for t in reversed(times[1:]):
+            reward, _, next_level = stage(grid[:, None], t[None, :])
+            total = (reward + value[quals[None, :], next_level])[None, :, :] - switch[:, None, :]
+            value = total.max(axis=2)
+
+        # the first step starts from the exact buffer level rather than the grid
+        reward, _, next_level = stage(self.buffer_capacity, times[0])
+        qual_choice = int(np.argmax(reward + value[quals, next_level] - switch[self.qual_prev]))
+
+        if self.track_dp_gap and len(quals) ** len(times) <= self.max_gap_paths:
+            self.record_dp_gap(clt_msg, qual_choice)
+        return qual_choice
+
+    # records how much exhaustive MPC QOE the dp choice gives up: the best path of the exhaustive objective that
+    # starts with the dp quality against the best path that starts with the exhaustive choice
+    def record_dp_gap(self, clt_msg:ClientMessage, qual_choice):
+        paths, qoe = self.score_MPC(clt_msg)
+        best       = int(np.argmax(qoe))
+        exhaustive = 0 if qoe[best] <= -1000 else int(paths[best, 0])
+        self.dp_gaps.append(qoe[paths[:, 0] == exhaustive].max() - qoe[paths[:, 0] == qual_choice].max())
+        self.dp_agreements.append(exhaustive == qual_choice)
+
+    def dp_gap_report(self):
+        if not self.dp_gaps:
+            return 'no dp decisions compared against the exhaustive optimum'
+        return f'dp vs exhaustive over {len(self.dp_gaps)} decisions: ' \
+               f'mean QOE gap {np.mean(self.dp_gaps):.4f}, max QOE gap {np.max(self.dp_gaps):.4f}, ' \
+               f'same first quality {100 * np.mean(self.dp_agreements):.1f}%'
+
+    # quantized MPC state used as the decision cache key. The solvers only see the chunk sizes and the throughput
+    # through the download times of each step, so the key holds those instead of either one. Every quality costs a
+    # fixed multiple of the lowest, whose time is quantized in relative (log) bands
+    def get_cache_key(self, clt_msg:ClientMessage):
+        if self.solver == 'dp': times = self.get_download_times(clt_msg)
+        else:                   times = self.get_time_from_bitrates(clt_msg.quality_bitrates,
+                                                                    clt_msg.upcoming_quality_bitrates)
+        common = (self.solver, self.lookahead_window, self.qual_prev, clt_msg.quality_levels, len(times),
+                  clt_msg.quality_coefficient, clt_msg.rebuffering_coefficient, clt_msg.variation_coefficient)
+
+        # with more buffer than the slowest path takes to download, no path rebuffers and the decision only depends
+        # on the previous quality and the coefficients. The margin covers the dp solver rounding its buffer levels
+        if self.buffer_capacity > sum(max(t) for t in times) + len(times) * self.dp_buffer_step:
+            return common
+
+        log_step = np.log1p(CACHE_TIME_STEP)
+        return common + (
+            round(self.buffer_capacity / CACHE_BUFFER_STEP),
+            round(self.throughput_error / CACHE_ERROR_STEP),
+            tuple(round(float(np.log(t[0])) / log_step) for t in times),
+            clt_msg.buffer_seconds_per_chunk, clt_msg.buffer_max_size,
+            (CACHE_BUFFER_STEP, CACHE_TIME_STEP, CACHE_ERROR_STEP),
+        )
+
+    def lookup_MPC(self, clt_msg:ClientMessage):
+        chunknum = len(self.table.chunk_bitrates) - 1 - len(clt_msg.upcoming_quality_bitrates)
+        if not self.table.matches(chunknum, clt_msg):
+            return self.calc_MPC(clt_msg)
+        return self.table.lookup(chunknum, self.qual_prev, self.throughput_error, self.buffer_capacity,
+                                 self.throughput)
+
+    def solve_MPC(self, clt_msg:ClientMessage):
+        if   self.solver == 'dp':    return self.calc_MPC_dp(clt_msg)
+        elif self.solver == 'table': return self.lookup_MPC(clt_msg)
+        else:                        return self.calc_MPC(clt_msg)
 
     def get_quality(self, clt_msg: ClientMessage):
         self.buffer_capacity = clt_msg.buffer_seconds_until_empty
@@ -154,11 +410,18 @@ class Robust_MPC():
             self.throughput      = 1.5
             self.througput_error = 0
         # calculate bitrate (R) and (startup delay (T_s) in init phase)
-        qual_choice = self.calc_MPC(clt_msg)
+        if self.cache is None:
+            qual_choice = self.solve_MPC(clt_msg)
+        else:
+            key         = self.get_cache_key(clt_msg)
+            qual_choice = self.cache.get(key)
+            if qual_choice is None:
+                qual_choice = self.solve_MPC(clt_msg)
+                self.cache.put(key, qual_choice)
         
         self.qual_prev = qual_choice
   
-        print_dbg('\n  '.join([f'{k} == {v}' for (k,v) in clt_msg.__dict__.items()]))
+        if DBG: print_dbg('\n  '.join([f'{k} == {v}' for (k,v) in clt_msg.__dict__.items()]))
         print_dbg(f'video left {clt_msg.buffer_seconds_until_empty} s')
         print_dbg(f'bitrates: {clt_msg.quality_bitrates} kB')
         print_dbg(f'chose quality {qual_choice}')
@@ -167,34 +430,69 @@ class Robust_MPC():
         # print_dbg(f'mid :  {self.counts[2]/sum(self.counts)}')
         print_dbg('')
 
-        # plotting
-        self.quals.append(qual_choice)
-        if len(clt_msg.upcoming_quality_bitrates) == 0:
-            from matplotlib import pyplot as plt 
-            
-            plt.subplot(1,2,1)
-            plt.plot(self.quals)
-            plt.title('quality over time')
-            plt.xlabel('chunk number')
-            plt.ylabel('bitrate')
-
-            plt.subplot(1,2, 2)
-            plt.hist(self.quals)
-            plt.title('quality distribution')
-            plt.xlabel('chunk bitrate')
-            plt.ylabel('frequency')
-
-            plt.tight_layout()
-            plt.savefig('Robust_MPC_qualitites.png')
-            plt.clf()
-
         return qual_choice
 
 
 
-robust_MPC = Robust_MPC()
+# the solver of a new session under the current settings
+def get_solver():
+    solver = MPC_SOLVER or ('table' if decision_table else 'exhaustive')
+    assert solver in ('exhaustive', 'dp', 'table'), f'Unknown MPC solver {solver}'
+    assert solver != 'table' or decision_table, "The 'table' solver needs a FASTMPC_TABLE"
+    return solver
+
+def new_robust_MPC():
+    mpc = Robust_MPC(get_solver(), MPC_LOOKAHEAD, cache=decision_cache if DECISION_CACHE_SIZE else None,
+                     table=decision_table)
+    mpc.track_dp_gap = TRACK_DP_GAP
+    return mpc
+
+robust_MPC = new_robust_MPC()
 print_dbg(robust_MPC)
 
+def reset():
+    """
+    Called by the simulator before every session after the first, in place of reloading this module. Restores the
+    per-session state that importing the module sets up and picks up a changed FASTMPC_TABLE or MPC_* environment
+    variable. Settings assigned from Python are kept while the environment stays the same. The path matrices and
+    the decision cache carry over, as they do across reloads.
+    """
+    global FASTMPC_TABLE, decision_table, robust_MPC
+    if os.environ.get('FASTMPC_TABLE') != FASTMPC_TABLE:
+        FASTMPC_TABLE  = os.environ.get('FASTMPC_TABLE')
+        decision_table = DecisionTable.load(FASTMPC_TABLE) if FASTMPC_TABLE else None
+    refresh_settings()
+    decision_cache.resize(DECISION_CACHE_SIZE)
+    robust_MPC = new_robust_MPC()
+    print_dbg(robust_MPC)
+
+def cache_key():
+    """
+    Called by tester.py --cache. Besides this file, the decisions depend on the solver settings and the FastMPC
+    table in use, so the cached results of each solver and each table are kept apart. With the decision cache on,
+    they also depend on the sessions that ran before in the same process, so the results are not cached at all.
+    """
+    refresh_settings()
+    if DECISION_CACHE_SIZE:
+        return None
+    key = f'solver={get_solver()} lookahead={MPC_LOOKAHEAD} track_dp_gap={TRACK_DP_GAP}'
+    table = os.environ.get('FASTMPC_TABLE')
+    if not table:
+        return key
+    import hashlib
+    with open(table, 'rb') as f:
+        return f'{key} table={hashlib.sha256(f.read()).hexdigest()}'
+
+def session_summary():
+    """
+    Called by the simulator after every session, which prints the returned report. Covers the DP gap with
+    --track-dp-gap and the decision cache counters with --decision-cache.
+    """
+    lines = []
+    if robust_MPC.track_dp_gap:      lines.append(robust_MPC.dp_gap_report())
+    if robust_MPC.cache is not None: lines.append(robust_MPC.cache.stats())
+    return '\n'.join(lines)
+
 def student_entrypoint(client_message: ClientMessage):
     """
     Your mission, if you choose to accept it, is to build an algorithm for chunk bitrate selection that provides
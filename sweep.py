@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+import itertools
+import sys
+import time
+from typing import Sequence, Tuple
+import numpy as np
+import simulator
+from Classes import Recorder
+
+# Message fields holding the QoE coefficients. A policy that never reads them makes the same decisions for every
+# coefficient triple, so one session scores the whole grid. __dict__ counts as a read because it exposes all of them.
+COEFFICIENT_FIELDS = ('quality_coefficient', 'rebuffering_coefficient', 'variation_coefficient')
+PROBED_FIELDS = frozenset(COEFFICIENT_FIELDS + ('__dict__',))
+
+
+class CoefficientProbe(Recorder.Recorder):
+    """
+    Finds out whether a student reads the QoE coefficients during a session. Once the student is loaded, its
+    ClientMessage is swapped for a subclass that notes every read of a coefficient field. restore() puts the
+    original class back.
+    """
+    def __init__(self):
+        self.reads = set()
+        self.chunks = 0
+        self.student = None
+        self.message_class = None
+
+    def session_start(self, config_file: str, student_algo: str):
+        reads = self.reads
+        self.student = sys.modules[f'student.student{student_algo}']
+        self.message_class = self.student.ClientMessage
+
+        class ProbedMessage(self.message_class):
+            def __getattribute__(self, name):
+                if name in PROBED_FIELDS:
+                    reads.add(name)
+                return super().__getattribute__(name)
+
+        self.student.ClientMessage = ProbedMessage
+
+    def chunk(self, chunknum: int, quality: int, bitrate: float, download_time: float, rebuffer_time: float,
+              buffer_seconds: float, time: float):
+        self.chunks += 1
+
+    def restore(self):
+        """ Puts the student's own ClientMessage back """
+        if self.student is not None:
+            self.student.ClientMessage = self.message_class
+            self.student = None
+
+
+def coefficient_grid(quality_coefficients: Sequence[float], rebuffering_coefficients: Sequence[float],
+                     variation_coefficients: Sequence[float]) -> np.ndarray:
+    """
+    Builds every combination of the given coefficients
+    :return: np.ndarray of (quality, rebuffering, variation) coefficient triples, one per row
+    """
+    return np.array(list(itertools.product(quality_coefficients, rebuffering_coefficients, variation_coefficients)),
+                    dtype=np.float64).reshape(-1, 3)
+
+
+def rescore(totals: Tuple[float, float, float], chunks: int, grid: np.ndarray) -> np.ndarray:
+    """
+    Scores one session for every coefficient triple at once, with the same arithmetic as
+    Scorecard.get_qual_rebuff_var_qoe, so the QoE matches a re-run exactly
+    Args:
+        totals : Total quality, total variation and rebuffer time of the session
+        chunks : Number of chunks in the session
+        grid : Coefficient triples, one per row
+    :return: np.ndarray with the total quality, total variation, rebuffer time, and user QoE for every triple
+    """
+    total_quality, variation, rebuff_time = totals
+    results = np.empty((len(grid), 4), dtype=np.float64)
+    results[:, :3] = totals
+    results[:, 3] = grid[:, 0] * total_quality - grid[:, 1] * rebuff_time - grid[:, 2] * variation
+    results[:, 3] /= chunks
+    return results
+
+
+def sweep(config_file: str, student_algo, grid: np.ndarray, trace_file: str = None,
+          jobs: int = 1) -> Tuple[np.ndarray, bool]:
+    """
+    Runs a student algorithm on one test for every coefficient triple in grid. The first triple is simulated while
+    watching whether the student reads the coefficients. If it does not, its decisions are the same for every
+    triple and the rest of the grid is re-scored from that session. Otherwise every triple gets its own session.
+    Args:
+        config_file : Path to the test file
+        student_algo : Student algorithm to run
+        grid : Coefficient triples, one per row, as from coefficient_grid
+        trace_file : Optional NetworkTrace file to use in place of the test's [throughput] section
+        jobs : Number of worker processes for re-running sessions
+    :return: Tuple of an np.ndarray with the total quality, total variation, rebuffer time, and user QoE for every
+        triple, and whether the sessions had to be re-run
+    """
+    grid = np.asarray(grid, dtype=np.float64).reshape(-1, 3)
+    assert len(grid), 'The coefficient grid is empty!'
+
+    probe = CoefficientProbe()
+    try:
+        first = simulator.main(config_file, student_algo, False, False, trace_file, recorder=probe,
+                               coefficients=tuple(grid[0].tolist()))
+    finally:
+        probe.restore()
+    if not probe.reads:
+        return rescore(first[:3], probe.chunks, grid), False
+
+    triples = [tuple(coefficients) for coefficients in grid[1:].tolist()]
+    if jobs > 1 and triples:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(simulator.main, config_file, student_algo, False, False, trace_file,
+                                   coefficients=coefficients) for coefficients in triples]
+            rest = [future.result() for future in futures]
+    else:
+        rest = [simulator.main(config_file, student_algo, False, False, trace_file, coefficients=coefficients)
+                for coefficients in triples]
+    return np.array([first] + rest, dtype=np.float64), True
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 3, \
+        f'Proper usage: python3 {sys.argv[0]} [config_file] [student_algo] [--quality c1,c2,...]' \
+        f' [--rebuffering c1,c2,...] [--variation c1,c2,...] [--trace trace_file] [--jobs N]'
+    test = simulator.load_test(sys.argv[1])
+    axes = []
+    for flag, field in zip(('--quality', '--rebuffering', '--variation'), COEFFICIENT_FIELDS):
+        if flag in sys.argv:
+            axes.append([float(c) for c in sys.argv[sys.argv.index(flag) + 1].split(',')])
+        else:
+            axes.append([float(test[field])])
+    trace_file = sys.argv[sys.argv.index('--trace') + 1] if '--trace' in sys.argv else None
+    jobs = int(sys.argv[sys.argv.index('--jobs') + 1]) if '--jobs' in sys.argv else 1
+
+    coefficients = coefficient_grid(*axes)
+    start = time.perf_counter()
+    results, reran = sweep(sys.argv[1], sys.argv[2], coefficients, trace_file, jobs)
+    elapsed = time.perf_counter() - start
+
+    print('=' * 120)
+    print(f'{"Quality coef":>14}{"Rebuffer coef":>15}{"Variation coef":>16}'
+          f'{"Quality":>12}{"Variation":>12}{"Rebuffer":>12}{"QoE":>12}')
+    for (quality_coef, rebuffer_coef, variation_coef), (quality, variation, rebuffer, qoe) in \
+            zip(coefficients.tolist(), results.tolist()):
+        print(f'{quality_coef:>14.2f}{rebuffer_coef:>15.2f}{variation_coef:>16.2f}'
+              f'{quality:>12.0f}{variation:>12.0f}{rebuffer:>12.2f}{qoe:>12.3f}')
+    print('=' * 120)
+    how = f'ran {len(coefficients)} sessions, the student reads the coefficients' if reran else \
+        'ran 1 session and re-scored it, the student does not read the coefficients'
+    print(f'Swept {len(coefficients)} coefficient triples in {elapsed:.2f} seconds: {how}.')
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import os
+import sys
+from typing import Dict, Tuple
+import numpy as np
+import simulator
+
+# Synthetic test cases in the style of tests/*.ini, of any length and deterministic from a seed.
+#
+# Bandwidth follows a Markov chain over `states` evenly spaced levels up to the peak bandwidth, like the hand made
+# tests whose throughputs are multiples of peak / 9. Each step jumps by a heavy-tailed (Student t) number of levels
+# with a pull back towards the center level, and dwells in the new level for a Pareto distributed time. Outages
+# optionally cut the bandwidth off for exponentially distributed periods.
+#
+# lo/mi/hi avg sets the peak bandwidth and lo/mi/hi var sets how often and how far the bandwidth moves, matching
+# the statistics of the corresponding tests/*.ini files.
+AVG_PRESETS = {'lo': 2.1, 'mi': 3.0, 'hi': 4.5}  # peak bandwidth in Mbps
+VAR_PRESETS = {                                    # mean seconds between changes, jump size in levels
+    'lo': {'mean_dwell': 10.0, 'jump_scale': 1.0},
+    'mi': {'mean_dwell': 8.0, 'jump_scale': 1.5},
+    'hi': {'mean_dwell': 4.0, 'jump_scale': 2.0},
+}
+
+# Chunk size ratios come in scenes of similar ratio, on the same 0.2 grid between 0.2 and 1.8 as the tests
+RATIO_STEP = 0.2
+RATIO_RANGE = (0.2, 1.8)
+
+# The trace draws its random numbers this many bandwidth changes at a time. The block size must not depend on the
+# duration, so that a longer trace from the same seed starts with the shorter one.
+TRACE_BLOCK_SIZE = 256
+
+
+def generate_trace(duration: float, peak_bandwidth: float, mean_dwell: float, jump_scale: float,
+                   rng: np.random.Generator, states: int = 9, center: float = 0.7, reversion: float = 0.3,
+                   tail_index: float = 2.5, outage_rate: float = 0.0, outage_length: float = 3.0,
+                   outage_bandwidth: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Generates a Markov chain bandwidth trace
+    Args:
+        duration : Seconds of trace to generate. The last segment lasts forever in NetworkTrace anyway.
+        peak_bandwidth : Bandwidth of the highest state in Mbps
+        mean_dwell : Mean seconds spent in a state before moving
+        jump_scale : Scale of the jump between states, in states
+        rng : Random generator
+        states : Number of bandwidth states, evenly spaced from peak / states to peak
+        center : Fraction of the peak the chain is pulled back towards
+        reversion : Fraction of the distance to the center state closed on every move
+        tail_index : Heavy tail index of the dwell times (Pareto) and jumps (Student t), lower is heavier
+        outage_rate : Probability that a move goes into an outage instead of a new state
+        outage_length : Mean seconds an outage lasts
+        outage_bandwidth : Bandwidth during outages in Mbps
+    :return: Tuple of segment start times (whole seconds) and bandwidths in Mbps
+    """
+    # Pareto dwell times with the given mean, rounded to whole seconds like the hand made tests
+    dwell_min = mean_dwell * (tail_index - 1) / tail_index
+
+    times, bandwidths = [], []
+    time, state = 0.0, int(round(center * states))
+    while time < duration:
+        dwell = np.maximum(np.rint(dwell_min * (rng.pareto(tail_index, TRACE_BLOCK_SIZE) + 1)), 1).tolist()
+        jumps = (rng.standard_t(tail_index, TRACE_BLOCK_SIZE) * jump_scale).tolist()
+        outages = (rng.random(TRACE_BLOCK_SIZE) < outage_rate).tolist()
+        outage_dwell = np.maximum(np.rint(rng.exponential(outage_length, TRACE_BLOCK_SIZE)), 1).tolist()
+        for i in range(TRACE_BLOCK_SIZE):
+            if outages[i] and bandwidths:
+                times.append(time)
+                bandwidths.append(outage_bandwidth)
+                time += outage_dwell[i]
+            times.append(time)
+            bandwidths.append(state * peak_bandwidth / states)
+            time += dwell[i]
+            if time >= duration:
+                break
+
+            move = reversion * (center * states - state) + jumps[i]
+            state = min(max(state + int(round(move)), 1), states)
+
+    return np.array(times, dtype=np.float64), np.round(np.array(bandwidths, dtype=np.float64), 4)
+
+
+def generate_chunk_ratios(chunks: int, scene_rng: np.random.Generator, ratio_rng: np.random.Generator,
+                          mean_scene: float = 4.0, spread: float = 0.45) -> np.ndarray:
+    """
+    Generates chunk size ratios in scenes of equal ratio. Scene lengths and ratios come from separate generators, so
+    a longer video from the same generators starts with the shorter one.
+    Args:
+        chunks : Number of chunks
+        scene_rng : Random generator of the scene lengths
+        ratio_rng : Random generator of the scene ratios
+        mean_scene : Mean number of chunks in a scene
+        spread : Standard deviation of the scene ratios around 1
+    :return: np.ndarray Chunk size ratio of every chunk
+    """
+    scenes = scene_rng.geometric(1 / mean_scene, chunks)
+    scene_starts = np.cumsum(scenes)
+    scene_starts = scene_starts[:int(np.searchsorted(scene_starts, chunks)) + 1]
+    ratios = np.clip(np.rint(ratio_rng.normal(1, spread, len(scene_starts)) / RATIO_STEP) * RATIO_STEP, *RATIO_RANGE)
+    scene_of_chunk = np.searchsorted(scene_starts, np.arange(chunks), side='right')
+    return np.round(ratios[scene_of_chunk], 1)
+
+
+def generate_test(chunks: int, avg: str = 'mi', var: str = 'mi', seed: int = 0, quality_levels: int = 3,
+                  chunk_length: float = 1.0, base_chunk_size: float = 1.0, client_buffer_size: float = 30.0,
+                  coefficients: Tuple[float, float, float] = (2.0, 8.0, 1.0), outage_rate: float = 0.0,
+                  outage_length: float = 3.0) -> Dict:
+    """
+    Generates a test case. The trace and the chunk sizes come from separate streams of the seed, and none of them
+    depends on the number of chunks, so a longer test from the same seed starts with the shorter one.
+    Args:
+        chunks : Number of chunks in the video
+        avg : Average bandwidth preset, 'lo', 'mi' or 'hi'
+        var : Bandwidth variance preset, 'lo', 'mi' or 'hi'
+        seed : Random seed
+        quality_levels : Number of quality levels
+        chunk_length : Seconds of video per chunk
+        base_chunk_size : Mb of a chunk with ratio 1 at the lowest quality
+        client_buffer_size : Max seconds of video stored by the client
+        coefficients : Quality, rebuffering and variation coefficients
+        outage_rate : Probability that a bandwidth change is an outage instead
+        outage_length : Mean seconds an outage lasts
+    :return: Dict of test parameters as returned by simulator.parse_test
+    """
+    trace_rng, scene_rng, ratio_rng = (np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(3))
+    times, bandwidths = generate_trace(chunks * chunk_length, AVG_PRESETS[avg], rng=trace_rng,
+                                       outage_rate=outage_rate, outage_length=outage_length, **VAR_PRESETS[var])
+    ratios = generate_chunk_ratios(chunks, scene_rng, ratio_rng)
+    quality_coefficient, rebuffering_coefficient, variation_coefficient = coefficients
+    return {
+        'chunk_length': float(chunk_length),
+        'base_chunk_cost': float(base_chunk_size),
+        'client_buffer_size': float(client_buffer_size),
+        'quality_levels': quality_levels,
+        'quality_coefficient': float(quality_coefficient),
+        'rebuffering_coefficient': float(rebuffering_coefficient),
+        'variation_coefficient': float(variation_coefficient),
+        'throughput_times': times,
+        'throughput_values': bandwidths,
+        'chunk_qualities': ratios[:, None] * (2.0 ** np.arange(quality_levels) * base_chunk_size)[None, :],
+    }
+
+
+def write_ini(test: Dict, path: str):
+    """
+    Writes a test case as a .ini file in the layout of tests/*.ini
+    Args:
+        test : Dict of test parameters as returned by generate_test or simulator.parse_test
+        path : .ini file to write
+    """
+    ratios = test['chunk_qualities'][:, 0] / test['base_chunk_cost']
+    with open(path, 'w') as f:
+        f.write(f'# Synthetic test case written by {os.path.basename(__file__)}\n\n'
+                f'[video]\n'
+                f'chunk_length=        {test["chunk_length"]!r}        # Seconds per chunk\n'
+                f'base_chunk_size=     {test["base_chunk_cost"]!r}        # Mb for quality level 1\n'
+                f'client_buffer_size=  {test["client_buffer_size"]!r}       # max seconds of video stored by client\n\n'
+                f'[quality]\n'
+                f'quality_levels=                 {test["quality_levels"]}\n'
+                f'quality_coefficient=            {test["quality_coefficient"]!r}\n'
+                f'variation_coefficient=          {test["variation_coefficient"]!r}\n'
+                f'rebuffering_coefficient=        {test["rebuffering_coefficient"]!r}\n\n'
+                f'[throughput]\n'
+                f'# {len(test["throughput_times"])} different values.\n')
+        for time, bandwidth in zip(test['throughput_times'].tolist(), test['throughput_values'].tolist()):
+            f.write(f'{time!r} = {bandwidth!r}\n')
+        f.write(f'\n[chunk_size_ratios]\n'
+                f'chunk_size_ratios=\n'
+                f'# {len(ratios)} chunks.\n')
+        for ratio in ratios.tolist():
+            f.write(f'    {ratio!r},\n')
+        f.write('# Chunk Size Ratios End\n')
+
+
+def write_test(test: Dict, path: str):
+    """ Writes a test case as .ini, or in the compiled format if path ends with simulator.COMPILED_TEST_EXTENSION """
+    if path.endswith(simulator.COMPILED_TEST_EXTENSION):
+        simulator.write_compiled_test(test, path)
+    else:
+        write_ini(test, path)
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 5 and sys.argv[1] in AVG_PRESETS and sys.argv[2] in VAR_PRESETS, \
+        f'Proper usage: python3 {sys.argv[0]} [lo|mi|hi avg] [lo|mi|hi var] [chunks] [output .ini or ' \
+        f'{simulator.COMPILED_TEST_EXTENSION}] [--seed N] [--levels N] [--outages rate]'
+    options = {}
+    if '--seed' in sys.argv:
+        options['seed'] = int(sys.argv[sys.argv.index('--seed') + 1])
+    if '--levels' in sys.argv:
+        options['quality_levels'] = int(sys.argv[sys.argv.index('--levels') + 1])
+    if '--outages' in sys.argv:
+        options['outage_rate'] = float(sys.argv[sys.argv.index('--outages') + 1])
+
+    generated = generate_test(int(sys.argv[3]), sys.argv[1], sys.argv[2], **options)
+    write_test(generated, sys.argv[4])
+    print(f'Wrote {len(generated["chunk_qualities"])} chunks and {len(generated["throughput_times"])} throughputs'
+          f' to {sys.argv[4]}.')
@@ -0,0 +1,11 @@
+import pytest
+import batch_simulator
+import simulator
+from conftest import STUDENT_ALGOS, TEST_FILES
+
+
+@pytest.mark.parametrize('student_algo', STUDENT_ALGOS)
+def test_batch_simulator_matches_simulator(student_algo):
+    expected = [simulator.main(config_file, student_algo, False, False) for config_file in TEST_FILES]
+    got = batch_simulator.main(TEST_FILES, student_algo)
+    assert [tuple(map(float, results)) for results in got] == [tuple(map(float, results)) for results in expected]
@@ -0,0 +1,19 @@
+import pytest
+import synthetic
+from benchmarks import suites
+
+
+def test_filter_skips_building_other_benchmarks(tmp_path, monkeypatch):
+    def write_test(*args):
+        raise AssertionError('session test files are only written for selected sessions')
+    monkeypatch.setattr(synthetic, 'write_test', write_test)
+    monkeypatch.setattr(suites, 'synthetic_test', lambda *args: pytest.fail('built a filtered out benchmark'))
+
+    names = [name for name, *_ in suites.all_benchmarks(False, str(tmp_path), 'sim_buffer')]
+    assert names == [suites.benchmark_name('sim_buffer.session', {'chunks': chunks}) for chunks in (100, 1000, 10_000)]
+
+
+def test_filter_builds_only_the_selected_sessions(tmp_path):
+    names = [name for name, *_ in suites.all_benchmarks(True, str(tmp_path), 'session[algo=1,chunks=100,')]
+    assert names == ['session[algo=1,chunks=100,quality_levels=3]', 'session[algo=1,chunks=100,quality_levels=5]']
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['session_100_3.abrtest', 'session_100_5.abrtest']
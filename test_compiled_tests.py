@@ -0,0 +1,62 @@
+import os
+import shutil
+import numpy as np
+import pytest
+import simulator
+from conftest import TEST_FILES
+
+
+@pytest.fixture
+def cache_directory(tmp_path, monkeypatch):
+    """ Keeps the compiled cache entries of a test out of the repository's .test_cache """
+    directory = tmp_path / 'cache'
+    monkeypatch.setattr(simulator, 'COMPILED_TEST_DIRECTORY', str(directory))
+    return directory
+
+
+def assert_same_test(test, expected):
+    assert test.keys() == expected.keys()
+    for field, value in expected.items():
+        np.testing.assert_array_equal(test[field], value, err_msg=field)
+
+
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_compiled_test_roundtrip(config_file, tmp_path, cache_directory):
+    path = str(tmp_path / f'test{simulator.COMPILED_TEST_EXTENSION}')
+    compiled = simulator.compile_test(config_file, path)
+    assert_same_test(compiled, simulator.parse_test(config_file))
+
+    test, mtime_ns, size, sha256 = simulator.read_compiled_test(path)
+    assert_same_test(test, compiled)
+    assert (mtime_ns, size) == (os.stat(config_file).st_mtime_ns, os.stat(config_file).st_size)
+    assert simulator.main(path, '1', False, False) == simulator.main(config_file, '1', False, False)
+
+
+def test_cache_is_rebuilt_when_the_ini_changes(tmp_path, cache_directory, monkeypatch):
+    config_file = str(tmp_path / 'test.ini')
+    shutil.copy(TEST_FILES[0], config_file)
+    first = simulator.load_test(config_file)
+    assert os.path.exists(simulator.compiled_test_path(config_file))
+
+    # An unchanged .ini is loaded from its cache entry, also once its mtime moved
+    parse_test = simulator.parse_test
+    monkeypatch.setattr(simulator, 'parse_test', lambda path: pytest.fail(f'{path} was parsed again'))
+    assert_same_test(simulator.load_test(config_file), first)
+    os.utime(config_file, ns=(0, 0))
+    assert_same_test(simulator.load_test(config_file), first)
+
+    monkeypatch.setattr(simulator, 'parse_test', parse_test)
+    with open(config_file) as f:
+        text = f.read()
+    with open(config_file, 'w') as f:
+        f.write(text.replace('quality_coefficient=', 'quality_coefficient= 7 #', 1))
+    changed = simulator.load_test(config_file)
+    assert changed['quality_coefficient'] == 7
+    assert simulator.read_compiled_test(simulator.compiled_test_path(config_file))[0]['quality_coefficient'] == 7
+
+
+def test_read_compiled_test_rejects_other_files(tmp_path):
+    path = tmp_path / f'test{simulator.COMPILED_TEST_EXTENSION}'
+    path.write_bytes(b'\0' * simulator.COMPILED_TEST_HEADER.size)
+    with pytest.raises(ValueError):
+        simulator.read_compiled_test(str(path))
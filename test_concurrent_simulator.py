@@ -0,0 +1,33 @@
+import pytest
+import concurrent_simulator
+import simulator
+from conftest import STUDENT_ALGOS, TEST_FILES
+
+
+@pytest.mark.parametrize('student_algo', STUDENT_ALGOS)
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_one_request_in_flight_matches_simulator(config_file, student_algo):
+    expected = simulator.main(config_file, student_algo, False, False)
+    results, _ = concurrent_simulator.main(config_file, student_algo, False, False)
+    assert results == expected
+
+
+@pytest.mark.parametrize('max_in_flight', [2, 3])
+def test_student_sees_the_requests_in_flight(monkeypatch, max_in_flight):
+    student = simulator.load_student('1')
+    entrypoint = student.student_entrypoint
+    seen = []
+    def spy(message):
+        seen.append(list(message.in_flight_downloads))
+        return entrypoint(message)
+    monkeypatch.setattr(student, 'student_entrypoint', spy)
+
+    concurrent_simulator.main(TEST_FILES[0], '1', False, False, max_in_flight=max_in_flight)
+    assert max(len(downloads) for downloads in seen) == max_in_flight - 1
+    for chunknum, downloads in enumerate(seen):
+        # oldest first, all sent before this one
+        chunknums = [download.chunknum for download in downloads]
+        assert chunknums == sorted(set(chunknums)) and all(c < chunknum for c in chunknums)
+        for download in downloads:
+            assert 0 <= download.remaining <= download.size
+            assert download.seconds_elapsed >= 0
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+import multiclient_simulator
+import simulator
+from conftest import STUDENT_ALGOS, TEST_FILES
+
+
+@pytest.mark.parametrize('student_algo', STUDENT_ALGOS)
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_one_client_matches_simulator(config_file, student_algo):
+    expected = simulator.main(config_file, student_algo, False, False)
+    (results, _), = multiclient_simulator.main([config_file], [student_algo])[0]
+    # Same decisions, the event times of the shared link are summed in a different order
+    assert results[:2] == expected[:2]
+    assert results[2:] == pytest.approx(expected[2:], rel=1e-9, abs=1e-9)
+
+
+def test_allocations():
+    caps = np.array([1.0, np.inf, 4.0])
+    flows = np.array([0, 1, 1, 2])
+    # fair share: a quarter of the link per download, within each client's cap
+    np.testing.assert_allclose(multiclient_simulator.fair_share_rates(8.0, flows, caps), [1, 2, 2, 2])
+    # max-min: client 0 takes its 1 Mbps cap, clients 1 and 2 split the other 7 evenly
+    np.testing.assert_allclose(multiclient_simulator.max_min_rates(8.0, flows, caps), [1, 1.75, 1.75, 3.5])
+    np.testing.assert_allclose(multiclient_simulator.max_min_rates(20.0, flows, caps), [1, 7.5, 7.5, 4])
+
+
+def test_jain_index():
+    assert multiclient_simulator.jain_index([2.0, 2.0, 2.0]) == 1
+    assert multiclient_simulator.jain_index([3.0, 0.0, 0.0]) == pytest.approx(1 / 3)
+
+
+@pytest.mark.parametrize('allocation', multiclient_simulator.ALLOCATIONS)
+def test_identical_clients_get_identical_sessions(allocation):
+    sessions, link_stats = multiclient_simulator.main([TEST_FILES[0]] * 3, ['1'] * 3, allocation)
+    assert sessions[0] == sessions[1] == sessions[2]
+    assert link_stats['bitrate_fairness'] == pytest.approx(1)
@@ -0,0 +1,103 @@
+import math
+import numpy as np
+import pytest
+import simulator
+from Classes import NetworkTrace
+from conftest import TEST_FILES
+
+
+def reference_segment(bwlist, time: float):
+    """ The original NetworkTrace.get_current_timesegment, scanning the whole trace """
+    return min(bwlist, key=lambda x: abs(x[0] - time) if time > x[0] else math.inf)
+
+
+def reference_download_time(bwlist, time: float, size: float) -> float:
+    """ The original NetworkTrace.simulate_download_from_time, walking the trace one segment at a time """
+    segment = max([i for i, (start, _) in enumerate(bwlist) if start < time], default=0)
+    cum_time = 0
+    while True:
+        start, bandwidth = bwlist[segment]
+        if segment + 1 == len(bwlist):
+            return cum_time + size / bandwidth
+        down_time = bwlist[segment + 1][0] - time
+        cum_time += down_time
+        size -= down_time * bandwidth
+        if size <= 0:
+            return cum_time + size / bandwidth
+        segment += 1
+        time = bwlist[segment][0]
+
+
+def random_downloads(trace: NetworkTrace.NetworkTrace, count: int = 500):
+    """ Download start times spread over the trace and past its end, and sizes from small to several segments """
+    rng = np.random.default_rng(len(trace.start_times))
+    times = rng.uniform(0, float(trace.start_times[-1]) + 10, count)
+    times[:len(trace.start_times)] = trace.start_times[:count]   # exactly on segment boundaries too
+    return times, rng.uniform(.05, 30, count)
+
+
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_segment_lookup_matches_scan(config_file):
+    trace = simulator.read_test(config_file, False)[0]
+    times, _ = random_downloads(trace)
+    for time in [0.0] + times.tolist():
+        assert tuple(trace.get_current_timesegment(time)) == reference_segment(trace.bwlist, time)
+
+
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_download_time_matches_segment_walk(config_file):
+    trace = simulator.read_test(config_file, False)[0]
+    times, sizes = random_downloads(trace)
+    expected = [reference_download_time(trace.bwlist, time, size) for time, size in zip(times.tolist(), sizes.tolist())]
+    got = [trace.simulate_download_from_time(time, size) for time, size in zip(times.tolist(), sizes.tolist())]
+    assert got == expected
+
+
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_batched_downloads_match_scalar(config_file):
+    trace = simulator.read_test(config_file, False)[0]
+    times, sizes = random_downloads(trace)
+    expected = [trace.simulate_download_from_time(time, size) for time, size in zip(times.tolist(), sizes.tolist())]
+    np.testing.assert_array_equal(trace.simulate_downloads(times, sizes), expected)
+
+
+def test_trace_batch_matches_scalar():
+    traces = [simulator.read_test(config_file, False)[0] for config_file in TEST_FILES]
+    batch = NetworkTrace.NetworkTraceBatch(traces)
+    rng = np.random.default_rng(0)
+    rows = rng.integers(0, len(traces), 2000)
+    times = np.array([rng.uniform(0, float(traces[row].start_times[-1]) + 10) for row in rows])
+    sizes = rng.uniform(.05, 30, len(rows))
+    expected = [traces[row].simulate_download_from_time(time, size)
+                for row, time, size in zip(rows.tolist(), times.tolist(), sizes.tolist())]
+    np.testing.assert_array_equal(batch.simulate_downloads(rows, times, sizes), expected)
+
+
+@pytest.mark.parametrize('block_size', [1 << 20, 7])
+def test_trace_file_roundtrip(tmp_path, block_size):
+    trace = simulator.read_test(TEST_FILES[0], False)[0]
+    path = str(tmp_path / 'trace.abrtrace')
+    NetworkTrace.NetworkTrace.write_file(path, trace.start_times, trace.bandwidths, block_size=block_size)
+
+    mapped = NetworkTrace.NetworkTrace.from_file(path)
+    np.testing.assert_array_equal(mapped.start_times, trace.start_times)
+    np.testing.assert_array_equal(mapped.bandwidths, trace.bandwidths)
+    np.testing.assert_allclose(mapped.cumulative_mb, trace.cumulative_mb, rtol=1e-12)
+    times, sizes = random_downloads(trace)
+    np.testing.assert_array_equal(mapped.simulate_downloads(times, sizes), trace.simulate_downloads(times, sizes))
+
+
+def test_from_file_rejects_other_files(tmp_path):
+    path = tmp_path / 'not_a_trace'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        NetworkTrace.NetworkTrace.from_file(str(path))
+
+
+@pytest.mark.parametrize('student_algo', ['1', '2'])
+def test_session_on_trace_file_matches_ini_trace(tmp_path, student_algo):
+    trace = simulator.read_test(TEST_FILES[0], False)[0]
+    path = str(tmp_path / 'trace.abrtrace')
+    NetworkTrace.NetworkTrace.write_file(path, trace.start_times, trace.bandwidths)
+    expected = simulator.main(TEST_FILES[0], student_algo, False, False)
+    assert simulator.main(TEST_FILES[0], student_algo, False, False, path) == expected
@@ -0,0 +1,140 @@
+import os
+import shutil
+import sys
+import types
+import pytest
+import tester
+from Classes import ResultCache
+from Classes.Recorder import SessionRecord
+from conftest import REPO_DIRECTORY, TEST_FILES
+
+STUDENT_ALGO = 'cachetest'
+
+
+@pytest.fixture
+def repo_copy(tmp_path, monkeypatch):
+    """ Copies of the simulator sources and a student module that the tests may edit """
+    for source in ResultCache.SIMULATOR_SOURCES:
+        os.makedirs(tmp_path / os.path.dirname(source), exist_ok=True)
+        shutil.copy(os.path.join(REPO_DIRECTORY, source), tmp_path / source)
+    monkeypatch.setattr(ResultCache, 'REPO_DIRECTORY', str(tmp_path))
+
+    student = types.ModuleType(f'student.student{STUDENT_ALGO}')
+    student.__file__ = str(tmp_path / f'student{STUDENT_ALGO}.py')
+    with open(student.__file__, 'w') as f:
+        f.write('# student\n')
+    monkeypatch.setitem(sys.modules, student.__name__, student)
+    return tmp_path
+
+
+def make_record() -> SessionRecord:
+    record = SessionRecord(TEST_FILES[0], STUDENT_ALGO)
+    record.qualities = [0, 2, 1]
+    record.bitrates = [1.0, 4.0, 2.0]
+    record.download_times = [.5, 1.25, .75]
+    record.rebuffer_times = [.5, 0.0, 0.0]
+    record.buffer_seconds = [1.0, 0.75, 1.0]
+    record.times = [.5, 1.75, 2.5]
+    record.results = (3, 3, .5, -1.0)
+    record.student_summary = 'decision cache: 1 hits'
+    return record
+
+
+def append(path, text: str = '# edited\n'):
+    with open(path, 'a') as f:
+        f.write(text)
+
+
+def test_cached_session_is_returned(repo_copy):
+    path = str(repo_copy / 'cache.sqlite')
+    record = make_record()
+    ResultCache.ResultCache(path).put(record)
+
+    cache = ResultCache.ResultCache(path)
+    cached = cache.get(TEST_FILES[0], STUDENT_ALGO)
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert vars(cached) == vars(record)
+
+
+def test_cache_files_from_before_student_summaries_are_upgraded(repo_copy):
+    import sqlite3
+    path = str(repo_copy / 'cache.sqlite')
+    with sqlite3.connect(path) as connection:
+        connection.execute('CREATE TABLE sessions (key TEXT PRIMARY KEY, config_file TEXT, student_algo TEXT, '
+                           'total_quality INTEGER, total_variation INTEGER, rebuffer_time REAL, qoe REAL, logs BLOB)')
+    record = make_record()
+    ResultCache.ResultCache(path).put(record)
+    assert vars(ResultCache.ResultCache(path).get(TEST_FILES[0], STUDENT_ALGO)) == vars(record)
+
+
+def test_missing_session(repo_copy):
+    cache = ResultCache.ResultCache(str(repo_copy / 'cache.sqlite'))
+    assert cache.get(TEST_FILES[0], STUDENT_ALGO) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_editing_the_student_invalidates(repo_copy):
+    path = str(repo_copy / 'cache.sqlite')
+    ResultCache.ResultCache(path).put(make_record())
+    append(sys.modules[f'student.student{STUDENT_ALGO}'].__file__)
+    assert ResultCache.ResultCache(path).get(TEST_FILES[0], STUDENT_ALGO) is None
+
+
+def test_changing_the_student_cache_key_invalidates(repo_copy):
+    path = str(repo_copy / 'cache.sqlite')
+    student = sys.modules[f'student.student{STUDENT_ALGO}']
+    student.cache_key = lambda: 'solver=a'
+    ResultCache.ResultCache(path).put(make_record())
+    assert ResultCache.ResultCache(path).get(TEST_FILES[0], STUDENT_ALGO) is not None
+    student.cache_key = lambda: 'solver=b'
+    assert ResultCache.ResultCache(path).get(TEST_FILES[0], STUDENT_ALGO) is None
+
+
+@pytest.mark.parametrize('source', ResultCache.SIMULATOR_SOURCES)
+def test_editing_a_simulator_source_invalidates(repo_copy, source):
+    path = str(repo_copy / 'cache.sqlite')
+    ResultCache.ResultCache(path).put(make_record())
+    append(repo_copy / source)
+    assert ResultCache.ResultCache(path).get(TEST_FILES[0], STUDENT_ALGO) is None
+
+
+def test_editing_the_test_invalidates(repo_copy):
+    config_file = str(repo_copy / 'test.ini')
+    shutil.copy(TEST_FILES[0], config_file)
+    record = make_record()
+    record.config_file = config_file
+    path = str(repo_copy / 'cache.sqlite')
+    ResultCache.ResultCache(path).put(record)
+    append(config_file)
+    assert ResultCache.ResultCache(path).get(config_file, STUDENT_ALGO) is None
+
+
+def test_tester_takes_sessions_from_the_cache(tmp_path):
+    test = os.path.basename(TEST_FILES[0])
+    expected = tester.run_test(test, '1')
+    cache = ResultCache.ResultCache(str(tmp_path / 'cache.sqlite'))
+    assert tester.run_test(test, '1', cache=cache) == expected
+    assert tester.run_test(test, '1', cache=cache) == expected
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_recorder_is_hashed_with_the_simulator():
+    # Sessions are stored from what the DecisionRecorder collected
+    assert 'Classes/Recorder.py' in ResultCache.SIMULATOR_SOURCES
+
+
+def test_sessions_of_order_dependent_students_are_not_cached(repo_copy):
+    sys.modules[f'student.student{STUDENT_ALGO}'].cache_key = lambda: None
+    cache = ResultCache.ResultCache(str(repo_copy / 'cache.sqlite'))
+    cache.put(make_record())
+    assert cache.get(TEST_FILES[0], STUDENT_ALGO) is None
+    assert cache.connection.execute('SELECT COUNT(*) FROM sessions').fetchone()[0] == 0
+
+
+def test_decision_cache_makes_student2_not_cacheable(monkeypatch):
+    from student import student2
+    assert student2.cache_key() is not None
+    with monkeypatch.context() as patch:
+        patch.setenv('MPC_DECISION_CACHE', '1000')
+        assert student2.cache_key() is None
+    assert student2.cache_key() is not None
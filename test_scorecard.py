@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from Classes import Scorecard
+
+
+class ReferenceScorecard:
+    """ The original Scorecard, logging every event as a dict in a list """
+    def __init__(self, quality_coeff: float, rebuffer_coeff: float, switch_coeff: float):
+        self.quality_coeff = quality_coeff
+        self.rebuffer_coeff = rebuffer_coeff
+        self.switch_coeff = switch_coeff
+        self.chunk_info = []
+        self.rebuffers = []
+
+    def log_bitrate_choice(self, time: float, quality: int, bitrate: float):
+        self.chunk_info.append({'arrival time': time, 'quality': quality, 'bitrate': bitrate})
+
+    def log_rebuffer(self, time: float, rebuffer_length: float, chunknum: int):
+        if rebuffer_length > .01:
+            self.rebuffers.append({'time': time, 'rebuffer_length': rebuffer_length, 'chunknum': chunknum})
+
+    def get_qual_rebuff_var_qoe(self):
+        total_quality = sum(c['quality'] for c in self.chunk_info)
+        rebuff_time = sum(r['rebuffer_length'] for r in self.rebuffers)
+        variation = sum(abs(self.chunk_info[i]['quality'] - self.chunk_info[i - 1]['quality'])
+                        for i in range(1, len(self.chunk_info)))
+        qoe = total_quality * self.quality_coeff - rebuff_time * self.rebuffer_coeff - variation * self.switch_coeff
+        qoe /= len(self.chunk_info)
+        return total_quality, variation, rebuff_time, qoe
+
+
+def random_session(chunks: int, seed: int):
+    """ (arrival time, quality, bitrate, rebuffer length) of every chunk of a made up session """
+    rng = np.random.default_rng(seed)
+    times = np.cumsum(rng.uniform(0, 3, chunks))
+    qualities = rng.integers(0, 3, chunks)
+    bitrates = rng.uniform(.5, 4, chunks) * 2.0 ** qualities
+    # no rebuffer, too short to log, and real rebuffers
+    rebuffers = rng.choice([0, .005, .01, .5, 2.5], chunks) * rng.uniform(.5, 1.5, chunks)
+    return list(zip(times.tolist(), qualities.tolist(), bitrates.tolist(), rebuffers.tolist()))
+
+
+def log_session(session, *scorecards):
+    """ Logs a session into every scorecard, yielding after each chunk """
+    for chunknum, (time, quality, bitrate, rebuffer) in enumerate(session):
+        for scorecard in scorecards:
+            scorecard.log_bitrate_choice(time, quality, bitrate)
+            scorecard.log_rebuffer(time - rebuffer, rebuffer, chunknum)
+        yield chunknum
+
+
+@pytest.mark.parametrize('chunks', [1, 5, 300])
+def test_array_scorecard_matches_list_scorecard(chunks):
+    # Preallocating less than the session needs makes the logs grow
+    scorecard = Scorecard.Scorecard(2.0, 8.0, 1.0, 1.0, expected_chunks=4)
+    reference = ReferenceScorecard(2.0, 8.0, 1.0)
+    for _ in log_session(random_session(chunks, chunks), scorecard, reference):
+        pass
+
+    assert scorecard.chunk_info == reference.chunk_info
+    assert scorecard.rebuffers == reference.rebuffers
+    quality, variation, rebuff_time, qoe = scorecard.get_qual_rebuff_var_qoe()
+    expected = reference.get_qual_rebuff_var_qoe()
+    assert (quality, variation, rebuff_time, qoe) == expected
+
+
+@pytest.mark.parametrize('chunks', [1, 5, 300])
+def test_current_qoe_matches_list_scorecard(chunks):
+    scorecard = Scorecard.Scorecard(2.0, 8.0, 1.0, 1.0, expected_chunks=4)
+    reference = ReferenceScorecard(2.0, 8.0, 1.0)
+    assert scorecard.current_qoe() == 0
+    for _ in log_session(random_session(chunks, chunks), scorecard, reference):
+        assert scorecard.current_qoe() == reference.get_qual_rebuff_var_qoe()[3]
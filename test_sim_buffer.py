@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+import simulator
+from Classes import SimBuffer
+from conftest import TEST_FILES
+
+
+class ReferenceBuffer:
+    """
+    The original list-backed SimBuffer, with burn_time counting the playback the buffer covered in seconds_played
+    """
+    def __init__(self, chunk_duration: float, client_buffer_size: float):
+        self.chunk_duration = chunk_duration
+        self.client_buffer_size = client_buffer_size
+        self.seconds_left = 0
+        self.chunks = []
+        self.seconds_played = 0
+
+    def get_occupancy(self) -> float:
+        current_chunk = int(self.seconds_played // self.chunk_duration + .001)
+        return sum(self.chunks[current_chunk:]) if current_chunk < len(self.chunks) else 0
+
+    def sim_chunk_download(self, chunk_size: float, playback_time: float) -> float:
+        rebuffer_time = self.burn_time(playback_time)
+        self.chunks.append(chunk_size)
+        self.seconds_left += self.chunk_duration
+        return rebuffer_time
+
+    def burn_time(self, playback_time: float) -> float:
+        rebuffer_time = max(playback_time - self.seconds_left, 0)
+        self.seconds_played += min(playback_time, self.seconds_left)
+        self.seconds_left = max(self.seconds_left - playback_time, 0)
+        return rebuffer_time
+
+    def wait_until_buffer_is_not_full(self) -> float:
+        wait_time = max(self.seconds_left - self.client_buffer_size, 0)
+        self.burn_time(wait_time)
+        return wait_time
+
+
+def run_buffers(downloads, chunk_duration: float, client_buffer_size: float, wait: bool):
+    """ Plays the same downloads into a SimBuffer and a ReferenceBuffer, checking them against each other """
+    buffer = SimBuffer.SimBuffer(chunk_duration, client_buffer_size)
+    reference = ReferenceBuffer(chunk_duration, client_buffer_size)
+    for size, playback_time in downloads:
+        assert buffer.sim_chunk_download(size, playback_time) == reference.sim_chunk_download(size, playback_time)
+        if wait:
+            assert buffer.wait_until_buffer_is_not_full(False) == reference.wait_until_buffer_is_not_full()
+        assert buffer.seconds_left == reference.seconds_left
+        assert buffer.seconds_played == reference.seconds_played
+        assert buffer.get_occupancy() == pytest.approx(reference.get_occupancy(), rel=1e-9, abs=1e-9)
+    return buffer
+
+
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_ring_buffer_matches_list_buffer(config_file):
+    _, _, buffer, chunk_qualities, chunk_length = simulator.read_test(config_file, False)
+    chunk_qualities = np.asarray(chunk_qualities)
+    rng = np.random.default_rng(1)
+    sizes = chunk_qualities[np.arange(len(chunk_qualities)), rng.integers(0, chunk_qualities.shape[1],
+                                                                           len(chunk_qualities))]
+    downloads = zip(sizes.tolist(), rng.exponential(chunk_length, len(sizes)).tolist())
+    run_buffers(downloads, chunk_length, buffer.client_buffer_size, wait=True)
+
+
+def test_burn_time_counts_covered_playback():
+    buffer = SimBuffer.SimBuffer(1.0, 30.0)
+    buffer.sim_chunk_download(1.0, 0)
+    buffer.sim_chunk_download(1.0, 0)
+    # Plays 1.5 of the 2 buffered seconds, the original code counted the 0.5 seconds left instead
+    assert buffer.burn_time(1.5) == 0
+    assert buffer.seconds_played == 1.5
+    assert buffer.get_occupancy() == 1.0
+    # Only the 0.5 seconds still buffered are played, the rest is rebuffering
+    assert buffer.burn_time(2.0) == 1.5
+    assert buffer.seconds_played == 2.0
+    assert buffer.get_occupancy() == 0
+
+
+def test_ring_buffer_grows_past_a_full_buffer():
+    # Downloading without waiting for room keeps more unplayed chunks than the ring was sized for
+    rng = np.random.default_rng(2)
+    downloads = list(zip(rng.uniform(.5, 8, 5000).tolist(), rng.uniform(0, .5, 5000).tolist()))
+    buffer = SimBuffer.SimBuffer(1.0, 4.0)
+    initial_ring = len(buffer.ring)
+    buffer = run_buffers(downloads, 1.0, 4.0, wait=False)
+    assert len(buffer.ring) > initial_ring
@@ -0,0 +1,99 @@
+from itertools import product
+import numpy as np
+import pytest
+from student import student2
+
+
+def reference_calc_MPC(mpc, clt_msg) -> int:
+    """ The original Robust_MPC.calc_MPC, scoring one itertools.product path at a time """
+    def calc_diffs(quals):
+        for i in range(len(quals)):
+            if i == 0: yield abs(mpc.qual_prev - quals[i])
+            else:      yield abs(quals[i] - quals[i-1])
+
+    qual_max = 0
+    qoe_max  = -1000
+    times    = mpc.get_time_from_bitrates(clt_msg.quality_bitrates, clt_msg.upcoming_quality_bitrates)
+    for path in product(*[list(range(len(t))) for t in times]):
+        rebuff_time = max(0, sum([times[i][j] for (i, j) in enumerate(path)]) - mpc.buffer_capacity)
+        rebuff_time = rebuff_time / (1 + mpc.throughput_error)
+        qoe_temp    = clt_msg.quality_coefficient     * sum(path) \
+                    - clt_msg.rebuffering_coefficient * rebuff_time \
+                    - clt_msg.variation_coefficient   * sum(calc_diffs(path))
+        if qoe_temp > qoe_max:
+            qoe_max  = qoe_temp
+            qual_max = path[0]
+    return qual_max
+
+
+def random_mpc_states(count: int, seed: int = 0):
+    """ Robust_MPC instances and client messages with random buffer, throughput and upcoming chunk states """
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        levels = int(rng.integers(2, 5))
+        upcoming = int(rng.integers(0, 6))
+        ratios = rng.choice([0.4, 0.8, 1.0, 1.2, 1.6], upcoming + 1)
+        bitrates = [[float(r * 2 ** q) for q in range(levels)] for r in ratios]
+
+        msg = student2.ClientMessage()
+        msg.quality_levels = levels
+        msg.buffer_seconds_per_chunk = 1.0
+        msg.buffer_max_size = 30.0
+        msg.quality_bitrates = bitrates[0]
+        msg.upcoming_quality_bitrates = bitrates[1:]
+        msg.quality_coefficient = float(rng.choice([1.0, 2.0, 5.0]))
+        msg.rebuffering_coefficient = float(rng.choice([1.0, 8.0, 50.0]))
+        msg.variation_coefficient = float(rng.choice([0.0, 1.0, 3.0]))
+
+        mpc = student2.Robust_MPC()
+        mpc.qual_prev = int(rng.integers(0, levels))
+        mpc.buffer_capacity = float(rng.choice([0.0, rng.uniform(0, 30)]))
+        mpc.throughput = float(rng.uniform(0.2, 8))
+        mpc.throughput_error = float(rng.choice([0.0, rng.uniform(0, 1)]))
+        yield mpc, msg
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_vectorized_mpc_matches_itertools_product(seed):
+    for mpc, msg in random_mpc_states(500, seed):
+        assert mpc.calc_MPC(msg) == reference_calc_MPC(mpc, msg)
+
+
+def test_dp_gap_is_measured_on_the_exhaustive_objective():
+    for mpc, msg in random_mpc_states(200, seed=4):
+        exhaustive = mpc.calc_MPC(msg)
+        for quality in range(msg.quality_levels):
+            mpc.record_dp_gap(msg, quality)
+            assert mpc.dp_agreements[-1] == (quality == exhaustive)
+            if quality == exhaustive:
+                assert mpc.dp_gaps[-1] == 0
+            else:
+                assert mpc.dp_gaps[-1] >= 0
+
+
+def test_session_summary_goes_to_the_recorder_and_the_report(monkeypatch, capsys):
+    import simulator
+    import tester
+    from Classes.Recorder import DecisionRecorder
+    from conftest import TEST_FILES
+    monkeypatch.setenv('MPC_SOLVER', 'dp')
+    monkeypatch.setenv('MPC_TRACK_DP_GAP', '1')
+
+    recorder = DecisionRecorder()
+    simulator.main(TEST_FILES[0], '2', False, False, recorder=recorder)
+    assert capsys.readouterr().out == ''
+    assert recorder.sessions[0].student_summary.startswith('dp vs exhaustive over ')
+
+    tester.main('2')
+    report = capsys.readouterr().out.splitlines()
+    assert sum(line.startswith('\t\tdp vs exhaustive over ') for line in report) == len(tester.list_tests())
+
+
+def test_states_without_rebuffering_share_a_cache_key():
+    decisions = {}
+    for mpc, msg in random_mpc_states(2000, seed=5):
+        times = mpc.get_time_from_bitrates(msg.quality_bitrates, msg.upcoming_quality_bitrates)
+        mpc.buffer_capacity = sum(max(t) for t in times) + 1
+        key = mpc.get_cache_key(msg)
+        assert decisions.setdefault(key, mpc.calc_MPC(msg)) == mpc.calc_MPC(msg)
+    assert len(decisions) < 1000
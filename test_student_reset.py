@@ -0,0 +1,37 @@
+import sys
+import pytest
+import simulator
+from conftest import STUDENT_ALGOS, TEST_FILES
+
+
+def fresh_session(monkeypatch, config_file: str, student_algo: str):
+    """ Runs a session on a newly imported student module, as reloading the module for every session did """
+    monkeypatch.delitem(sys.modules, f'student.student{student_algo}', raising=False)
+    return simulator.main(config_file, student_algo, False, False)
+
+
+@pytest.mark.parametrize('student_algo', STUDENT_ALGOS)
+def test_reset_isolates_sessions(monkeypatch, student_algo):
+    expected = {config_file: fresh_session(monkeypatch, config_file, student_algo) for config_file in TEST_FILES}
+    # Every session after the first in this loop runs on a module reset() after the session before it
+    for config_file in TEST_FILES + TEST_FILES[::-1]:
+        assert simulator.main(config_file, student_algo, False, False) == expected[config_file]
+
+
+@pytest.mark.parametrize('student_algo', STUDENT_ALGOS)
+def test_load_student_calls_reset(monkeypatch, student_algo):
+    student = simulator.load_student(student_algo)
+    resets = []
+    monkeypatch.setattr(student, 'reset', lambda: resets.append(student_algo))
+    monkeypatch.setattr(simulator, 'reload', lambda module: pytest.fail(f'{module} was reloaded'))
+    assert simulator.load_student(student_algo) is student
+    assert resets == [student_algo]
+
+
+def test_load_student_reloads_without_reset(monkeypatch):
+    student = simulator.load_student('1')
+    monkeypatch.delattr(student, 'reset')
+    reloads = []
+    monkeypatch.setattr(simulator, 'reload', reloads.append)
+    assert simulator.load_student('1') is student
+    assert reloads == [student]
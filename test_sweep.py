@@ -0,0 +1,35 @@
+import sys
+import numpy as np
+import pytest
+import simulator
+import sweep
+from conftest import TEST_FILES
+
+GRID = sweep.coefficient_grid([1.0, 2.5], [0.0, 8.0, 30.0], [0.0, 1.0])
+
+
+def rerun(config_file: str, student_algo: str, grid: np.ndarray) -> np.ndarray:
+    """ Scores the grid the slow way, one session per coefficient triple """
+    return np.array([simulator.main(config_file, student_algo, False, False, coefficients=tuple(coefficients))
+                     for coefficients in grid.tolist()], dtype=np.float64)
+
+
+def test_coefficient_grid():
+    assert GRID.shape == (12, 3)
+    assert GRID[:3].tolist() == [[1.0, 0.0, 0.0], [1.0, 0.0, 1.0], [1.0, 8.0, 0.0]]
+
+
+@pytest.mark.parametrize('config_file', TEST_FILES)
+def test_rescored_grid_matches_reruns(config_file):
+    # BBA-2 never reads the coefficients, so one session is re-scored for the whole grid
+    results, reran = sweep.sweep(config_file, '1', GRID)
+    assert not reran
+    np.testing.assert_array_equal(results, rerun(config_file, '1', GRID))
+
+
+def test_students_reading_the_coefficients_are_rerun():
+    results, reran = sweep.sweep(TEST_FILES[0], '2', GRID)
+    assert reran
+    np.testing.assert_array_equal(results, rerun(TEST_FILES[0], '2', GRID))
+    # the probe put the student's own ClientMessage back
+    assert sys.modules['student.student2'].ClientMessage.__name__ == 'ClientMessage'
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+import simulator
+import synthetic
+
+ARRAY_FIELDS = ('throughput_times', 'throughput_values', 'chunk_qualities')
+
+
+def assert_same_test(test, expected):
+    assert test.keys() == expected.keys()
+    for field, value in expected.items():
+        np.testing.assert_array_equal(test[field], value, err_msg=field)
+
+
+@pytest.mark.parametrize('avg', synthetic.AVG_PRESETS)
+@pytest.mark.parametrize('var', synthetic.VAR_PRESETS)
+def test_same_seed_gives_the_same_test(avg, var):
+    test = synthetic.generate_test(300, avg, var, seed=7, outage_rate=.1)
+    assert_same_test(synthetic.generate_test(300, avg, var, seed=7, outage_rate=.1), test)
+
+    other = synthetic.generate_test(300, avg, var, seed=8, outage_rate=.1)
+    assert not all(np.array_equal(test[field], other[field]) for field in ARRAY_FIELDS)
+
+
+@pytest.mark.parametrize('var', synthetic.VAR_PRESETS)
+def test_longer_test_starts_with_the_shorter_one(var):
+    short = synthetic.generate_test(100, 'mi', var, seed=3, outage_rate=.1)
+    long = synthetic.generate_test(5000, 'mi', var, seed=3, outage_rate=.1)
+    segments = len(short['throughput_times'])
+    np.testing.assert_array_equal(long['throughput_times'][:segments], short['throughput_times'])
+    np.testing.assert_array_equal(long['throughput_values'][:segments], short['throughput_values'])
+    np.testing.assert_array_equal(long['chunk_qualities'][:100], short['chunk_qualities'])
+
+
+def test_generated_test_is_valid():
+    test = synthetic.generate_test(500, 'lo', 'hi', seed=1, quality_levels=4, outage_rate=.2)
+    times, bandwidths = test['throughput_times'], test['throughput_values']
+    assert times[0] == 0 and np.all(np.diff(times) > 0)
+    assert times[-1] < 500 and np.all(bandwidths >= 0) and np.all(bandwidths <= synthetic.AVG_PRESETS['lo'])
+    assert test['chunk_qualities'].shape == (500, 4)
+    np.testing.assert_allclose(test['chunk_qualities'][:, 1:] / test['chunk_qualities'][:, :-1], 2)
+
+
+@pytest.mark.parametrize('extension', ['.ini', simulator.COMPILED_TEST_EXTENSION])
+def test_written_test_loads_back(tmp_path, extension):
+    test = synthetic.generate_test(200, 'mi', 'mi', seed=3)
+    path = str(tmp_path / f'test{extension}')
+    synthetic.write_test(test, path)
+    loaded = simulator.parse_test(path) if extension == '.ini' else simulator.read_compiled_test(path)[0]
+    for field, value in test.items():
+        np.testing.assert_allclose(loaded[field], value, rtol=1e-15, err_msg=field)
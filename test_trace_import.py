@@ -0,0 +1,65 @@
+import os
+import numpy as np
+import pytest
+import trace_import
+from Classes.NetworkTrace import NetworkTrace
+
+PACKET_MBITS = trace_import.MAHIMAHI_PACKET_BYTES * 8 / 1e6
+
+
+def write_lines(path, lines) -> str:
+    path.write_text(''.join(f'{line}\n' for line in lines))
+    return str(path)
+
+
+def test_read_mahimahi_counts_deliveries_per_bin(tmp_path):
+    path = write_lines(tmp_path / 'trace.mahimahi', ['0', '5', '999', '1000', '3500', '3501'])
+    assert list(trace_import.read_mahimahi(path)) == pytest.approx(
+        [(0, 3 * PACKET_MBITS), (1, PACKET_MBITS), (2, 0), (3, 2 * PACKET_MBITS)])
+    assert list(trace_import.read_mahimahi(path, bin_ms=500)) == pytest.approx(
+        [(0, 4 * PACKET_MBITS), (.5, 2 * PACKET_MBITS), (1, 2 * PACKET_MBITS)] + [(t / 2, 0) for t in range(3, 7)]
+        + [(3.5, 4 * PACKET_MBITS)])
+
+
+def test_read_time_bandwidth_csv(tmp_path):
+    path = write_lines(tmp_path / 'trace.csv', ['time_ms,bytes_per_second', '# comment', '', '0,125000', '1500,250000'])
+    segments = trace_import.read_time_bandwidth(path, delimiter=',', time_scale=.001, bw_scale=8e-6)
+    assert list(segments) == pytest.approx([(0, 1), (1.5, 2)])
+
+
+def test_read_hsdpa(tmp_path):
+    path = write_lines(tmp_path / 'trace.log', ['1289406399 2000 59.85 10.65 250000 1000',
+                                                '1289406400 3000 59.85 10.65 0 0',
+                                                '1289406401 4000 59.85 10.65 125000 500'])
+    assert list(trace_import.read_hsdpa(path)) == pytest.approx([(2, 2), (4, 2)])
+
+
+def test_rebase_and_merge_equal_segments():
+    segments = [(10, 1), (11, 1), (12, 2), (12, 3), (13, 2.05), (14, 1)]
+    assert list(trace_import.merge_equal_segments(trace_import.rebase(segments))) == \
+        [(0, 1), (2, 2), (3, 2.05), (4, 1)]
+    assert list(trace_import.merge_equal_segments(trace_import.rebase(segments), tolerance=.1)) == \
+        [(0, 1), (2, 2), (4, 1)]
+
+
+def test_write_trace_file_streams_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(trace_import, 'WRITE_BLOCK_SIZE', 3)
+    rng = np.random.default_rng(0)
+    segments = list(zip(np.cumsum(rng.uniform(.1, 2, 10)).tolist(), rng.uniform(.5, 5, 10).tolist()))
+    path = str(tmp_path / 'trace.abrtrace')
+    assert trace_import.write_trace_file(iter(segments), path) == len(segments)
+
+    mapped = NetworkTrace.from_file(path)
+    in_memory = trace_import.to_network_trace(iter(segments))
+    assert mapped.bwlist == in_memory.bwlist == segments
+    times, sizes = rng.uniform(0, 25, 50), rng.uniform(.1, 20, 50)
+    np.testing.assert_array_equal(mapped.simulate_downloads(times, sizes), in_memory.simulate_downloads(times, sizes))
+
+
+def test_write_trace_file_rejects_empty_logs(tmp_path):
+    log = tmp_path / 'empty.log'
+    log.write_text('# no samples\n')
+    path = str(tmp_path / 'trace.abrtrace')
+    with pytest.raises(ValueError, match='empty.log'):
+        trace_import.write_trace_file(trace_import.read_time_bandwidth(str(log)), path, str(log))
+    assert not os.path.exists(path)
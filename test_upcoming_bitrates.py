@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from Classes.UpcomingBitrates import UpcomingBitrates
+
+ROWS = [[float(r * 2 ** q) for q in range(3)] for r in (1.0, 0.4, 1.6, 0.8, 1.2)]
+
+
+def test_len_indexing_and_iteration_match_list():
+    view = UpcomingBitrates(np.array(ROWS))
+    assert len(view) == len(ROWS)
+    assert [view[i] for i in range(-len(ROWS), len(ROWS))] == [ROWS[i] for i in range(-len(ROWS), len(ROWS))]
+    assert list(view) == ROWS
+    assert view.tolist() == ROWS
+    assert all(type(x) is float for row in view for x in row)
+    with pytest.raises(IndexError):
+        view[len(ROWS)]
+
+
+@pytest.mark.parametrize('index', [slice(1, None), slice(None, 3), slice(1, -1), slice(None, None, 2),
+                                   slice(4, 1, -1), slice(5, None), slice(10, 20)])
+def test_slicing_matches_list(index):
+    view = UpcomingBitrates(np.array(ROWS))[index]
+    assert isinstance(view, UpcomingBitrates)
+    assert list(view) == ROWS[index]
+    assert len(view) == len(ROWS[index])
+    assert view == ROWS[index]
+    # slices of slices, as the student takes them from the upcoming chunks
+    assert list(view[1:]) == ROWS[index][1:]
+
+
+def test_slices_share_the_read_only_array():
+    rows = np.array(ROWS)
+    view = UpcomingBitrates(rows)
+    upcoming = view[1:]
+    assert np.shares_memory(upcoming.array, view.array)
+    np.testing.assert_array_equal(np.asarray(upcoming), rows[1:])
+    with pytest.raises(ValueError):
+        upcoming.array[0, 0] = 0
+
+
+def test_empty_view():
+    view = UpcomingBitrates(np.array(ROWS))[len(ROWS):]
+    assert len(view) == 0
+    assert list(view) == []
+    assert not view
+    assert view == []
@@ -1,41 +1,192 @@
 #!/usr/bin/env python3
 import os
 import simulator
-from importlib import reload
+from Classes.Profiler import Profiler
+from Classes.Recorder import DecisionRecorder, SessionRecord
+from Classes.ResultCache import ResultCache
+from typing import List, Tuple
 import sys
 
 TEST_DIRECTORY = './tests'
 
 
-def main(student_algo: str):
+def list_tests() -> List[str]:
+    """ Returns the test files in TEST_DIRECTORY in a deterministic order """
+    return sorted(os.listdir(TEST_DIRECTORY))
+
+
+def list_student_algos() -> List[str]:
+    """ Returns the names of all student algorithms in ./student, e.g. ['1', '2'] """
+    names = []
+    for algo in sorted(os.listdir('./student')):
+        if algo[:len('student')] != 'student':
+            continue
+        names.append(algo[len('student'):].split('.')[0])
+    return names
+
+
+def run_test(test: str, student_algo: str, profiler: Profiler = None, recorder: DecisionRecorder = None,
+             cache: ResultCache = None) -> Tuple[float, float, float, float]:
     """
-    Runs simulator and student algorithm on all tests in TEST_DIRECTORY
+    Runs one test with one student algorithm. Used both serially and as the process pool task.
     Args:
+        test : Name of the test file in TEST_DIRECTORY
         student_algo : Student algorithm to run
+        profiler : Optional Profiler to charge the time of each simulator phase to
+        recorder : Optional DecisionRecorder to record the session with
+        cache : Optional ResultCache to take the session from, or to store it in after running it
+    :return: Tuple with the total quality, total variation, rebuffer time, and user QoE for this test
+    """
+    config_file = os.path.join(TEST_DIRECTORY, test)
+    if not cache:
+        return simulator.main(config_file, student_algo, False, False, profiler=profiler, recorder=recorder)
+
+    record = cache.get(config_file, student_algo)
+    if record is None:
+        session = DecisionRecorder()
+        simulator.main(config_file, student_algo, False, False, profiler=profiler, recorder=session)
+        record = session.sessions[0]
+        cache.put(record)
+    if recorder:
+        recorder.sessions.append(record)
+    return record.results
+
+
+def run_test_instrumented(test: str, student_algo: str, profile: bool,
+                          record: bool) -> Tuple[Tuple[float, float, float, float], Profiler, List[SessionRecord]]:
+    """
+    Process pool task for profiled or recorded runs. Returns the test results, plus the worker's Profiler and
+    SessionRecords for the parent to merge (None for the ones not asked for).
+    """
+    profiler = Profiler() if profile else None
+    recorder = DecisionRecorder() if record else None
+    result = run_test(test, student_algo, profiler, recorder)
+    return result, profiler, recorder.sessions if recorder else None
+
+
+def print_report(student_algo: str, results: List[Tuple[str, Tuple[float, float, float, float]]],
+                 summaries: List[str] = None):
+    """
+    Prints the per-test results and the average QoE for one student algorithm
+    Args:
+        student_algo : Student algorithm the results belong to
+        results : List of (test name, (quality, variation, rebuffer time, QoE)) in the order to print
+        summaries : Optional student summary of each session, printed under its test
     """
-    # Run main loop, print output
     sum_qoe = 0
     print(f'\nTesting student algorithm {student_algo}')
-    for test in os.listdir(TEST_DIRECTORY):
-        reload(simulator)
-        quality, variation, rebuff, qoe = simulator.main(os.path.join(TEST_DIRECTORY, test), student_algo, False, False)
+    for i, (test, (quality, variation, rebuff, qoe)) in enumerate(results):
         print(f'\tTest {test: <12}:'
               f' Total Quality {quality:8.2f},'
               f' Total Variation {variation:8.2f},'
               f' Rebuffer Time {rebuff:8.2f},'
               f' Total QoE {qoe:8.2f}')
+        for line in (summaries[i] if summaries else '').splitlines():
+            print(f'\t\t{line}')
         sum_qoe += qoe
 
-    print(f'\n\tAverage QoE over all tests: {sum_qoe / len(os.listdir(TEST_DIRECTORY)):.2f}')
+    print(f'\n\tAverage QoE over all tests: {sum_qoe / len(results):.2f}')
+
+
+def main(student_algo: str, profiler: Profiler = None, recorder: DecisionRecorder = None, cache: ResultCache = None):
+    """
+    Runs simulator and student algorithm on all tests in TEST_DIRECTORY
+    Args:
+        student_algo : Student algorithm to run
+        profiler : Optional Profiler to charge the time of each simulator phase to
+        recorder : Optional DecisionRecorder to record every session with
+        cache : Optional ResultCache to take unchanged sessions from
+    """
+    # Sessions are always recorded for the student summaries in the report
+    sessions = DecisionRecorder()
+    results = [(test, run_test(test, student_algo, profiler, sessions, cache)) for test in list_tests()]
+    if recorder:
+        recorder.sessions.extend(sessions.sessions)
+    print_report(student_algo, results, [session.student_summary for session in sessions.sessions])
+
+
+def main_parallel(student_algos: List[str], jobs: int, profiler: Profiler = None, recorder: DecisionRecorder = None,
+                  cache: ResultCache = None):
+    """
+    Runs every (test, student algorithm) pair in TEST_DIRECTORY across a pool of worker processes. Each worker imports
+    its own copy of the student module. Reports are printed in the same order as a serial run.
+    Args:
+        student_algos : Student algorithms to run
+        jobs : Number of worker processes
+        profiler : Optional Profiler the workers' phase timings are merged into
+        recorder : Optional DecisionRecorder the workers' sessions are collected into, in serial run order
+        cache : Optional ResultCache to take unchanged sessions from. Only sessions missing from it are sent to the
+            workers, and the parent stores them when they come back.
+    """
+    from concurrent.futures import ProcessPoolExecutor  # deferred, serial runs do not need multiprocessing
+
+    tests = list_tests()
+    cached = {}
+    if cache:
+        for algo in student_algos:
+            for test in tests:
+                record = cache.get(os.path.join(TEST_DIRECTORY, test), algo)
+                if record is not None:
+                    cached[(algo, test)] = record
+
+    # Sessions are always recorded for the student summaries in the report
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            (algo, test): pool.submit(run_test_instrumented, test, algo, profiler is not None, True)
+            for algo in student_algos for test in tests if (algo, test) not in cached
+        }
+        for algo in student_algos:
+            results = []
+            summaries = []
+            for test in tests:
+                if (algo, test) in cached:
+                    sessions = [cached[(algo, test)]]
+                    result = sessions[0].results
+                else:
+                    result, worker_profiler, sessions = futures[(algo, test)].result()
+                    if profiler:
+                        profiler.merge(worker_profiler)
+                    if cache:
+                        cache.put(sessions[0])
+                if recorder:
+                    recorder.sessions.extend(sessions)
+                results.append((test, result))
+                summaries.append(sessions[0].student_summary)
+            print_report(algo, results, summaries)
 
 
 if __name__ == "__main__":
-    assert len(sys.argv) >= 2, f'Proper usage: python3 {sys.argv[0]} [student_algo]'
-    if sys.argv[1] != 'RUN_ALL':
-        main(sys.argv[1])
+    assert len(sys.argv) >= 2, \
+        f'Proper usage: python3 {sys.argv[0]} [student_algo] [--jobs N] [--profile] [--profile-out stats_file]' \
+        f' [--plot directory] [--cache]' + simulator.STUDENT_USAGE
+    simulator.apply_student_options(sys.argv)
+    jobs = 1
+    if '--jobs' in sys.argv:
+        jobs = int(sys.argv[sys.argv.index('--jobs') + 1])
+        assert jobs >= 1, 'Number of jobs must be at least 1'
+    profile_out = sys.argv[sys.argv.index('--profile-out') + 1] if '--profile-out' in sys.argv else None
+    assert not (profile_out and jobs > 1), 'cProfile output only covers this process, use --profile-out with --jobs 1'
+    profiler = Profiler() if '--profile' in sys.argv or profile_out else None
+    plot_directory = sys.argv[sys.argv.index('--plot') + 1] if '--plot' in sys.argv else None
+    recorder = DecisionRecorder() if plot_directory else None
+    cache = ResultCache() if '--cache' in sys.argv else None
+
+    algos = list_student_algos() if sys.argv[1] == 'RUN_ALL' else [sys.argv[1]]
+    start = Profiler.clock()
+    if jobs > 1:
+        main_parallel(algos, jobs, profiler, recorder, cache)
+    elif profile_out:
+        Profiler.run_cprofile(profile_out, lambda: [main(name, profiler, recorder, cache) for name in algos])
     else:
-        for algo in os.listdir('./student'):
-            if algo[:len('student')] != 'student':
-                continue
-            name = algo[len('student'):].split('.')[0]
-            main(name)
+        for name in algos:
+            main(name, profiler, recorder, cache)
+    if cache:
+        print(f'\n{cache.hits} sessions taken from {cache.path}, {cache.misses} simulated.')
+    if recorder:
+        import plotting
+        plotting.render_sessions(recorder.sessions, plot_directory, jobs)
+        print(f'\nQuality plots of {len(recorder.sessions)} sessions written to {plot_directory}.')
+    if profiler:
+        if jobs > 1:
+            print(f'\nProfile sums the time of {jobs} workers, the run took {Profiler.clock() - start:.2f} seconds.')
+        profiler.report()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import itertools
+import os
+import sys
+import tempfile
+from typing import Iterable, Iterator, Tuple
+import numpy as np
+from Classes.NetworkTrace import NetworkTrace
+
+# Streaming importers for real throughput logs. Every stage is a generator of (start time in seconds, bandwidth in
+# Mbps) segments, so logs are read one line at a time and never loaded whole.
+Segment = Tuple[float, float]
+
+MAHIMAHI_PACKET_BYTES = 1500
+WRITE_BLOCK_SIZE = 1 << 16
+
+
+def _numeric_rows(path: str, delimiter: str = None) -> Iterator[list]:
+    """ Yields the fields of each line of path as floats, skipping blank, comment and header lines """
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                yield [float(x) for x in line.split(delimiter)]
+            except ValueError:
+                continue
+
+
+def read_mahimahi(path: str, bin_ms: float = 1000, packet_bytes: int = MAHIMAHI_PACKET_BYTES) -> Iterator[Segment]:
+    """
+    Reads a mahimahi packet delivery trace, one delivery opportunity timestamp in ms per line, and yields the
+    throughput of every bin_ms window. Windows without deliveries yield 0 Mbps.
+    Args:
+        path : mahimahi trace file
+        bin_ms : Width of the windows deliveries are counted in, in ms
+        packet_bytes : Bytes delivered per opportunity
+    """
+    mbits_per_packet = packet_bytes * 8 / 1e6
+    current_bin, count = 0, 0
+    for row in _numeric_rows(path):
+        packet_bin = int(row[0] // bin_ms)
+        while packet_bin > current_bin:
+            yield current_bin * bin_ms / 1000, count * mbits_per_packet / (bin_ms / 1000)
+            current_bin, count = current_bin + 1, 0
+        count += 1
+    yield current_bin * bin_ms / 1000, count * mbits_per_packet / (bin_ms / 1000)
+
+
+def read_time_bandwidth(path: str, time_col: int = 0, bw_col: int = 1, delimiter: str = None,
+                        time_scale: float = 1.0, bw_scale: float = 1.0) -> Iterator[Segment]:
+    """
+    Reads a per-sample throughput log with one (time, bandwidth) row per line, e.g. the cooked FCC and HSDPA traces
+    ("seconds Mbps") or a CSV export.
+    Args:
+        path : Log file
+        time_col : Column holding the sample time
+        bw_col : Column holding the bandwidth
+        delimiter : Column separator, None for any whitespace, ',' for CSV
+        time_scale : Multiplier converting the time column to seconds, e.g. .001 for ms
+        bw_scale : Multiplier converting the bandwidth column to Mbps, e.g. 8e-6 for bytes per second
+    """
+    for row in _numeric_rows(path, delimiter):
+        yield row[time_col] * time_scale, row[bw_col] * bw_scale
+
+
+def read_hsdpa(path: str) -> Iterator[Segment]:
+    """
+    Reads a raw HSDPA (Riiser et al.) log. Each line holds the unix timestamp, ms since the start of the log, GPS
+    latitude and longitude, bytes received, and the ms the bytes took to arrive.
+    Args:
+        path : Log file
+    """
+    for row in _numeric_rows(path):
+        elapsed_ms, received_bytes, duration_ms = row[1], row[4], row[5]
+        if duration_ms > 0:
+            yield elapsed_ms / 1000, received_bytes * 8 / 1e6 / (duration_ms / 1000)
+
+
+def rebase(segments: Iterable[Segment]) -> Iterator[Segment]:
+    """ Shifts the segments so that the first one starts at time 0, where every simulation starts """
+    offset = None
+    for start, bw in segments:
+        if offset is None:
+            offset = start
+        yield start - offset, bw
+
+
+def merge_equal_segments(segments: Iterable[Segment], tolerance: float = 0.0) -> Iterator[Segment]:
+    """
+    Drops segments whose bandwidth is within tolerance of the segment before them, and samples that do not move time
+    forward, so downstream lookups have fewer segments to search.
+    Args:
+        segments : Segments in time order
+        tolerance : Largest bandwidth difference in Mbps treated as equal
+    """
+    prev_start = prev_bw = None
+    for start, bw in segments:
+        if prev_start is not None and (start <= prev_start or abs(bw - prev_bw) <= tolerance):
+            continue
+        yield start, bw
+        prev_start, prev_bw = start, bw
+
+
+def to_network_trace(segments: Iterable[Segment]) -> NetworkTrace:
+    """ Collects the segments into an in-memory NetworkTrace """
+    pairs = np.fromiter(segments, dtype=np.dtype((np.float64, 2)))
+    return NetworkTrace.from_arrays(pairs[:, 0], pairs[:, 1])
+
+
+def write_trace_file(segments: Iterable[Segment], path: str, source: str = None) -> int:
+    """
+    Streams the segments into a NetworkTrace file for NetworkTrace.from_file, holding at most WRITE_BLOCK_SIZE
+    segments in memory at a time.
+    Args:
+        segments : Segments in strictly increasing time order
+        path : Trace file to write
+        source : Log file the segments were read from, named in the error if there are none
+    :return: int Number of segments written
+    """
+    segments = iter(segments)
+    first = next(segments, None)
+    if first is None:
+        raise ValueError(f'No throughput samples found in {source}' if source else
+                         f'No segments to write to {path}')
+    segments = itertools.chain([first], segments)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        times_path, bws_path = os.path.join(tmp, 'times.f8'), os.path.join(tmp, 'bandwidths.f8')
+        count = 0
+        with open(times_path, 'wb') as times_file, open(bws_path, 'wb') as bws_file:
+            block = []
+            for segment in segments:
+                block.append(segment)
+                if len(block) == WRITE_BLOCK_SIZE:
+                    _write_block(block, times_file, bws_file)
+                    count, block = count + len(block), []
+            _write_block(block, times_file, bws_file)
+            count += len(block)
+
+        times = np.memmap(times_path, dtype='<f8', mode='r', shape=(count,))
+        bws = np.memmap(bws_path, dtype='<f8', mode='r', shape=(count,))
+        NetworkTrace.write_file(path, times, bws)
+        del times, bws
+    return count
+
+
+def _write_block(block: list, times_file, bws_file):
+    """ Appends a block of segments to the raw time and bandwidth files """
+    if block:
+        pairs = np.array(block, dtype='<f8')
+        times_file.write(pairs[:, 0].tobytes())
+        bws_file.write(pairs[:, 1].tobytes())
+
+
+READERS = {'mahimahi': read_mahimahi, 'time_bandwidth': read_time_bandwidth, 'hsdpa': read_hsdpa}
+
+
+if __name__ == '__main__':
+    assert len(sys.argv) >= 4 and sys.argv[1] in READERS, \
+        f'Proper usage: python3 {sys.argv[0]} [{"|".join(READERS)}] [log_file] [output_trace] [--bin-ms N] [--csv]'
+    reader = READERS[sys.argv[1]]
+    kwargs = {}
+    if '--bin-ms' in sys.argv and reader is read_mahimahi:
+        kwargs['bin_ms'] = float(sys.argv[sys.argv.index('--bin-ms') + 1])
+    if '--csv' in sys.argv and reader is read_time_bandwidth:
+        kwargs['delimiter'] = ','
+
+    written = write_trace_file(merge_equal_segments(rebase(reader(sys.argv[2], **kwargs))), sys.argv[3], sys.argv[2])
+    print(f'Wrote {written} segments to {sys.argv[3]}.')